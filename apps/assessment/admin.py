@@ -5,6 +5,7 @@ from apps.assessment.models import (
     Question,
     Answer,
     AssessmentResult,
+    RescoreJob,
 )
 
 
@@ -79,9 +80,24 @@ class AssessmentResultAdmin(admin.ModelAdmin):
     list_filter = ("created_at",)
 
 
+# Admin class for RescoreJob
+class RescoreJobAdmin(admin.ModelAdmin):
+    list_display = (
+        "assessment_type",
+        "status",
+        "processed",
+        "total",
+        "rescored",
+        "started_at",
+        "finished_at",
+    )
+    list_filter = ("status", "created_at")
+
+
 # Register models with admin site
 admin.site.register(AssessmentType, AssessmentTypeAdmin)
 admin.site.register(Question, QuestionAdmin)
 admin.site.register(Answer, AnswerAdmin)
 admin.site.register(Assessment, AssessmentAdmin)
 admin.site.register(AssessmentResult, AssessmentResultAdmin)
+admin.site.register(RescoreJob, RescoreJobAdmin)
@@ -0,0 +1,100 @@
+"""
+Streaming exports of assessments and their results.
+
+Rows are read with ``QuerySet.iterator(chunk_size=...)`` (a server-side cursor on
+PostgreSQL) from a single LEFT JOIN of assessments and results, and encoded one line
+at a time, so memory use does not depend on the size of the export.
+"""
+import csv
+import json
+from itertools import groupby
+from operator import itemgetter
+
+EXPORT_CHUNK_SIZE = 2000
+NDJSON = "ndjson"
+CSV = "csv"
+EXPORT_FORMATS = (NDJSON, CSV)
+CONTENT_TYPES = {
+    NDJSON: "application/x-ndjson",
+    CSV: "text/csv",
+}
+
+ASSESSMENT_FIELDS = (
+    ("assessment_id", "id"),
+    ("assessment_type_id", "assessment_type_id"),
+    ("assessment_type", "assessment_type__name"),
+    ("patient_id", "patient_id"),
+    ("date", "date"),
+    ("final_score", "final_score"),
+    ("correct_count", "correct_count"),
+    ("answered_count", "answered_count"),
+)
+RESULT_FIELDS = (
+    ("question_id", "results__question_id"),
+    ("question", "results__question__text"),
+    ("answer_id", "results__answer_id"),
+    ("answer", "results__answer__text"),
+    ("is_correct", "results__answer__is_correct"),
+)
+
+
+class Echo:
+    """A file-like object whose ``write`` returns the value, for streaming csv.writer output."""
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset):
+    """One row per assessment result, with assessments without results kept as a single row."""
+    lookups = [lookup for _, lookup in ASSESSMENT_FIELDS + RESULT_FIELDS]
+    return (
+        queryset.order_by("created_at", "id")
+        .values_list(*lookups)
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+
+
+def to_text(value):
+    if value is None:
+        return None
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    if isinstance(value, (bool, int, str)):
+        return value
+    return str(value)
+
+
+def stream_ndjson(queryset):
+    """Yield one JSON document per assessment with its flattened results."""
+    assessment_size = len(ASSESSMENT_FIELDS)
+    for _, rows in groupby(export_rows(queryset), key=itemgetter(0)):
+        results = []
+        for row in rows:
+            if row[assessment_size] is not None:
+                results.append(
+                    {
+                        name: to_text(value)
+                        for (name, _), value in zip(RESULT_FIELDS, row[assessment_size:])
+                    }
+                )
+        document = {
+            name: to_text(value)
+            for (name, _), value in zip(ASSESSMENT_FIELDS, row[:assessment_size])
+        }
+        document["results"] = results
+        yield json.dumps(document) + "\n"
+
+
+def stream_csv(queryset):
+    """Yield a header line and then one CSV line per assessment result."""
+    writer = csv.writer(Echo())
+    yield writer.writerow([name for name, _ in ASSESSMENT_FIELDS + RESULT_FIELDS])
+    for row in export_rows(queryset):
+        yield writer.writerow(["" if value is None else to_text(value) for value in row])
+
+
+def stream_export(queryset, export_format):
+    if export_format == CSV:
+        return stream_csv(queryset)
+    return stream_ndjson(queryset)
@@ -0,0 +1,67 @@
+import csv
+import io
+import json
+import time
+
+from django.core.management.base import BaseCommand
+
+from apps.assessment.models import AssessmentType
+from apps.assessment.question_bank import (
+    BANK_CSV_COLUMNS,
+    bank_csv_rows,
+    export_question_banks,
+)
+
+
+class Command(BaseCommand):
+    help = "Export assessment types with their questions and answers as a JSON or CSV question bank."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "path", nargs="?", default="-", help="Output file, '-' for stdout (default)."
+        )
+        parser.add_argument(
+            "--format",
+            dest="bank_format",
+            choices=["json", "csv"],
+            help="Bank format, inferred from the file extension by default.",
+        )
+        parser.add_argument(
+            "--type",
+            dest="types",
+            action="append",
+            default=[],
+            help="Name of an assessment type to export; repeat for several. All types by default.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        bank_format = options["bank_format"] or ("csv" if path.lower().endswith(".csv") else "json")
+        started = time.monotonic()
+
+        assessment_types = AssessmentType.objects.order_by("name")
+        if options["types"]:
+            assessment_types = assessment_types.filter(name__in=options["types"])
+        banks = export_question_banks(assessment_types)
+
+        output = io.StringIO() if path == "-" else open(path, "w", newline="", encoding="utf-8")
+        try:
+            if bank_format == "csv":
+                writer = csv.DictWriter(output, fieldnames=BANK_CSV_COLUMNS)
+                writer.writeheader()
+                writer.writerows(bank_csv_rows(banks))
+            else:
+                json.dump({"assessment_types": banks}, output, indent=2)
+                output.write("\n")
+        finally:
+            if path != "-":
+                output.close()
+
+        if path == "-":
+            self.stdout.write(output.getvalue(), ending="")
+        else:
+            self.stdout.write(
+                self.style.SUCCESS(
+                    f"Exported {len(banks)} question banks in {time.monotonic() - started:.2f}s"
+                )
+            )
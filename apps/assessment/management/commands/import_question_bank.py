@@ -0,0 +1,53 @@
+import csv
+import json
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from apps.assessment.question_bank import (
+    QuestionBankImportError,
+    import_question_banks,
+    parse_bank_csv,
+)
+
+
+class Command(BaseCommand):
+    help = (
+        "Upsert assessment types, questions and answers from a JSON or CSV question bank "
+        "in one transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="Path of the bank file.")
+        parser.add_argument(
+            "--format",
+            dest="bank_format",
+            choices=["json", "csv"],
+            help="Bank format, inferred from the file extension by default.",
+        )
+
+    def handle(self, *args, **options):
+        path = options["path"]
+        bank_format = options["bank_format"] or ("csv" if path.lower().endswith(".csv") else "json")
+        started = time.monotonic()
+
+        try:
+            with open(path, newline="", encoding="utf-8") as bank_file:
+                if bank_format == "csv":
+                    banks = parse_bank_csv(csv.DictReader(bank_file))
+                else:
+                    document = json.load(bank_file)
+                    banks = document.get("assessment_types", []) if isinstance(document, dict) else document
+            with transaction.atomic():
+                stats = import_question_banks(banks)
+        except (OSError, ValueError, QuestionBankImportError) as e:
+            raise CommandError(f"Could not import question bank: {e}")
+
+        for model, counts in stats.items():
+            self.stdout.write(f"{model}: {counts['created']} created, {counts['updated']} updated")
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Imported {len(banks)} question banks in {time.monotonic() - started:.2f}s"
+            )
+        )
@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from apps.assessment.models import Assessment
+
+
+class Command(BaseCommand):
+    help = "Rebuild correct/answered counters and final scores of assessments from their results."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of assessments rebuilt per transaction.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        started = time.monotonic()
+        last_pk = None
+        total = 0
+
+        while True:
+            queryset = Assessment.objects.order_by("pk")
+            if last_pk is not None:
+                queryset = queryset.filter(pk__gt=last_pk)
+            assessment_ids = list(queryset.values_list("pk", flat=True)[:chunk_size])
+            if not assessment_ids:
+                break
+
+            with transaction.atomic():
+                total += Assessment.rebuild_counters(assessment_ids)
+            last_pk = assessment_ids[-1]
+            self.stdout.write(f"Rebuilt {total} assessments")
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Rebuilt counters for {total} assessments in {time.monotonic() - started:.2f}s"
+            )
+        )
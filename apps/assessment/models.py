@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import Case, Count, F, Q, Value, When
 from django.contrib.auth import get_user_model
 from django.utils import timezone
 from apps.utils.abstracts import AbstractUUID, TimeStampedModel
+from apps.utils.enums import ProgressStatusEnum
 
 User = get_user_model()
 
@@ -11,6 +13,7 @@ class AssessmentType(AbstractUUID, TimeStampedModel):
     """Stores types of assessments (e.g., Cognitive Test, Physical Exam)"""
     name = models.CharField(max_length=255)
     description = models.CharField(max_length=255)
+    question_bank_version = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.name}"
@@ -40,20 +43,73 @@ class Assessment(AbstractUUID, TimeStampedModel):
     patient = models.ForeignKey(User, on_delete=models.CASCADE, related_name="patient_assessments")
     assessment_type = models.ForeignKey(AssessmentType, on_delete=models.CASCADE)
     date = models.DateTimeField(default=timezone.now)
-    final_score = models.IntegerField(default=0)  # This could be dynamically calculated based on results.
-
-    def calculate_final_score(self):
-        """Calculate the final score based on correct answers in AssessmentResult."""
-        correct_answers = self.results.filter(answer__is_correct=True).count()
-        total_questions = self.results.count()
+    final_score = models.IntegerField(default=0, db_index=True)
+    correct_count = models.PositiveIntegerField(default=0)
+    answered_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            # Stable key for keyset pagination of assessment lists
+            models.Index(fields=["created_at", "id"], name="assessment_created_id_idx"),
+        ]
+
+    @staticmethod
+    def score_from_counts(correct_answers, total_questions):
+        """Percentage of correct answers, the single scoring rule for assessments."""
         if total_questions == 0:
             return 0
-        return int((correct_answers / total_questions) * 100)
+        return correct_answers * 100 // total_questions
 
-    def save(self, *args, **kwargs):
-        """Override save method to calculate final score before saving."""
+    def calculate_final_score(self):
+        """Calculate the final score from the stored result counters."""
+        return self.score_from_counts(self.correct_count, self.answered_count)
+
+    def set_counters(self, correct_count, answered_count):
+        """Set the result counters and the final score derived from them."""
+        self.correct_count = correct_count
+        self.answered_count = answered_count
         self.final_score = self.calculate_final_score()
-        super().save(*args, **kwargs)
+
+    def set_score_from_results(self, results):
+        """Set counters and final score from in-memory AssessmentResult objects, without querying."""
+        correct_answers = sum(1 for result in results if result.answer.is_correct)
+        self.set_counters(correct_answers, len(results))
+
+    @classmethod
+    def adjust_counters(cls, assessment_id, correct_delta, answered_delta):
+        """Apply counter deltas in a single UPDATE and rescore from the new counters."""
+        correct = F("correct_count") + correct_delta
+        answered = F("answered_count") + answered_delta
+        cls.objects.filter(pk=assessment_id).update(
+            correct_count=correct,
+            answered_count=answered,
+            final_score=Case(
+                When(answered_count__lte=-answered_delta, then=Value(0)),
+                default=correct * 100 / answered,
+                output_field=models.IntegerField(),
+            ),
+        )
+
+    @classmethod
+    def rebuild_counters(cls, assessment_ids):
+        """Recompute counters and final scores of the given assessments from their results."""
+        counts = {
+            row["assessment_id"]: row
+            for row in AssessmentResult.objects.filter(assessment_id__in=assessment_ids)
+            .values("assessment_id")
+            .annotate(
+                answered=Count("id"),
+                correct=Count("id", filter=Q(answer__is_correct=True)),
+            )
+        }
+        assessments = list(cls.objects.filter(pk__in=assessment_ids).only("id"))
+        for assessment in assessments:
+            row = counts.get(assessment.id, {})
+            assessment.set_counters(row.get("correct", 0), row.get("answered", 0))
+        cls.objects.bulk_update(
+            assessments, ["correct_count", "answered_count", "final_score"]
+        )
+        return len(assessments)
 
     def __str__(self):
         return f"Assessment ({self.assessment_type}) by {self.practitioner} for {self.patient} on {self.date}"
@@ -65,6 +121,62 @@ class AssessmentResult(AbstractUUID, TimeStampedModel):
     question = models.ForeignKey(Question, on_delete=models.CASCADE)
     answer = models.ForeignKey(Answer, on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["assessment", "question"],
+                name="unique_result_per_assessment_question",
+            )
+        ]
+
     def __str__(self):
         return f"Result: {self.assessment} - Question: {self.question}"
 
+    def save(self, *args, **kwargs):
+        """Keep the assessment counters in step with single-row writes (bulk paths adjust them directly)."""
+        was_correct = None
+        if not self._state.adding:
+            was_correct = (
+                AssessmentResult.objects.filter(pk=self.pk)
+                .values_list("answer__is_correct", flat=True)
+                .first()
+            )
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if was_correct is None:
+                Assessment.adjust_counters(self.assessment_id, int(self.answer.is_correct), 1)
+            elif was_correct != self.answer.is_correct:
+                Assessment.adjust_counters(self.assessment_id, 1 if self.answer.is_correct else -1, 0)
+
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            deleted = super().delete(*args, **kwargs)
+            Assessment.adjust_counters(self.assessment_id, -int(self.answer.is_correct), -1)
+        return deleted
+
+
+
+class RescoreJob(AbstractUUID, TimeStampedModel):
+    """Tracks a background rescoring of every assessment of a type after its answer key changed."""
+    assessment_type = models.ForeignKey(AssessmentType, on_delete=models.CASCADE, related_name="rescore_jobs")
+    status = models.CharField(
+        max_length=20,
+        choices=ProgressStatusEnum.choices(),
+        default=ProgressStatusEnum.PENDING,
+    )
+    total = models.PositiveIntegerField(default=0)
+    processed = models.PositiveIntegerField(default=0)
+    rescored = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True, default="")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    @property
+    def progress(self):
+        """Share of the assessments processed so far, as a percentage."""
+        if not self.total:
+            return 100 if self.status == ProgressStatusEnum.COMPLETED else 0
+        return self.processed * 100 // self.total
+
+    def __str__(self):
+        return f"Rescore {self.assessment_type} ({self.status})"
@@ -0,0 +1,362 @@
+"""
+Compiled, versioned snapshots of the questions and answers of an assessment type.
+
+Question banks change rarely but are read on every assessment start and submission,
+so they are compiled once per version and kept in the cache. Any Question or Answer
+write bumps ``AssessmentType.question_bank_version`` and, once the transaction
+commits, gives the bank a new cache generation. Snapshots are keyed by generation,
+so a snapshot compiled from rows read before the commit can only be stored under
+the old generation, where no reader looks any more.
+"""
+import uuid
+from collections import defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Answer, AssessmentType, Question
+
+QUESTION_BANK_CACHE_KEY = "assessment:question_bank:{}:{}"
+QUESTION_BANK_GENERATION_KEY = "assessment:question_bank_generation:{}"
+QUESTION_BANK_CACHE_TIMEOUT = 60 * 60
+
+
+class QuestionBank:
+    """Serialized questions and answer key of one assessment type at a given version."""
+
+    def __init__(self, assessment_type_id, version, questions):
+        self.assessment_type_id = assessment_type_id
+        self.version = version
+        self.questions = questions
+        self.question_ids = set()
+        self.answer_key = {}
+        for question in questions:
+            question_id = uuid.UUID(question["id"])
+            self.question_ids.add(question_id)
+            for answer in question["answers"]:
+                self.answer_key[uuid.UUID(answer["id"])] = (
+                    question_id,
+                    answer["is_correct"],
+                )
+
+    def get_question(self, question_id):
+        """Return an unsaved Question carrying the fields needed for validation, or None."""
+        if question_id not in self.question_ids:
+            return None
+        return Question(id=question_id, assessment_type_id=self.assessment_type_id)
+
+    def get_answer(self, answer_id):
+        """Return an unsaved Answer carrying the fields needed for scoring, or None."""
+        entry = self.answer_key.get(answer_id)
+        if entry is None:
+            return None
+        question_id, is_correct = entry
+        return Answer(id=answer_id, question_id=question_id, is_correct=is_correct)
+
+
+def question_bank_cache_key(assessment_type_id, generation):
+    return QUESTION_BANK_CACHE_KEY.format(assessment_type_id, generation)
+
+
+def question_bank_generation(assessment_type_id):
+    """The current cache generation of a bank, starting a new one if the cache lost it."""
+    key = QUESTION_BANK_GENERATION_KEY.format(assessment_type_id)
+    generation = cache.get(key)
+    if generation is None:
+        # Generations are never reused, so a lost one cannot revive old snapshots
+        generation = uuid.uuid4().hex
+        if not cache.add(key, generation, None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def invalidate_question_banks(assessment_type_ids):
+    """Start a new cache generation for the given banks once the transaction commits."""
+    keys = [QUESTION_BANK_GENERATION_KEY.format(type_id) for type_id in assessment_type_ids]
+    transaction.on_commit(
+        lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+    )
+
+
+def build_question_bank(assessment_type_id):
+    """Compile the question bank of an assessment type from the database in three queries."""
+    version = (
+        AssessmentType.objects.filter(pk=assessment_type_id)
+        .values_list("question_bank_version", flat=True)
+        .first()
+    )
+    if version is None:
+        return None
+
+    answers = defaultdict(list)
+    for row in (
+        Answer.objects.filter(question__assessment_type_id=assessment_type_id)
+        .order_by("created_at")
+        .values("id", "question_id", "text", "is_correct")
+    ):
+        answers[row["question_id"]].append(
+            {
+                "id": str(row["id"]),
+                "text": row["text"],
+                "is_correct": row["is_correct"],
+            }
+        )
+
+    questions = [
+        {"id": str(row["id"]), "text": row["text"], "answers": answers[row["id"]]}
+        for row in Question.objects.filter(assessment_type_id=assessment_type_id)
+        .order_by("created_at")
+        .values("id", "text")
+    ]
+    return QuestionBank(assessment_type_id, version, questions)
+
+
+def get_question_bank(assessment_type_id):
+    """Return the cached question bank of an assessment type, compiling it on a miss."""
+    # Read the generation before the rows: if a write commits while the bank is
+    # compiled, the snapshot lands under a generation that is already retired
+    key = question_bank_cache_key(
+        assessment_type_id, question_bank_generation(assessment_type_id)
+    )
+    bank = cache.get(key)
+    if bank is None:
+        bank = build_question_bank(assessment_type_id)
+        if bank is not None:
+            cache.set(key, bank, QUESTION_BANK_CACHE_TIMEOUT)
+    return bank
+
+
+def bump_question_bank_versions(assessment_type_ids):
+    """Bump the version of the given banks and retire their snapshots once the transaction commits."""
+    assessment_type_ids = {type_id for type_id in assessment_type_ids if type_id}
+    if not assessment_type_ids:
+        return
+    AssessmentType.objects.filter(pk__in=assessment_type_ids).update(
+        question_bank_version=F("question_bank_version") + 1
+    )
+    invalidate_question_banks(assessment_type_ids)
+
+
+def resolve_questions_and_answers(assessment_type_ids, question_ids, answer_ids):
+    """
+    Resolve question and answer ids from the cached banks of the given types. Ids
+    missing from the banks fall back to one database query per model.
+    """
+    questions, answers = {}, {}
+    for assessment_type_id in assessment_type_ids:
+        bank = get_question_bank(assessment_type_id)
+        if bank is None:
+            continue
+        for question_id in question_ids:
+            question = bank.get_question(question_id)
+            if question is not None:
+                questions[question_id] = question
+        for answer_id in answer_ids:
+            answer = bank.get_answer(answer_id)
+            if answer is not None:
+                answers[answer_id] = answer
+
+    missing_questions = set(question_ids) - questions.keys()
+    if missing_questions:
+        questions.update(
+            Question.objects.only("id", "assessment_type_id").in_bulk(missing_questions)
+        )
+    missing_answers = set(answer_ids) - answers.keys()
+    if missing_answers:
+        answers.update(
+            Answer.objects.only("id", "question_id", "is_correct").in_bulk(missing_answers)
+        )
+    return questions, answers
+
+
+BANK_CSV_COLUMNS = [
+    "assessment_type",
+    "assessment_type_description",
+    "question_id",
+    "question",
+    "answer_id",
+    "answer",
+    "is_correct",
+]
+
+
+class QuestionBankImportError(Exception):
+    pass
+
+
+def parse_bank_csv(rows):
+    """Group flat CSV rows (one per answer) into the nested bank format."""
+    banks, questions = {}, {}
+    for line, row in enumerate(rows, start=2):
+        name = (row.get("assessment_type") or "").strip()
+        if not name:
+            raise QuestionBankImportError(f"Line {line}: assessment_type is required.")
+        bank = banks.setdefault(
+            name, {"name": name, "description": row.get("assessment_type_description") or "", "questions": []}
+        )
+        question_key = (name, row.get("question_id") or row.get("question"))
+        question = questions.get(question_key)
+        if question is None:
+            question = {"id": row.get("question_id") or None, "text": row.get("question") or "", "answers": []}
+            questions[question_key] = question
+            bank["questions"].append(question)
+        if row.get("answer"):
+            question["answers"].append(
+                {
+                    "id": row.get("answer_id") or None,
+                    "text": row["answer"],
+                    "is_correct": str(row.get("is_correct", "")).strip().lower() in ("1", "true", "yes"),
+                }
+            )
+    return list(banks.values())
+
+
+def bank_csv_rows(banks):
+    """Flatten nested banks into CSV rows, one per answer (or per question without answers)."""
+    for bank in banks:
+        for question in bank["questions"]:
+            base = {
+                "assessment_type": bank["name"],
+                "assessment_type_description": bank["description"],
+                "question_id": question["id"],
+                "question": question["text"],
+            }
+            for answer in question["answers"] or [None]:
+                row = dict(base, answer_id="", answer="", is_correct="")
+                if answer is not None:
+                    row.update(answer_id=answer["id"], answer=answer["text"], is_correct=answer["is_correct"])
+                yield row
+
+
+def export_question_banks(assessment_types):
+    """Nested bank documents of the given types, read from their cached snapshots."""
+    banks = []
+    for assessment_type in assessment_types:
+        bank = get_question_bank(assessment_type.id)
+        banks.append(
+            {
+                "id": str(assessment_type.id),
+                "name": assessment_type.name,
+                "description": assessment_type.description,
+                "questions": bank.questions if bank else [],
+            }
+        )
+    return banks
+
+
+def _parse_id(value, label):
+    if not value:
+        return None
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        raise QuestionBankImportError(f"Invalid {label} id: {value}")
+
+
+def import_question_banks(banks):
+    """
+    Upsert assessment types, questions and answers from nested bank documents with
+    one bulk insert and one bulk update per model. Rows are matched by id when given,
+    otherwise by name (types) or text within their parent; nothing is deleted.
+    Bulk writes skip model signals, so the touched banks are bumped explicitly and
+    types whose answer key changed are queued for rescoring.
+    Must run inside a transaction; returns created/updated counts per model.
+    """
+    from .tasks import schedule_rescore
+
+    now = timezone.now()
+    stats = {model: {"created": 0, "updated": 0} for model in ("types", "questions", "answers")}
+
+    # Assessment types
+    if not all(bank.get("name") for bank in banks):
+        raise QuestionBankImportError("Every assessment type needs a name.")
+    type_ids = {_parse_id(bank.get("id"), "assessment type") for bank in banks} - {None}
+    types_by_id = AssessmentType.objects.in_bulk(type_ids)
+    types_by_name = {
+        assessment_type.name: assessment_type
+        for assessment_type in AssessmentType.objects.filter(name__in=[bank["name"] for bank in banks])
+    }
+    new_types, changed_types, bank_types = [], [], []
+    for bank in banks:
+        assessment_type = types_by_id.get(_parse_id(bank.get("id"), "assessment type")) or types_by_name.get(bank["name"])
+        description = bank.get("description") or ""
+        if assessment_type is None:
+            assessment_type = AssessmentType(name=bank["name"], description=description)
+            types_by_name[bank["name"]] = assessment_type
+            new_types.append(assessment_type)
+        elif (assessment_type.name, assessment_type.description) != (bank["name"], description):
+            assessment_type.name, assessment_type.description = bank["name"], description
+            assessment_type.updated_at = now
+            changed_types.append(assessment_type)
+        bank_types.append(assessment_type)
+    AssessmentType.objects.bulk_create(new_types)
+    AssessmentType.objects.bulk_update(changed_types, ["name", "description", "updated_at"])
+    stats["types"].update(created=len(new_types), updated=len(changed_types))
+
+    # Questions
+    touched_type_ids = {assessment_type.id for assessment_type in bank_types}
+    existing_questions = list(Question.objects.filter(assessment_type_id__in=touched_type_ids))
+    questions_by_id = {question.id: question for question in existing_questions}
+    questions_by_text = {(q.assessment_type_id, q.text): q for q in existing_questions}
+    new_questions, changed_questions, bank_questions = [], [], []
+    for bank, assessment_type in zip(banks, bank_types):
+        for item in bank.get("questions", []):
+            if not item.get("text"):
+                raise QuestionBankImportError(f"A question of '{bank['name']}' has no text.")
+            if sum(bool(answer.get("is_correct")) for answer in item.get("answers", [])) > 1:
+                raise QuestionBankImportError(f"Question '{item['text']}' has more than one correct answer.")
+            question = questions_by_id.get(_parse_id(item.get("id"), "question"))
+            if question is not None and question.assessment_type_id != assessment_type.id:
+                raise QuestionBankImportError(f"Question {question.id} belongs to another assessment type.")
+            question = question or questions_by_text.get((assessment_type.id, item["text"]))
+            if question is None:
+                question = Question(assessment_type=assessment_type, text=item["text"])
+                questions_by_text[(assessment_type.id, item["text"])] = question
+                new_questions.append(question)
+            elif question.text != item["text"]:
+                question.text, question.updated_at = item["text"], now
+                changed_questions.append(question)
+            bank_questions.append((question, item.get("answers", [])))
+    Question.objects.bulk_create(new_questions)
+    Question.objects.bulk_update(changed_questions, ["text", "updated_at"])
+    stats["questions"].update(created=len(new_questions), updated=len(changed_questions))
+
+    # Answers
+    existing_answers = list(
+        Answer.objects.filter(question__assessment_type_id__in=touched_type_ids)
+    )
+    answers_by_id = {answer.id: answer for answer in existing_answers}
+    answers_by_text = {(answer.question_id, answer.text): answer for answer in existing_answers}
+    new_answers, changed_answers, rescore_type_ids = [], [], set()
+    for question, items in bank_questions:
+        for item in items:
+            answer = answers_by_id.get(_parse_id(item.get("id"), "answer"))
+            if answer is not None and answer.question_id != question.id:
+                raise QuestionBankImportError(f"Answer {answer.id} belongs to another question.")
+            answer = answer or answers_by_text.get((question.id, item["text"]))
+            is_correct = bool(item.get("is_correct"))
+            if answer is None:
+                answer = Answer(question=question, text=item["text"], is_correct=is_correct)
+                answers_by_text[(question.id, item["text"])] = answer
+                new_answers.append(answer)
+            elif (answer.text, answer.is_correct) != (item["text"], is_correct):
+                if answer.is_correct != is_correct:
+                    rescore_type_ids.add(question.assessment_type_id)
+                answer.text, answer.is_correct, answer.updated_at = item["text"], is_correct, now
+                changed_answers.append(answer)
+    correct_answers = defaultdict(int)
+    for answer in answers_by_text.values():
+        correct_answers[answer.question_id] += answer.is_correct
+    for question, _ in bank_questions:
+        if correct_answers[question.id] > 1:
+            raise QuestionBankImportError(f"Question '{question.text}' would have more than one correct answer.")
+    Answer.objects.bulk_create(new_answers)
+    Answer.objects.bulk_update(changed_answers, ["text", "is_correct", "updated_at"])
+    stats["answers"].update(created=len(new_answers), updated=len(changed_answers))
+
+    bump_question_bank_versions(touched_type_ids)
+    for assessment_type_id in rescore_type_ids:
+        schedule_rescore(assessment_type_id)
+    return stats
@@ -0,0 +1,157 @@
+"""
+Vectorized rescoring of historical assessments after an answer key changed.
+
+Assessments of a type are walked in primary-key chunks. The results of each chunk
+are loaded as NumPy arrays, their ids integer-coded with ``np.unique``, and scored against the current answer key
+with ``bincount``, so the per-row work never goes through the ORM or
+``Assessment.save()``. Only assessments whose counters actually moved are written
+back, with one bulk update per chunk.
+"""
+import logging
+
+import numpy as np
+from django.db import transaction
+from django.utils import timezone
+
+from apps.utils.enums import ProgressStatusEnum
+
+from .models import Answer, Assessment, AssessmentResult, RescoreJob
+
+logger = logging.getLogger("assessment")
+
+RESCORE_CHUNK_SIZE = 2000
+
+
+def load_answer_key(assessment_type_id):
+    """
+    Return ``(answer_ids, is_correct)``: the answer ids of the type and a boolean array
+    indexed by position in ``answer_ids``. The extra last slot scores unknown answers as wrong.
+    """
+    rows = list(
+        Answer.objects.filter(question__assessment_type_id=assessment_type_id)
+        .values_list("id", "is_correct")
+    )
+    answer_ids = np.empty(len(rows), dtype=object)
+    answer_ids[:] = [answer_id for answer_id, _ in rows]
+    is_correct = np.zeros(len(rows) + 1, dtype=np.bool_)
+    is_correct[: len(rows)] = [correct for _, correct in rows]
+    return answer_ids, is_correct
+
+
+def encode(keys, values, missing):
+    """
+    Position in ``keys`` of each of ``values``, or ``missing`` for values not in
+    ``keys``. Both are object arrays of ids; one sort of their union replaces a
+    lookup per value.
+    """
+    ids, inverse = np.unique(np.concatenate([keys, values]), return_inverse=True)
+    positions = np.full(len(ids), missing, dtype=np.intp)
+    positions[inverse[: len(keys)]] = np.arange(len(keys))
+    return positions[inverse[len(keys):]]
+
+
+def score_chunk(assessment_codes, answer_codes, is_correct, size):
+    """
+    Vectorized scoring of one chunk. ``assessment_codes`` and ``answer_codes`` hold one
+    entry per result row; returns the correct count, answered count and final score
+    of each of the ``size`` assessments.
+    """
+    correct = np.bincount(
+        assessment_codes, weights=is_correct[answer_codes], minlength=size
+    ).astype(np.int64)
+    answered = np.bincount(assessment_codes, minlength=size).astype(np.int64)
+    scores = np.zeros(size, dtype=np.int64)
+    np.floor_divide(correct * 100, answered, out=scores, where=answered > 0)
+    return correct, answered, scores
+
+
+def rescore_chunk(assessments, answer_key):
+    """Rescore a chunk of assessments and bulk-update those whose counters changed."""
+    answer_ids, is_correct = answer_key
+    assessment_ids = np.empty(len(assessments), dtype=object)
+    assessment_ids[:] = [assessment.id for assessment in assessments]
+
+    rows = np.array(
+        list(
+            AssessmentResult.objects.filter(assessment_id__in=assessment_ids.tolist())
+            .values_list("assessment_id", "answer_id")
+        ),
+        dtype=object,
+    ).reshape(-1, 2)
+    assessment_codes = encode(assessment_ids, rows[:, 0], len(assessments))
+    answer_codes = encode(answer_ids, rows[:, 1], len(is_correct) - 1)
+    correct, answered, scores = score_chunk(
+        assessment_codes, answer_codes, is_correct, len(assessments)
+    )
+
+    stored = np.array(
+        [(a.correct_count, a.answered_count, a.final_score) for a in assessments],
+        dtype=np.int64,
+    ).reshape(-1, 3)
+    changed = np.flatnonzero(
+        (stored[:, 0] != correct) | (stored[:, 1] != answered) | (stored[:, 2] != scores)
+    )
+    to_update = []
+    for index in changed.tolist():
+        assessment = assessments[index]
+        assessment.correct_count = int(correct[index])
+        assessment.answered_count = int(answered[index])
+        assessment.final_score = int(scores[index])
+        to_update.append(assessment)
+    if to_update:
+        Assessment.objects.bulk_update(
+            to_update, ["correct_count", "answered_count", "final_score"]
+        )
+    return len(to_update)
+
+
+def run_rescore_job(job, chunk_size=RESCORE_CHUNK_SIZE):
+    """
+    Rescore every assessment of the job's type against the current answer key,
+    recording progress on the job after each chunk.
+    """
+    queryset = Assessment.objects.filter(assessment_type_id=job.assessment_type_id)
+    job.status = ProgressStatusEnum.IN_PROGRESS
+    job.started_at = timezone.now()
+    job.total = queryset.count()
+    job.processed = job.rescored = 0
+    job.save(update_fields=["status", "started_at", "total", "processed", "rescored", "updated_at"])
+
+    try:
+        answer_key = load_answer_key(job.assessment_type_id)
+        last_pk = None
+        while True:
+            chunk = queryset.order_by("pk").only(
+                "id", "correct_count", "answered_count", "final_score"
+            )
+            if last_pk is not None:
+                chunk = chunk.filter(pk__gt=last_pk)
+            with transaction.atomic():
+                # Lock the chunk so concurrent submissions cannot interleave with the write back
+                assessments = list(chunk.select_for_update()[:chunk_size])
+                if not assessments:
+                    break
+                rescored = rescore_chunk(assessments, answer_key)
+            last_pk = assessments[-1].pk
+            job.processed += len(assessments)
+            job.rescored += rescored
+            RescoreJob.objects.filter(pk=job.pk).update(
+                processed=job.processed, rescored=job.rescored, updated_at=timezone.now()
+            )
+    except Exception as e:
+        job.status = ProgressStatusEnum.FAILED
+        job.error = str(e)
+        job.finished_at = timezone.now()
+        job.save(update_fields=["status", "error", "finished_at", "updated_at"])
+        logger.error(f"Rescore job {job.id} failed after {job.processed} assessments: {e}")
+        raise
+
+    job.status = ProgressStatusEnum.COMPLETED
+    job.finished_at = timezone.now()
+    job.save(update_fields=["status", "finished_at", "updated_at"])
+    logger.info(
+        f"Rescore job {job.id}: rescored {job.rescored} of {job.processed} assessments "
+        f"of type {job.assessment_type_id}."
+    )
+    return job
+
@@ -1,47 +1,210 @@
+import uuid
+
+from django.db import transaction
+from django.db.models import prefetch_related_objects
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Assessment, AssessmentType, Question, Answer, AssessmentResult
+from .models import Assessment, AssessmentType, Question, Answer, AssessmentResult, RescoreJob
+from .exports import EXPORT_FORMATS, NDJSON
+from .question_bank import bump_question_bank_versions, resolve_questions_and_answers
+
+MAX_BULK_ASSESSMENTS = 500
+BULK_INSERT_BATCH_SIZE = 1000
 
 
 class AnswerSerializer(serializers.ModelSerializer):
+    id = serializers.UUIDField(required=False)
+
     class Meta:
         model = Answer
         fields = ['id', 'text', 'is_correct']
-        read_only_fields = ['id']  # Assuming id should not be modified
 
     def validate(self, attrs):
         """Ensure only one answer can be marked as correct per question."""
-        question_id = self.initial_data.get('question')
+        if self.parent is not None:
+            # Nested under a question: the whole answer set is checked in memory there
+            return attrs
+        attrs.pop('id', None)
+        question = self.context.get('question')
+        question_id = question.id if question else self.initial_data.get('question')
         if attrs.get('is_correct'):
-            if Answer.objects.filter(question_id=question_id, is_correct=True).exists():
+            correct_answers = Answer.objects.filter(question_id=question_id, is_correct=True)
+            if self.instance is not None:
+                correct_answers = correct_answers.exclude(pk=self.instance.pk)
+            if correct_answers.exists():
                 raise serializers.ValidationError("Only one answer can be marked as correct.")
         return attrs
 
 
+class QuestionListSerializer(serializers.ListSerializer):
+    def create(self, validated_data):
+        """Create all questions and all their answers with two bulk inserts."""
+        return QuestionSerializer.create_questions(validated_data)
+
+
 class QuestionSerializer(serializers.ModelSerializer):
-    answers = AnswerSerializer(many=True, read_only=True)
+    answers = AnswerSerializer(many=True, required=False)
 
     class Meta:
         model = Question
         fields = ['id', 'text', 'answers']
+        list_serializer_class = QuestionListSerializer
+
+    def validate_answers(self, answers):
+        """A question authored with its answers needs exactly one correct answer."""
+        if sum(1 for answer in answers if answer.get('is_correct')) != 1:
+            raise serializers.ValidationError("Exactly one answer must be marked as correct.")
+        if len({answer['text'] for answer in answers}) != len(answers):
+            raise serializers.ValidationError("Answers of a question must be unique.")
+        answer_ids = [answer['id'] for answer in answers if answer.get('id')]
+        if len(set(answer_ids)) != len(answer_ids):
+            raise serializers.ValidationError("An answer can only be submitted once.")
+        stored_ids = set(self.instance.answers.values_list('id', flat=True)) if self.instance else set()
+        unknown = [str(answer_id) for answer_id in answer_ids if answer_id not in stored_ids]
+        if unknown:
+            raise serializers.ValidationError(f"Unknown answer ids: {', '.join(unknown)}")
+        removed = stored_ids.difference(answer_ids)
+        if removed:
+            chosen = AssessmentResult.objects.filter(answer_id__in=removed).values_list('answer_id', flat=True).distinct()
+            chosen = sorted(str(answer_id) for answer_id in chosen)
+            if chosen:
+                raise serializers.ValidationError(
+                    f"Answers chosen in past assessments cannot be removed: {', '.join(chosen)}"
+                )
+        return answers
+
+    def create(self, validated_data):
+        return self.create_questions([validated_data])[0]
+
+    def update(self, instance, validated_data):
+        """
+        Replace the question text and its answer set: answers with an id are updated,
+        answers without one are created, and stored answers left out are deleted.
+        Validation refuses to drop answers that assessment results point at.
+        """
+        answers_data = validated_data.pop('answers', None)
+        now = timezone.now()
+        self.answer_key_changed = False
+        with transaction.atomic():
+            if 'text' in validated_data and validated_data['text'] != instance.text:
+                instance.text = validated_data['text']
+                instance.save(update_fields=['text', 'updated_at'])
+            if answers_data is not None:
+                self.answer_key_changed = self._replace_answers(instance, answers_data, now)
+                bump_question_bank_versions([instance.assessment_type_id])
+        return instance
+
+    @staticmethod
+    def _replace_answers(question, answers_data, now):
+        """Diff the submitted answers against the stored ones; returns whether the answer key changed."""
+        stored = {answer.id: answer for answer in question.answers.all()}
+        to_create, to_update, key_changed = [], [], False
+        for item in answers_data:
+            answer = stored.pop(item['id'], None) if item.get('id') else None
+            if answer is None:
+                to_create.append(Answer(question=question, text=item['text'], is_correct=item.get('is_correct', False)))
+            elif (answer.text, answer.is_correct) != (item['text'], item.get('is_correct', False)):
+                key_changed = key_changed or answer.is_correct != item.get('is_correct', False)
+                answer.text, answer.is_correct, answer.updated_at = item['text'], item.get('is_correct', False), now
+                to_update.append(answer)
+
+        if stored:
+            # Never cascade into past results, even if one was recorded after validation.
+            Answer.objects.filter(pk__in=stored.keys()).exclude(
+                pk__in=AssessmentResult.objects.filter(answer_id__in=stored.keys()).values('answer_id')
+            ).delete()
+        Answer.objects.bulk_update(to_update, ['text', 'is_correct', 'updated_at'])
+        Answer.objects.bulk_create(to_create)
+        return key_changed
+
+    @staticmethod
+    def create_questions(validated_data):
+        """
+        Build questions and their nested answers in memory and write them with one
+        bulk insert per model. Bulk inserts skip signals, so the bank is bumped here.
+        """
+        questions, answers = [], []
+        for item in validated_data:
+            answers_data = item.pop('answers', [])
+            question = Question(**item)
+            questions.append(question)
+            answers.extend(
+                Answer(question=question, text=answer['text'], is_correct=answer.get('is_correct', False))
+                for answer in answers_data
+            )
+        with transaction.atomic():
+            Question.objects.bulk_create(questions)
+            Answer.objects.bulk_create(answers)
+            bump_question_bank_versions({question.assessment_type_id for question in questions})
+        prefetch_related_objects(questions, 'answers')
+        return questions
+
+
+def check_result_rows(pairs, questions, answers, assessment_type_id=None):
+    """
+    Validate ``(question_id, answer_id)`` pairs in memory against pre-fetched
+    question and answer lookups. Returns one error dict per row, empty for valid rows.
+    """
+    errors = []
+    seen = set()
+    for question_id, answer_id in pairs:
+        question = questions.get(question_id)
+        answer = answers.get(answer_id)
+        if question is None:
+            errors.append({'question': ["Invalid question."]})
+        elif answer is None:
+            errors.append({'answer': ["Invalid answer."]})
+        elif answer.question_id != question.id:
+            errors.append({'non_field_errors': ["The answer does not belong to the provided question."]})
+        elif assessment_type_id is not None and question.assessment_type_id != assessment_type_id:
+            errors.append({'question': ["The question does not belong to the assessment type."]})
+        elif question_id in seen:
+            errors.append({'question': ["This question has already been answered."]})
+        else:
+            errors.append({})
+        seen.add(question_id)
+    return errors
+
+
+class AssessmentResultListSerializer(serializers.ListSerializer):
+    """
+    Resolves all questions and answers of a submission from the cached question bank
+    of the assessment type, with at most one query per model for ids it does not hold.
+    Rows are checked against the submitted type here too, so every bad row is
+    reported in one pass.
+    """
+
+    def to_internal_value(self, data):
+        rows = super().to_internal_value(data)
+        assessment_type_id = self.get_assessment_type_id()
+        questions, answers = resolve_questions_and_answers(
+            [assessment_type_id] if assessment_type_id else [],
+            {row['question_id'] for row in rows},
+            {row['answer_id'] for row in rows},
+        )
+        pairs = [(row['question_id'], row['answer_id']) for row in rows]
+        errors = check_result_rows(pairs, questions, answers, assessment_type_id)
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return [
+            {'question': questions[question_id], 'answer': answers[answer_id]}
+            for question_id, answer_id in pairs
+        ]
+
+    def get_assessment_type_id(self):
+        """The assessment type of the parent submission, or None when it has none."""
+        get_assessment_type_id = getattr(self.parent, 'get_assessment_type_id', None)
+        return get_assessment_type_id() if get_assessment_type_id else None
 
 
 class AssessmentResultSerializer(serializers.ModelSerializer):
-    question = serializers.PrimaryKeyRelatedField(queryset=Question.objects.all())
-    answer = serializers.PrimaryKeyRelatedField(queryset=Answer.objects.all())
+    question = serializers.UUIDField(source='question_id')
+    answer = serializers.UUIDField(source='answer_id')
 
     class Meta:
         model = AssessmentResult
         fields = ['question', 'answer']
-
-    def validate(self, data):
-        """
-        Validate that the provided answer belongs to the question.
-        """
-        question = data.get('question')
-        answer = data.get('answer')
-        if answer.question != question:
-            raise serializers.ValidationError("The answer does not belong to the provided question.")
-        return data
+        list_serializer_class = AssessmentResultListSerializer
 
 
 class CreateAssessmentSerializer(serializers.ModelSerializer):
@@ -52,53 +215,247 @@ class CreateAssessmentSerializer(serializers.ModelSerializer):
         fields = ['assessment_type', 'patient', 'results']
         read_only_fields = ['id', 'patient']
 
+    def get_assessment_type_id(self):
+        """
+        The submitted or stored assessment type id. It selects which question bank to
+        read and which type the results are checked against; ``validate`` checks them
+        again against the resolved type.
+        """
+        raw_id = self.initial_data.get('assessment_type') if hasattr(self, 'initial_data') else None
+        if raw_id:
+            try:
+                return uuid.UUID(str(raw_id))
+            except ValueError:
+                return None
+        return getattr(self.instance, 'assessment_type_id', None)
+
+    def validate(self, attrs):
+        """Ensure every answered question belongs to the assessment type."""
+        results = attrs.get('results')
+        if 'assessment_type' in attrs:
+            assessment_type_id = attrs['assessment_type'].id
+        else:
+            assessment_type_id = getattr(self.instance, 'assessment_type_id', None)
+        if results and assessment_type_id is not None:
+            errors = [
+                {} if row['question'].assessment_type_id == assessment_type_id
+                else {'question': ["The question does not belong to the assessment type."]}
+                for row in results
+            ]
+            if any(errors):
+                raise serializers.ValidationError({'results': errors})
+        return attrs
+
     def create(self, validated_data):
+        """Build the assessment and its results in memory, then write each table once."""
         results_data = validated_data.pop('results', [])
-        assessment = Assessment.objects.create(**validated_data)
-        self._handle_results(assessment, results_data)
+        assessment = Assessment(**validated_data)
+        results = self._build_results(assessment, results_data)
+        assessment.set_score_from_results(results)
+
+        with transaction.atomic():
+            assessment.save(force_insert=True)
+            AssessmentResult.objects.bulk_create(results)
         return assessment
 
     def update(self, instance, validated_data):
-        results_data = validated_data.pop('results', [])
-        instance.assessment_type = validated_data.get('assessment_type', instance.assessment_type)
-        instance.patient = validated_data.get('patient', instance.patient)
-        instance.save()
+        """
+        Apply field changes and diff the submitted results against the stored ones;
+        the assessment is only rescored when a result actually changed. The counts
+        of each diff bucket are exposed on ``self.result_changes``.
+        """
+        results_data = validated_data.pop('results', None)
+        for field in ('assessment_type', 'patient'):
+            if field in validated_data:
+                setattr(instance, field, validated_data[field])
 
-        # Update results by clearing old ones and creating new ones
-        instance.results.all().delete()
-        self._handle_results(instance, results_data)
+        self.result_changes = None
+        with transaction.atomic():
+            if results_data is not None:
+                self.result_changes = self._sync_results(instance, results_data)
+            instance.save()
 
         return instance
 
-    def _handle_results(self, assessment, results_data):
+    def _sync_results(self, assessment, results_data):
         """
-        Handle the creation of AssessmentResult and calculation of the final score.
+        Upsert results keyed on (assessment, question): unchanged rows are left alone,
+        changed answers are bulk-updated, dropped questions bulk-deleted and new ones
+        bulk-inserted. The assessment counters are adjusted by the diff.
         """
-        results = []
-        total_score = 0
-
-        for result_data in results_data:
-            question = result_data.get('question')
-            answer = result_data.get('answer')
-
-            # Check if the answer is correct and accumulate the score
-            if answer.is_correct:
-                total_score += 2  # Assume 2 points per correct answer
-
-            results.append(
-                AssessmentResult(
-                    assessment=assessment,
-                    question=question,
-                    answer=answer
+        stored = {
+            result.question_id: result
+            for result in assessment.results.select_related('answer').only(
+                'id', 'question_id', 'answer_id', 'answer__is_correct'
+            )
+        }
+        submitted = {row['question'].id: row for row in results_data}
+
+        now = timezone.now()
+        to_create, to_update, kept = [], [], []
+        correct_delta = 0
+        for question_id, row in submitted.items():
+            result = stored.get(question_id)
+            if result is None:
+                to_create.append(
+                    AssessmentResult(assessment=assessment, question=row['question'], answer=row['answer'])
                 )
+                correct_delta += row['answer'].is_correct
+            elif result.answer_id != row['answer'].id:
+                correct_delta += row['answer'].is_correct - result.answer.is_correct
+                result.answer = row['answer']
+                result.updated_at = now
+                to_update.append(result)
+            else:
+                kept.append(result)
+        to_delete = []
+        for question_id, result in stored.items():
+            if question_id not in submitted:
+                to_delete.append(result.id)
+                correct_delta -= result.answer.is_correct
+
+        if to_delete:
+            AssessmentResult.objects.filter(id__in=to_delete).delete()
+        if to_update:
+            AssessmentResult.objects.bulk_update(to_update, ['answer', 'updated_at'])
+        if to_create:
+            AssessmentResult.objects.bulk_create(to_create)
+        if to_delete or to_update or to_create:
+            assessment.set_counters(
+                assessment.correct_count + correct_delta,
+                assessment.answered_count + len(to_create) - len(to_delete),
             )
 
-        # Bulk create the results to reduce the number of database hits
-        AssessmentResult.objects.bulk_create(results)
+        return {
+            'created': len(to_create),
+            'updated': len(to_update),
+            'deleted': len(to_delete),
+            'unchanged': len(kept),
+        }
+
+    @staticmethod
+    def _build_results(assessment, results_data):
+        """Create unsaved AssessmentResult objects for validated result rows."""
+        return [
+            AssessmentResult(
+                assessment=assessment,
+                question=result_data['question'],
+                answer=result_data['answer'],
+            )
+            for result_data in results_data
+        ]
+
+
+class BulkAssessmentResultSerializer(serializers.Serializer):
+    question = serializers.UUIDField()
+    answer = serializers.UUIDField()
+
+
+class BulkAssessmentItemSerializer(serializers.Serializer):
+    """Shape check for one item of a bulk submission; ids are resolved in bulk afterwards."""
+    assessment_type = serializers.UUIDField()
+    date = serializers.DateTimeField(required=False)
+    results = BulkAssessmentResultSerializer(many=True)
+
+
+class BulkAssessmentSerializer(serializers.Serializer):
+    assessments = serializers.ListField(
+        child=serializers.JSONField(),
+        allow_empty=False,
+        max_length=MAX_BULK_ASSESSMENTS,
+    )
+
+    def validate_assessments(self, items):
+        """
+        Validate every item of the batch, resolving assessment types with one query and
+        questions and answers from the cached question banks instead of per row.
+        Invalid items are collected in ``self.item_errors`` keyed by their index.
+        """
+        self.item_errors = {}
+        parsed = []
+        for index, item in enumerate(items):
+            item_serializer = BulkAssessmentItemSerializer(data=item)
+            if item_serializer.is_valid():
+                parsed.append((index, item_serializer.validated_data))
+            else:
+                self.item_errors[index] = item_serializer.errors
+
+        type_ids = {data['assessment_type'] for _, data in parsed}
+        question_ids = {row['question'] for _, data in parsed for row in data['results']}
+        answer_ids = {row['answer'] for _, data in parsed for row in data['results']}
+
+        assessment_types = AssessmentType.objects.in_bulk(type_ids)
+        questions, answers = resolve_questions_and_answers(
+            assessment_types.keys(), question_ids, answer_ids
+        )
+
+        valid_items = []
+        for index, data in parsed:
+            errors = self._check_item(data, assessment_types, questions, answers)
+            if errors:
+                self.item_errors[index] = errors
+                continue
+            valid_items.append((index, {
+                'assessment_type': assessment_types[data['assessment_type']],
+                'date': data.get('date'),
+                'results': [
+                    (questions[row['question']], answers[row['answer']])
+                    for row in data['results']
+                ],
+            }))
 
-        # Update the final score and save the assessment
-        assessment.final_score = total_score
-        assessment.save()
+        if not valid_items:
+            raise serializers.ValidationError(self.item_errors)
+        return valid_items
+
+    @staticmethod
+    def _check_item(data, assessment_types, questions, answers):
+        """Return the errors of a single item against the pre-fetched lookups."""
+        if data['assessment_type'] not in assessment_types:
+            return {'assessment_type': ["Invalid assessment type."]}
+
+        result_errors = check_result_rows(
+            [(row['question'], row['answer']) for row in data['results']],
+            questions,
+            answers,
+            assessment_type_id=data['assessment_type'],
+        )
+        if any(result_errors):
+            return {'results': result_errors}
+        return None
+
+    def create(self, validated_data):
+        """
+        Write all valid assessments and their results in one transaction using two
+        bulk inserts, and return the per-item status of the whole batch.
+        """
+        patient = validated_data['patient']
+        assessments, results, created = [], [], {}
+
+        for index, data in validated_data['assessments']:
+            assessment = Assessment(patient=patient, assessment_type=data['assessment_type'])
+            if data['date']:
+                assessment.date = data['date']
+            item_results = [
+                AssessmentResult(assessment=assessment, question=question, answer=answer)
+                for question, answer in data['results']
+            ]
+            assessment.set_score_from_results(item_results)
+            assessments.append(assessment)
+            results.extend(item_results)
+            created[index] = assessment
+
+        with transaction.atomic():
+            Assessment.objects.bulk_create(assessments, batch_size=BULK_INSERT_BATCH_SIZE)
+            AssessmentResult.objects.bulk_create(results, batch_size=BULK_INSERT_BATCH_SIZE)
+
+        items = []
+        for index in range(len(self.initial_data.get('assessments', []))):
+            if index in created:
+                items.append({'index': index, 'status': 'created', 'id': str(created[index].id)})
+            else:
+                items.append({'index': index, 'status': 'invalid', 'errors': self.item_errors[index]})
+        return {'created': len(created), 'failed': len(self.item_errors), 'items': items}
 
 
 class AssessmentSerializer(serializers.ModelSerializer):
@@ -115,3 +472,39 @@ class AssessmentTypeSerializer(serializers.ModelSerializer):
     class Meta:
         model = AssessmentType  
         fields = '__all__'  
+
+
+class RescoreJobSerializer(serializers.ModelSerializer):
+    progress = serializers.IntegerField(read_only=True)
+
+    class Meta:
+        model = RescoreJob
+        fields = [
+            'id', 'assessment_type', 'status', 'total', 'processed', 'rescored',
+            'progress', 'error', 'started_at', 'finished_at',
+        ]
+        read_only_fields = fields
+
+
+class AssessmentExportQuerySerializer(serializers.Serializer):
+    """Query parameters of the assessment export; ``format`` is left to DRF content negotiation."""
+    export_format = serializers.ChoiceField(choices=EXPORT_FORMATS, default=NDJSON)
+    date_from = serializers.DateField(required=False)
+    date_to = serializers.DateField(required=False)
+    assessment_type = serializers.UUIDField(required=False)
+    patient = serializers.UUIDField(required=False)
+
+    def validate(self, attrs):
+        if attrs.get('date_from') and attrs.get('date_to') and attrs['date_from'] > attrs['date_to']:
+            raise serializers.ValidationError({'date_to': ["date_to must not be before date_from."]})
+        return attrs
+
+    def filter_queryset(self, queryset):
+        """Apply the validated filters to an assessment queryset."""
+        filters = {
+            'date__date__gte': self.validated_data.get('date_from'),
+            'date__date__lte': self.validated_data.get('date_to'),
+            'assessment_type_id': self.validated_data.get('assessment_type'),
+            'patient_id': self.validated_data.get('patient'),
+        }
+        return queryset.filter(**{key: value for key, value in filters.items() if value is not None})
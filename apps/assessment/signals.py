@@ -0,0 +1,45 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from .models import Answer, Assessment, AssessmentResult, AssessmentType, Question
+from .question_bank import bump_question_bank_versions, invalidate_question_banks
+
+
+@receiver(pre_delete, sender=Answer)
+def rebuild_counters_after_answer_delete(sender, instance, **kwargs):
+    """Results cascade away with their answer, so rebuild the counters of the affected assessments."""
+    assessment_ids = list(
+        AssessmentResult.objects.filter(answer=instance)
+        .values_list("assessment_id", flat=True)
+        .distinct()
+    )
+    if assessment_ids:
+        transaction.on_commit(lambda: Assessment.rebuild_counters(assessment_ids))
+
+
+@receiver(post_save, sender=Question)
+@receiver(post_delete, sender=Question)
+def bump_question_bank_on_question_write(sender, instance, **kwargs):
+    bump_question_bank_versions([instance.assessment_type_id])
+
+
+@receiver(post_save, sender=Answer)
+@receiver(post_delete, sender=Answer)
+def bump_question_bank_on_answer_write(sender, instance, **kwargs):
+    if Answer.question.is_cached(instance):
+        assessment_type_id = instance.question.assessment_type_id
+    else:
+        # The question may already be gone when answers are removed by a cascade,
+        # in which case the question's own signal bumps the bank.
+        assessment_type_id = (
+            Question.objects.filter(pk=instance.question_id)
+            .values_list("assessment_type_id", flat=True)
+            .first()
+        )
+    bump_question_bank_versions([assessment_type_id])
+
+
+@receiver(post_delete, sender=AssessmentType)
+def drop_question_bank_on_type_delete(sender, instance, **kwargs):
+    invalidate_question_banks([instance.pk])
@@ -0,0 +1,36 @@
+import logging
+
+from celery import shared_task
+from django.db import transaction
+
+from apps.utils.enums import ProgressStatusEnum
+
+from .models import RescoreJob
+from .rescoring import run_rescore_job
+
+logger = logging.getLogger("assessment")
+
+
+@shared_task
+def rescore_assessment_type(job_id):
+    """Background entry point of a rescoring job."""
+    job = RescoreJob.objects.filter(pk=job_id, status=ProgressStatusEnum.PENDING).first()
+    if job is None:
+        logger.info(f"Rescore job {job_id} is no longer pending, skipping.")
+        return None
+    run_rescore_job(job)
+    return str(job.id)
+
+
+def schedule_rescore(assessment_type_id):
+    """
+    Queue a rescoring of the type once the current transaction commits. A job that has
+    not started yet will read the newest answer key, so it is reused instead of queuing another.
+    """
+    job = RescoreJob.objects.filter(
+        assessment_type_id=assessment_type_id, status=ProgressStatusEnum.PENDING
+    ).first()
+    if job is None:
+        job = RescoreJob.objects.create(assessment_type_id=assessment_type_id)
+        transaction.on_commit(lambda: rescore_assessment_type.delay(str(job.id)))
+    return job
@@ -0,0 +1,75 @@
+import csv
+import io
+import json
+
+from django.contrib.auth.models import Group
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.users.models import User
+from apps.utils.enums import UserGroup, UserType
+from ..models import AssessmentType, Question, Answer, Assessment, AssessmentResult
+
+
+class AssessmentExportTests(APITestCase):
+    def setUp(self):
+        self.practitioner = User.objects.create_user(
+            first_name="Uncle",
+            last_name="Rukus",
+            phone_number="1234567890",
+            email="sistermagret007@gmail.com",
+            username="sistermagret007@gmail.com",
+            password="password123",
+            user_role=UserType.PRACTITIONER,
+        )
+        group, _ = Group.objects.get_or_create(name=UserGroup.PRACTITIONER)
+        self.practitioner.groups.add(group)
+        self.patient = User.objects.create_user(
+            first_name="Huey",
+            last_name="Freeman",
+            phone_number="0987654321",
+            email="huey@example.com",
+            username="huey@example.com",
+            password="password123",
+        )
+        self.assessment_type = AssessmentType.objects.create(name="Memory", description="Memory")
+        question = Question.objects.create(text="Do you forget?", assessment_type=self.assessment_type)
+        answer = Answer.objects.create(question=question, text="No", is_correct=True)
+        self.assessment = Assessment.objects.create(
+            patient=self.patient, assessment_type=self.assessment_type
+        )
+        AssessmentResult.objects.create(assessment=self.assessment, question=question, answer=answer)
+        other_type = AssessmentType.objects.create(name="Mood", description="Mood")
+        self.empty = Assessment.objects.create(patient=self.patient, assessment_type=other_type)
+        self.client.force_authenticate(self.practitioner)
+        self.url = reverse("assessment-api-export")
+
+    def content(self, response):
+        return b"".join(response.streaming_content).decode()
+
+    def test_ndjson_export_nests_flattened_results(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        documents = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(
+            [document["assessment_id"] for document in documents],
+            [str(self.assessment.id), str(self.empty.id)],
+        )
+        self.assertEqual(documents[0]["final_score"], 100)
+        self.assertEqual(documents[0]["results"][0]["answer"], "No")
+        self.assertEqual(documents[1]["results"], [])
+
+    def test_csv_export_filters_by_type(self):
+        response = self.client.get(
+            self.url, {"export_format": "csv", "assessment_type": str(self.assessment_type.id)}
+        )
+        rows = list(csv.DictReader(io.StringIO(self.content(response))))
+        self.assertEqual(len(rows), 1)
+        self.assertEqual(rows[0]["assessment_id"], str(self.assessment.id))
+        self.assertEqual(rows[0]["is_correct"], "True")
+
+    def test_invalid_filters_are_rejected(self):
+        response = self.client.get(self.url, {"date_from": "2024-02-01", "date_to": "2024-01-01"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
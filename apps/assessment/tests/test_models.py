@@ -1,3 +1,6 @@
+from io import StringIO
+
+from django.core.management import call_command
 from django.test import TestCase
 from django.contrib.auth import get_user_model
 from ..models import (
@@ -102,3 +105,64 @@ class AssessmentModelsTests(TestCase):
         Answer.objects.all().delete()
         Assessment.objects.all().delete()
         AssessmentResult.objects.all().delete()
+
+
+class AssessmentCounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username="sistermagret007@gmail.com", password="password123"
+        )
+        self.assessment_type = AssessmentType.objects.create(
+            name="Mental Health Assessment",
+            description="A detailed assessment of mental health.",
+        )
+        self.questions = [
+            Question.objects.create(text=f"Question {index}", assessment_type=self.assessment_type)
+            for index in range(3)
+        ]
+        self.correct = [
+            Answer.objects.create(question=question, text="Yes", is_correct=True)
+            for question in self.questions
+        ]
+        self.wrong = [
+            Answer.objects.create(question=question, text="No")
+            for question in self.questions
+        ]
+        self.assessment = Assessment.objects.create(
+            assessment_type=self.assessment_type, patient=self.user
+        )
+
+    def test_single_result_writes_adjust_counters(self):
+        """Creating, changing and deleting a result keeps counters and score in step."""
+        first = AssessmentResult.objects.create(
+            assessment=self.assessment, question=self.questions[0], answer=self.correct[0]
+        )
+        AssessmentResult.objects.create(
+            assessment=self.assessment, question=self.questions[1], answer=self.wrong[1]
+        )
+        self.assessment.refresh_from_db()
+        self.assertEqual((self.assessment.correct_count, self.assessment.answered_count), (1, 2))
+        self.assertEqual(self.assessment.final_score, 50)
+
+        first.answer = self.wrong[0]
+        first.save()
+        self.assessment.refresh_from_db()
+        self.assertEqual((self.assessment.correct_count, self.assessment.answered_count), (0, 2))
+        self.assertEqual(self.assessment.final_score, 0)
+
+        first.delete()
+        self.assessment.refresh_from_db()
+        self.assertEqual((self.assessment.correct_count, self.assessment.answered_count), (0, 1))
+
+    def test_rebuild_counters_command(self):
+        """Legacy rows with stale counters are rebuilt from their results."""
+        AssessmentResult.objects.bulk_create(
+            [
+                AssessmentResult(assessment=self.assessment, question=question, answer=answer)
+                for question, answer in zip(self.questions, [self.correct[0], self.correct[1], self.wrong[2]])
+            ]
+        )
+        call_command("rebuild_assessment_counters", chunk_size=1, stdout=StringIO())
+        self.assessment.refresh_from_db()
+        self.assertEqual((self.assessment.correct_count, self.assessment.answered_count), (2, 3))
+        self.assertEqual(self.assessment.final_score, 66)
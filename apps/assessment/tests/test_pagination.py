@@ -0,0 +1,85 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from apps.utils.pagination import CustomPaginator, InvalidCursor
+from apps.utils.search import RankedSearchFilter
+from ..models import AssessmentType
+from ..serializers import AssessmentTypeSerializer
+
+
+class CursorPaginationTests(TestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+        self.paginator = CustomPaginator()
+        for index in range(5):
+            AssessmentType.objects.create(name=f"Type {index}", description="Test")
+        # Two rows sharing a timestamp exercise the id tie-breaker
+        AssessmentType.objects.filter(name__in=["Type 1", "Type 2"]).update(created_at=timezone.now())
+        self.expected = [
+            str(pk)
+            for pk in AssessmentType.objects.order_by("-created_at", "-id").values_list("id", flat=True)
+        ]
+
+    def page(self, queryset=None, **params):
+        request = Request(self.factory.get("/", params))
+        return self.paginator.generate_response(
+            AssessmentType.objects.all() if queryset is None else queryset,
+            AssessmentTypeSerializer,
+            request,
+        )
+
+    def ids(self, response):
+        return [row["id"] for row in response["results"]]
+
+    def test_pages_forward_and_back_without_counting(self):
+        with self.assertNumQueries(1):
+            first = self.page(pagination="cursor", limit=2)
+        self.assertEqual(self.ids(first), self.expected[:2])
+        self.assertIsNone(first["previous"])
+        self.assertIsNone(first["total"])
+
+        second = self.page(cursor=first["next"], limit=2)
+        third = self.page(cursor=second["next"], limit=2)
+        self.assertEqual(self.ids(second), self.expected[2:4])
+        self.assertEqual(self.ids(third), self.expected[4:])
+        self.assertIsNone(third["next"])
+
+        back = self.page(cursor=third["previous"], limit=2)
+        self.assertEqual(self.ids(back), self.expected[2:4])
+        self.assertEqual(self.ids(self.page(cursor=back["previous"], limit=2)), self.expected[:2])
+
+    def test_page_number_mode_is_default(self):
+        response = self.page(limit=2)
+        self.assertEqual(response["total"], 5)
+        self.assertNotIn("next", response)
+
+    def test_cursor_pages_keep_the_search_rank(self):
+        best = AssessmentType.objects.create(name="Type", description="Test")
+        # Oldest of all, so only its rank can put it first
+        AssessmentType.objects.filter(pk=best.pk).update(
+            created_at=timezone.now() - timedelta(days=1)
+        )
+        view = type("View", (), {"search_fields": ["name"]})()
+        request = Request(self.factory.get("/", {"search": "Type"}))
+        searched = RankedSearchFilter().filter_queryset(
+            request, AssessmentType.objects.all(), view
+        )
+
+        first = self.page(searched, pagination="cursor", limit=2)
+        ids = self.ids(first)
+        response = first
+        while response["next"]:
+            response = self.page(searched, cursor=response["next"], limit=2)
+            ids += self.ids(response)
+        self.assertEqual(ids, [str(best.id)] + self.expected)
+
+    def test_invalid_cursor(self):
+        with self.assertRaises(InvalidCursor):
+            self.page(cursor="not-a-cursor")
+        bad_position = CustomPaginator.encode_cursor(["yesterday", "x"])
+        with self.assertRaises(InvalidCursor):
+            self.page(cursor=bad_position)
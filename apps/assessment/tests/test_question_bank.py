@@ -0,0 +1,162 @@
+import json
+import os
+import tempfile
+from io import StringIO
+from unittest import mock
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from ..models import AssessmentType, Question, Answer, RescoreJob
+from ..question_bank import (
+    build_question_bank,
+    get_question_bank,
+    resolve_questions_and_answers,
+)
+
+
+class QuestionBankTests(TestCase):
+    def setUp(self):
+        self.assessment_type = AssessmentType.objects.create(
+            name="Psychological Assessment",
+            description="Assessment for psychological conditions.",
+        )
+        self.question = Question.objects.create(
+            text="Do you feel anxious?", assessment_type=self.assessment_type
+        )
+        self.answer = Answer.objects.create(
+            question=self.question, text="No", is_correct=True
+        )
+
+    def test_cached_bank_is_served_without_queries(self):
+        bank = get_question_bank(self.assessment_type.id)
+        self.assertEqual(
+            bank.questions,
+            [{
+                "id": str(self.question.id),
+                "text": self.question.text,
+                "answers": [{"id": str(self.answer.id), "text": "No", "is_correct": True}],
+            }],
+        )
+        with self.assertNumQueries(0):
+            cached = get_question_bank(self.assessment_type.id)
+        self.assertEqual(cached.version, bank.version)
+
+    def test_writes_bump_version_and_drop_snapshot(self):
+        bank = get_question_bank(self.assessment_type.id)
+        with self.captureOnCommitCallbacks(execute=True):
+            Answer.objects.create(question=self.question, text="Yes")
+
+        self.assessment_type.refresh_from_db()
+        self.assertEqual(self.assessment_type.question_bank_version, bank.version + 1)
+        bank = get_question_bank(self.assessment_type.id)
+        self.assertEqual(bank.version, self.assessment_type.question_bank_version)
+        self.assertEqual(len(bank.questions[0]["answers"]), 2)
+
+    def test_bank_built_across_a_commit_is_not_served_afterwards(self):
+        def build_then_commit_a_write(assessment_type_id):
+            bank = build_question_bank(assessment_type_id)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.answer.is_correct = False
+                self.answer.save()
+            return bank
+
+        with mock.patch(
+            "apps.assessment.question_bank.build_question_bank",
+            side_effect=build_then_commit_a_write,
+        ):
+            stale = get_question_bank(self.assessment_type.id)
+        self.assertTrue(stale.answer_key[self.answer.id][1])
+
+        bank = get_question_bank(self.assessment_type.id)
+        self.assertFalse(bank.answer_key[self.answer.id][1])
+        self.assertEqual(bank.version, stale.version + 1)
+
+    def test_ids_missing_from_bank_fall_back_to_database(self):
+        get_question_bank(self.assessment_type.id)
+        other_type = AssessmentType.objects.create(name="Other", description="Other")
+        foreign = Question.objects.create(text="Foreign", assessment_type=other_type)
+
+        with self.assertNumQueries(1):
+            questions, answers = resolve_questions_and_answers(
+                [self.assessment_type.id], {self.question.id, foreign.id}, {self.answer.id}
+            )
+        self.assertEqual(questions[foreign.id].assessment_type_id, other_type.id)
+        self.assertTrue(answers[self.answer.id].is_correct)
+
+
+class QuestionBankCommandTests(TestCase):
+    def setUp(self):
+        self.bank = {
+            "assessment_types": [
+                {
+                    "name": "Memory",
+                    "description": "Memory checks",
+                    "questions": [
+                        {
+                            "text": f"Question {index}",
+                            "answers": [
+                                {"text": "Yes", "is_correct": True},
+                                {"text": "No", "is_correct": False},
+                            ],
+                        }
+                        for index in range(3)
+                    ],
+                }
+            ]
+        }
+
+    def import_bank(self, bank, suffix=".json"):
+        with tempfile.NamedTemporaryFile("w", suffix=suffix, delete=False) as bank_file:
+            if suffix == ".json":
+                json.dump(bank, bank_file)
+            else:
+                bank_file.write(bank)
+        self.addCleanup(os.remove, bank_file.name)
+        call_command("import_question_bank", bank_file.name, stdout=StringIO())
+
+    def test_import_upserts_and_export_round_trips(self):
+        self.import_bank(self.bank)
+        assessment_type = AssessmentType.objects.get(name="Memory")
+        self.assertEqual(assessment_type.questions.count(), 3)
+        self.assertEqual(Answer.objects.filter(question__assessment_type=assessment_type).count(), 6)
+        version = assessment_type.question_bank_version
+
+        out = StringIO()
+        call_command("export_question_bank", "--type", "Memory", stdout=out)
+        exported = json.loads(out.getvalue())
+        question = exported["assessment_types"][0]["questions"][0]
+        question["text"] = "Renamed"
+        question["answers"][0]["is_correct"] = False
+        question["answers"][1]["is_correct"] = True
+        self.import_bank(exported)
+
+        assessment_type.refresh_from_db()
+        self.assertEqual(assessment_type.questions.count(), 3)
+        self.assertTrue(assessment_type.questions.filter(text="Renamed").exists())
+        self.assertTrue(Answer.objects.get(id=question["answers"][1]["id"]).is_correct)
+        self.assertEqual(assessment_type.question_bank_version, version + 1)
+        self.assertTrue(RescoreJob.objects.filter(assessment_type=assessment_type).exists())
+
+    def test_csv_import(self):
+        self.import_bank(
+            "assessment_type,assessment_type_description,question_id,question,answer_id,answer,is_correct\n"
+            "Mood,Mood checks,,Are you happy?,,Yes,true\n"
+            "Mood,Mood checks,,Are you happy?,,No,false\n",
+            suffix=".csv",
+        )
+        question = Question.objects.get(text="Are you happy?")
+        self.assertEqual(question.assessment_type.name, "Mood")
+        self.assertEqual(list(question.answers.filter(is_correct=True).values_list("text", flat=True)), ["Yes"])
+
+    def test_rejects_two_correct_answers(self):
+        self.bank["assessment_types"][0]["questions"][0]["answers"][1]["is_correct"] = True
+        with self.assertRaises(CommandError):
+            self.import_bank(self.bank)
+        self.assertFalse(AssessmentType.objects.filter(name="Memory").exists())
+
+    def test_rejects_a_type_without_a_name(self):
+        del self.bank["assessment_types"][0]["name"]
+        with self.assertRaises(CommandError):
+            self.import_bank(self.bank)
+        self.assertFalse(AssessmentType.objects.exists())
@@ -0,0 +1,104 @@
+from unittest import mock
+
+import numpy as np
+from django.test import TestCase
+
+from apps.users.models import User
+from apps.utils.enums import ProgressStatusEnum
+from ..models import AssessmentType, Question, Answer, Assessment, AssessmentResult, RescoreJob
+from ..rescoring import encode, run_rescore_job, score_chunk
+from ..tasks import schedule_rescore
+
+
+class RescoringTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            first_name="Uncle",
+            last_name="Rukus",
+            phone_number="1234567890",
+            email="sistermagret007@gmail.com",
+            username="sistermagret007@gmail.com",
+            password="password123",
+            is_accept_terms_and_condition=True,
+        )
+        self.assessment_type = AssessmentType.objects.create(
+            name="Psychological Assessment",
+            description="Assessment for psychological conditions.",
+        )
+        self.questions = []
+        for index in range(2):
+            question = Question.objects.create(
+                text=f"Question {index}", assessment_type=self.assessment_type
+            )
+            yes = Answer.objects.create(question=question, text="Yes", is_correct=True)
+            no = Answer.objects.create(question=question, text="No")
+            self.questions.append((question, yes, no))
+
+    def submit(self, *answers):
+        assessment = Assessment.objects.create(
+            patient=self.user, assessment_type=self.assessment_type
+        )
+        for (question, _, _), answer in zip(self.questions, answers):
+            AssessmentResult.objects.create(assessment=assessment, question=question, answer=answer)
+        return assessment
+
+    def test_score_chunk(self):
+        is_correct = np.array([True, False, False])
+        correct, answered, scores = score_chunk(
+            np.array([0, 0, 0, 2]), np.array([0, 1, 0, 2]), is_correct, 3
+        )
+        self.assertEqual(correct.tolist(), [2, 0, 0])
+        self.assertEqual(answered.tolist(), [3, 0, 1])
+        self.assertEqual(scores.tolist(), [66, 0, 0])
+
+    def test_encode_marks_unknown_ids_as_missing(self):
+        keys = np.array(["b", "c", "a"], dtype=object)
+        values = np.array(["a", "z", "c", "a"], dtype=object)
+        self.assertEqual(encode(keys, values, 3).tolist(), [2, 3, 1, 2])
+        self.assertEqual(encode(keys[:0], values, 0).tolist(), [0, 0, 0, 0])
+
+    def test_rescore_job_applies_new_answer_key(self):
+        question, yes, no = self.questions[0]
+        both_yes = self.submit(yes, self.questions[1][1])
+        first_no = self.submit(no, self.questions[1][1])
+        both_yes.refresh_from_db()
+        self.assertEqual(both_yes.final_score, 100)
+
+        Answer.objects.filter(pk=yes.pk).update(is_correct=False)
+        Answer.objects.filter(pk=no.pk).update(is_correct=True)
+        job = RescoreJob.objects.create(assessment_type=self.assessment_type)
+        run_rescore_job(job, chunk_size=1)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProgressStatusEnum.COMPLETED)
+        self.assertEqual((job.total, job.processed, job.rescored), (2, 2, 2))
+        self.assertEqual(job.progress, 100)
+        both_yes.refresh_from_db()
+        first_no.refresh_from_db()
+        self.assertEqual((both_yes.correct_count, both_yes.final_score), (1, 50))
+        self.assertEqual((first_no.correct_count, first_no.final_score), (2, 100))
+
+    def test_schedule_rescore_runs_after_commit(self):
+        assessment = self.submit(self.questions[0][2], self.questions[1][2])
+        Answer.objects.filter(pk=self.questions[0][2].pk).update(is_correct=True)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            job = schedule_rescore(self.assessment_type.id)
+            self.assertEqual(schedule_rescore(self.assessment_type.id), job)
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, ProgressStatusEnum.COMPLETED)
+        assessment.refresh_from_db()
+        self.assertEqual(assessment.final_score, 50)
+
+    def test_failed_job_is_told_apart_from_a_cancelled_one(self):
+        self.submit(self.questions[0][1], self.questions[1][1])
+        job = RescoreJob.objects.create(assessment_type=self.assessment_type)
+
+        with mock.patch(
+            "apps.assessment.rescoring.rescore_chunk", side_effect=RuntimeError("boom")
+        ), self.assertRaises(RuntimeError):
+            run_rescore_job(job)
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error), (ProgressStatusEnum.FAILED, "boom"))
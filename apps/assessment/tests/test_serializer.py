@@ -13,8 +13,10 @@ from ..serializers import (
     AssessmentTypeSerializer,
     QuestionSerializer,
     AnswerSerializer,
+    BulkAssessmentSerializer,
     CreateAssessmentSerializer,
 )
+from ..question_bank import get_question_bank
 
 
 class AssessmentSerializerTests(TestCase):
@@ -114,6 +116,135 @@ class AssessmentSerializerTests(TestCase):
         self.assertFalse(serializer.is_valid())
         self.assertIn("results", serializer.errors)
 
+    def test_create_assessment_serializer_validation_queries_are_flat(self):
+        """Results are resolved from the question bank however many questions are answered."""
+        results = []
+        for index in range(20):
+            question = Question.objects.create(
+                text=f"Question {index}", assessment_type=self.assessment_type
+            )
+            answer = Answer.objects.create(question=question, text="Yes")
+            results.append({"question": question.id, "answer": answer.id})
+        data = dict(self.assessment_data, results=results)
+        # type lookup plus compiling the bank: version, answers, questions
+        serializer = CreateAssessmentSerializer(data=data)
+        with self.assertNumQueries(4):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+        # the compiled bank is cached, only the type lookup remains
+        serializer = CreateAssessmentSerializer(data=data)
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+
+    def test_create_assessment_serializer_reports_all_bad_rows(self):
+        """Every invalid row is reported at once, valid rows get an empty entry."""
+        other_type = AssessmentType.objects.create(name="Other", description="Other")
+        foreign_question = Question.objects.create(text="Foreign", assessment_type=other_type)
+        foreign_answer = Answer.objects.create(question=foreign_question, text="No")
+        invalid_data = self.assessment_data.copy()
+        invalid_data["results"] = [
+            {"question": self.question.id, "answer": self.answer.id},
+            {"question": self.question.id, "answer": foreign_answer.id},
+            {"question": foreign_question.id, "answer": foreign_answer.id},
+        ]
+        serializer = CreateAssessmentSerializer(data=invalid_data)
+        self.assertFalse(serializer.is_valid())
+        errors = serializer.errors["results"]
+        self.assertEqual(errors[0], {})
+        self.assertIn("non_field_errors", errors[1])
+        self.assertEqual(
+            errors[2], {"question": ["The question does not belong to the assessment type."]}
+        )
+
+        invalid_data["results"] = [invalid_data["results"][0], invalid_data["results"][2]]
+        serializer = CreateAssessmentSerializer(data=invalid_data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("question", serializer.errors["results"][1])
+
+    def _results_for(self, count):
+        """Create ``count`` questions, alternating correct and wrong answers."""
+        results = []
+        for index in range(count):
+            question = Question.objects.create(
+                text=f"Question {index}", assessment_type=self.assessment_type
+            )
+            answer = Answer.objects.create(
+                question=question, text="Yes", is_correct=index % 2 == 0
+            )
+            results.append({"question": question.id, "answer": answer.id})
+        return results
+
+    def test_create_assessment_takes_fixed_number_of_queries(self):
+        """Validation plus persistence of a create is a small, constant set of statements."""
+        data = dict(self.assessment_data, results=self._results_for(20))
+        get_question_bank(self.assessment_type.id)
+        serializer = CreateAssessmentSerializer(data=data)
+        # type; savepoint, assessment insert, results insert, release
+        with self.assertNumQueries(5):
+            self.assertTrue(serializer.is_valid(), serializer.errors)
+            assessment = serializer.save(patient=self.user)
+
+        assessment.refresh_from_db()
+        self.assertEqual(assessment.final_score, 50)
+        self.assertEqual(assessment.patient, self.user)
+        self.assertEqual(assessment.results.count(), 20)
+
+    def test_update_with_unchanged_results_skips_rewrite(self):
+        results = self._results_for(4)
+        serializer = CreateAssessmentSerializer(data=dict(self.assessment_data, results=results))
+        self.assertTrue(serializer.is_valid())
+        assessment = serializer.save(patient=self.user)
+        result_ids = set(assessment.results.values_list("id", flat=True))
+
+        serializer = CreateAssessmentSerializer(
+            assessment, data={"results": results}, partial=True
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.assertEqual(set(assessment.results.values_list("id", flat=True)), result_ids)
+        self.assertEqual(
+            serializer.result_changes,
+            {"created": 0, "updated": 0, "deleted": 0, "unchanged": 4},
+        )
+        assessment.refresh_from_db()
+        self.assertEqual(assessment.final_score, 50)
+
+    def test_update_diffs_results_by_question(self):
+        """Changed answers are updated, dropped questions deleted, new ones inserted."""
+        results = self._results_for(4)
+        serializer = CreateAssessmentSerializer(data=dict(self.assessment_data, results=results))
+        self.assertTrue(serializer.is_valid())
+        assessment = serializer.save(patient=self.user)
+        kept = assessment.results.get(question_id=results[0]["question"])
+
+        corrected = Answer.objects.create(
+            question_id=results[1]["question"], text="No", is_correct=True
+        )
+        submitted = [
+            results[0],
+            {"question": results[1]["question"], "answer": corrected.id},
+            results[2],
+            {"question": self.question.id, "answer": self.answer.id},
+        ]
+        serializer = CreateAssessmentSerializer(
+            assessment, data={"results": submitted}, partial=True
+        )
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.assertEqual(
+            serializer.result_changes,
+            {"created": 1, "updated": 1, "deleted": 1, "unchanged": 2},
+        )
+        self.assertTrue(assessment.results.filter(id=kept.id).exists())
+        self.assertEqual(
+            set(assessment.results.values_list("question_id", "answer_id")),
+            {(row["question"], row["answer"]) for row in submitted},
+        )
+        assessment.refresh_from_db()
+        self.assertEqual(assessment.final_score, 75)
+
     def tearDown(self):
         # Clean up any created instances if necessary
         User.objects.all().delete()
@@ -122,3 +253,184 @@ class AssessmentSerializerTests(TestCase):
         Answer.objects.all().delete()
         Assessment.objects.all().delete()
         AssessmentResult.objects.all().delete()
+
+
+class BulkAssessmentSerializerTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            first_name="Uncle",
+            last_name="Rukus",
+            phone_number="1234567890",
+            email="sistermagret007@gmail.com",
+            username="sistermagret007@gmail.com",
+            password="password123",
+            is_accept_terms_and_condition=True,
+        )
+        self.assessment_type = AssessmentType.objects.create(
+            name="Psychological Assessment",
+            description="Assessment for psychological conditions.",
+        )
+        self.question = Question.objects.create(
+            text="Do you feel anxious?", assessment_type=self.assessment_type
+        )
+        self.correct = Answer.objects.create(
+            question=self.question, text="No", is_correct=True
+        )
+        self.wrong = Answer.objects.create(question=self.question, text="Yes")
+
+    def item(self, answer):
+        return {
+            "assessment_type": str(self.assessment_type.id),
+            "results": [{"question": str(self.question.id), "answer": str(answer.id)}],
+        }
+
+    def test_bulk_create_reports_each_item(self):
+        """Valid items are written together and invalid ones are reported by index."""
+        data = {
+            "assessments": [
+                self.item(self.correct),
+                {"assessment_type": "not-a-uuid", "results": []},
+                self.item(self.wrong),
+            ]
+        }
+        serializer = BulkAssessmentSerializer(data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        summary = serializer.save(patient=self.user)
+
+        self.assertEqual(summary["created"], 2)
+        self.assertEqual(summary["failed"], 1)
+        self.assertEqual(
+            [item["status"] for item in summary["items"]],
+            ["created", "invalid", "created"],
+        )
+        self.assertEqual(Assessment.objects.count(), 2)
+        self.assertEqual(AssessmentResult.objects.count(), 2)
+        self.assertEqual(
+            sorted(Assessment.objects.values_list("final_score", flat=True)),
+            [0, 100],
+        )
+
+    def test_bulk_validation_queries_do_not_grow_with_batch(self):
+        """Only the assessment types are queried, ids come from the cached question bank."""
+        data = {"assessments": [self.item(self.correct) for _ in range(25)]}
+        get_question_bank(self.assessment_type.id)
+        serializer = BulkAssessmentSerializer(data=data)
+        with self.assertNumQueries(1):
+            self.assertTrue(serializer.is_valid())
+
+    def test_bulk_rejects_answer_from_another_question(self):
+        other = Question.objects.create(
+            text="Do you sleep well?", assessment_type=self.assessment_type
+        )
+        item = self.item(self.correct)
+        item["results"][0]["question"] = str(other.id)
+        serializer = BulkAssessmentSerializer(data={"assessments": [item]})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn("assessments", serializer.errors)
+
+
+class QuestionSerializerTests(TestCase):
+    def setUp(self):
+        self.assessment_type = AssessmentType.objects.create(
+            name="Psychological Assessment",
+            description="Assessment for psychological conditions.",
+        )
+
+    def question_data(self, text, correct=0):
+        return {
+            "text": text,
+            "answers": [
+                {"text": option, "is_correct": index == correct}
+                for index, option in enumerate(["Never", "Sometimes", "Often", "Always"])
+            ],
+        }
+
+    def test_nested_questions_are_written_with_two_inserts(self):
+        data = [self.question_data(f"Question {index}") for index in range(10)]
+        serializer = QuestionSerializer(data=data, many=True)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        # savepoint, question insert, answer insert, bank version bump, release, answers prefetch
+        with self.assertNumQueries(6):
+            questions = serializer.save(assessment_type=self.assessment_type)
+
+        self.assertEqual(len(questions), 10)
+        self.assertEqual(Answer.objects.filter(question__assessment_type=self.assessment_type).count(), 40)
+        self.assertEqual(len(serializer.data[0]["answers"]), 4)
+
+    def test_exactly_one_correct_answer_is_required(self):
+        data = self.question_data("Do you feel anxious?")
+        data["answers"][1]["is_correct"] = True
+        serializer = QuestionSerializer(data=data)
+        with self.assertNumQueries(0):
+            self.assertFalse(serializer.is_valid())
+        self.assertIn("answers", serializer.errors)
+
+        data["answers"] = [dict(answer, is_correct=False) for answer in data["answers"]]
+        self.assertFalse(QuestionSerializer(data=data).is_valid())
+
+    def test_replace_diffs_answers(self):
+        serializer = QuestionSerializer(data=self.question_data("Do you feel anxious?"))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        question = serializer.save(assessment_type=self.assessment_type)
+        never, sometimes, often, _ = question.answers.order_by("created_at")
+
+        data = {
+            "text": "Do you often feel anxious?",
+            "answers": [
+                {"id": str(never.id), "text": "Never", "is_correct": False},
+                {"id": str(sometimes.id), "text": "Sometimes", "is_correct": True},
+                {"id": str(often.id), "text": "Often", "is_correct": False},
+                {"text": "Every day", "is_correct": False},
+            ],
+        }
+        serializer = QuestionSerializer(question, data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.assertTrue(serializer.answer_key_changed)
+        question.refresh_from_db()
+        self.assertEqual(question.text, "Do you often feel anxious?")
+        self.assertEqual(
+            set(question.answers.values_list("text", flat=True)),
+            {"Never", "Sometimes", "Often", "Every day"},
+        )
+        self.assertTrue(question.answers.get(id=sometimes.id).is_correct)
+
+    def test_replace_refuses_to_drop_chosen_answers(self):
+        serializer = QuestionSerializer(data=self.question_data("Do you feel anxious?"))
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        question = serializer.save(assessment_type=self.assessment_type)
+        never, sometimes, often, always = question.answers.order_by("created_at")
+        patient = User.objects.create_user(
+            first_name="Huey",
+            last_name="Freeman",
+            phone_number="0987654321",
+            email="huey@example.com",
+            username="huey@example.com",
+            password="password123",
+        )
+        assessment = Assessment.objects.create(patient=patient, assessment_type=self.assessment_type)
+        result = AssessmentResult.objects.create(assessment=assessment, question=question, answer=always)
+
+        data = {
+            "text": question.text,
+            "answers": [
+                {"id": str(never.id), "text": "Never", "is_correct": True},
+                {"id": str(sometimes.id), "text": "Sometimes", "is_correct": False},
+            ],
+        }
+        serializer = QuestionSerializer(question, data=data)
+        self.assertFalse(serializer.is_valid())
+        self.assertIn(str(always.id), str(serializer.errors["answers"]))
+        self.assertNotIn(str(often.id), str(serializer.errors["answers"]))
+
+        data["answers"].append({"id": str(always.id), "text": "Always", "is_correct": False})
+        serializer = QuestionSerializer(question, data=data)
+        self.assertTrue(serializer.is_valid(), serializer.errors)
+        serializer.save()
+
+        self.assertTrue(AssessmentResult.objects.filter(pk=result.pk).exists())
+        self.assertEqual(
+            set(question.answers.values_list("text", flat=True)),
+            {"Never", "Sometimes", "Always"},
+        )
@@ -2,7 +2,10 @@ import logging
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.decorators import action
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from django.db import transaction
 from django.db.models import Q
 from drf_yasg.utils import swagger_auto_schema
 from drf_yasg import openapi
@@ -11,12 +14,18 @@ from apps.utils.base import BaseViewSet
 from apps.utils.enums import UserType
 from .serializers import (
     AnswerSerializer,
+    AssessmentExportQuerySerializer,
     AssessmentSerializer,
     AssessmentTypeSerializer,
+    BulkAssessmentSerializer,
     CreateAssessmentSerializer,
     QuestionSerializer,
+    RescoreJobSerializer,
 )
-from .models import Answer, Assessment, AssessmentType, Question
+from .models import Answer, Assessment, AssessmentType, Question, RescoreJob
+from .exports import CONTENT_TYPES, stream_export
+from .question_bank import get_question_bank
+from .tasks import schedule_rescore
 from apps.utils.permissions import practitioner_access_only
 
 
@@ -32,10 +41,9 @@ class AssessmentViewSet(BaseViewSet):
         if self.request.user.is_authenticated:
             if self.request.user.user_role in [UserType.USER]:
                 return self.queryset.filter(patient=self.request.user)
-            elif self.request.user.user_role in [UserType.USER]:
+            elif self.request.user.user_role in [UserType.PRACTITIONER, UserType.ADMIN]:
                 return self.queryset
-        else:
-            return Assessment.objects.none() 
+        return Assessment.objects.none()
         
 
     def get_object(self):
@@ -62,6 +70,31 @@ class AssessmentViewSet(BaseViewSet):
             context.update({"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)})
         return Response(context, status=context["status"])
 
+    @swagger_auto_schema(
+        operation_summary="Export assessments",
+        operation_description="Stream assessments with their flattened results as NDJSON or CSV.",
+        query_serializer=AssessmentExportQuerySerializer,
+        responses={200: "NDJSON or CSV stream"}
+    )
+    @action(detail=False, methods=["get"], url_path="export", description="Stream assessments as NDJSON or CSV")
+    @method_decorator(practitioner_access_only(), name="dispatch")
+    def export(self, request, *args, **kwargs):
+        """Stream the filtered assessments without materializing them."""
+        query = AssessmentExportQuerySerializer(data=request.query_params)
+        if not query.is_valid():
+            return Response({"errors": query.errors, "status": status.HTTP_400_BAD_REQUEST}, status=status.HTTP_400_BAD_REQUEST)
+
+        export_format = query.validated_data["export_format"]
+        queryset = query.filter_queryset(self.get_queryset())
+        response = StreamingHttpResponse(
+            stream_export(queryset, export_format),
+            content_type=CONTENT_TYPES[export_format],
+        )
+        filename = f"assessments-{timezone.now():%Y%m%d%H%M%S}.{export_format}"
+        response["Content-Disposition"] = f'attachment; filename="{filename}"'
+        logger.info(f"Export assessments: {request.user} started a {export_format} export with filters {dict(query.validated_data)}.")
+        return response
+
     @swagger_auto_schema(
         operation_summary="Retrieve assessment details",
         operation_description="Retrieve a specific assessment by ID.",
@@ -86,9 +119,7 @@ class AssessmentViewSet(BaseViewSet):
         """Create a new assessment."""
         serializer = CreateAssessmentSerializer(data=request.data)
         if serializer.is_valid():
-            assessment = serializer.save()
-            assessment.patient = request.user
-            assessment.save()
+            assessment = serializer.save(patient=request.user)
             logger.info(f"Create assessment: {request.user} created assessment {assessment.id}.")
             return Response(
                 {"status": status.HTTP_201_CREATED, "data": self.serializer_class(assessment).data, "message": "Assessment created successfully"},
@@ -97,6 +128,27 @@ class AssessmentViewSet(BaseViewSet):
         logger.error(f"Create assessment failed: {request.user} attempted to create an assessment with invalid data: {serializer.errors}.")
         return Response({"errors": serializer.errors, "status": status.HTTP_400_BAD_REQUEST}, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(
+        request_body=BulkAssessmentSerializer,
+        operation_summary="Submit assessments in bulk",
+        operation_description="Validate and create a batch of assessments with their results in a single transaction. Returns the status of every submitted item.",
+        responses={201: openapi.Response("Created")},
+    )
+    @action(detail=False, methods=["post"], url_path="bulk", description="Submit a batch of assessments")
+    @method_decorator(practitioner_access_only(), name="dispatch")
+    def bulk_submit(self, request, *args, **kwargs):
+        """Create many assessments at once, reporting the outcome of each item."""
+        serializer = BulkAssessmentSerializer(data=request.data)
+        if serializer.is_valid():
+            summary = serializer.save(patient=request.user)
+            logger.info(f"Bulk assessments: {request.user} created {summary['created']} assessments, {summary['failed']} rejected.")
+            return Response(
+                {"status": status.HTTP_201_CREATED, "data": summary, "message": "Assessments submitted successfully"},
+                status=status.HTTP_201_CREATED,
+            )
+        logger.error(f"Bulk assessments failed: {request.user} submitted an invalid batch: {serializer.errors}.")
+        return Response({"errors": serializer.errors, "status": status.HTTP_400_BAD_REQUEST}, status=status.HTTP_400_BAD_REQUEST)
+
     @swagger_auto_schema(
         request_body=CreateAssessmentSerializer,
         operation_summary="Update an assessment",
@@ -110,8 +162,16 @@ class AssessmentViewSet(BaseViewSet):
         serializer = CreateAssessmentSerializer(instance, data=request.data, partial=True)
         if serializer.is_valid():
             assessment = serializer.save()
-            logger.info(f"Update assessment: {request.user} updated assessment {assessment.id}.")
-            return Response({"status": status.HTTP_200_OK, "data": self.serializer_class(assessment).data, "message": "Assessment updated successfully"}, status=status.HTTP_200_OK)
+            logger.info(f"Update assessment: {request.user} updated assessment {assessment.id}, result changes: {serializer.result_changes}.")
+            return Response(
+                {
+                    "status": status.HTTP_200_OK,
+                    "data": self.serializer_class(assessment).data,
+                    "result_changes": serializer.result_changes,
+                    "message": "Assessment updated successfully",
+                },
+                status=status.HTTP_200_OK,
+            )
         logger.error(f"Update assessment failed: {request.user} attempted to update assessment {instance.id} with invalid data: {serializer.errors}.")
         return Response({"errors": serializer.errors, "status": status.HTTP_400_BAD_REQUEST}, status=status.HTTP_400_BAD_REQUEST)
 
@@ -133,32 +193,61 @@ class AssessmentViewSet(BaseViewSet):
     def list_questions(self, request, *args, **kwargs):
         """List all questions for a specific assessment."""
         assessment = self.get_object()
-        
-        questions = Question.objects.filter(assessment_type=assessment.assessment_type)
-        
-        serializer = QuestionSerializer(questions, many=True)
+        question_bank = get_question_bank(assessment.assessment_type_id)
         logger.info(f"List questions: {request.user} retrieved questions for assessment {assessment.id}.")
-        return Response({"status": status.HTTP_200_OK, "data": serializer.data}, status=status.HTTP_200_OK)
+        return Response(
+            {"status": status.HTTP_200_OK, "data": question_bank.questions, "version": question_bank.version},
+            status=status.HTTP_200_OK,
+        )
 
     @swagger_auto_schema(
         request_body=QuestionSerializer,
         operation_summary="Add a question to an assessment",
-        operation_description="Add a new question to an existing assessment.",
+        operation_description="Add a new question, or a list of questions, to an existing assessment. "
+                              "Answers can be nested on each question; exactly one of them must be correct.",
         responses={201: openapi.Response("Created", QuestionSerializer)},
     )
     @action(detail=True, methods=["post"], url_path="questions", description="Add a question to the assessment")
     @method_decorator(practitioner_access_only(), name="dispatch")
     def add_question(self, request, *args, **kwargs):
-        """Add a question to a specific assessment."""
+        """Add one or more questions, with their nested answers, to a specific assessment."""
         assessment = self.get_object()
-        serializer = QuestionSerializer(data=request.data)
+        many = isinstance(request.data, list)
+        serializer = QuestionSerializer(data=request.data, many=many)
         if serializer.is_valid():
-            question = serializer.save()
-            logger.info(f"Add question: {request.user} added question {question.id} to assessment {assessment.id}.")
+            questions = serializer.save(assessment_type=assessment.assessment_type)
+            question_ids = [str(question.id) for question in (questions if many else [questions])]
+            logger.info(f"Add question: {request.user} added questions {question_ids} to assessment {assessment.id}.")
             return Response({"status": status.HTTP_201_CREATED, "data": serializer.data, "message": "Question added successfully"}, status=status.HTTP_201_CREATED)
         logger.error(f"Add question failed: {request.user} attempted to add a question to assessment {assessment.id} with invalid data: {serializer.errors}.")
         return Response({"errors": serializer.errors, "status": status.HTTP_400_BAD_REQUEST}, status=status.HTTP_400_BAD_REQUEST)
 
+    @swagger_auto_schema(
+        method='put',
+        request_body=QuestionSerializer,
+        operation_summary="Replace a question",
+        operation_description="Replace a question's text and its answer set. Answers with an id are updated, "
+                              "answers without one are created and stored answers left out are deleted. "
+                              "Answers chosen in past assessments cannot be left out.",
+        responses={200: openapi.Response("Success", QuestionSerializer)},
+    )
+    @action(detail=True, methods=["put"], url_path="questions/(?P<question_id>[^/.]+)", description="Replace a question and its answers")
+    @method_decorator(practitioner_access_only(), name="dispatch")
+    def replace_question(self, request, *args, **kwargs):
+        """Replace a question together with its nested answers."""
+        assessment = self.get_object()
+        question = get_object_or_404(Question, pk=kwargs.get('question_id'), assessment_type_id=assessment.assessment_type_id)
+        serializer = QuestionSerializer(question, data=request.data)
+        if serializer.is_valid():
+            with transaction.atomic():
+                question = serializer.save()
+                if serializer.answer_key_changed:
+                    schedule_rescore(question.assessment_type_id)
+            logger.info(f"Replace question: {request.user} replaced question {question.id} of assessment {assessment.id}.")
+            return Response({"status": status.HTTP_200_OK, "data": serializer.data, "message": "Question updated successfully"}, status=status.HTTP_200_OK)
+        logger.error(f"Replace question failed: {request.user} attempted to replace question {question.id} with invalid data: {serializer.errors}.")
+        return Response({"errors": serializer.errors, "status": status.HTTP_400_BAD_REQUEST}, status=status.HTTP_400_BAD_REQUEST)
+
     @swagger_auto_schema(
         method='get',
         operation_summary="List answers for a question",
@@ -189,7 +278,7 @@ class AssessmentViewSet(BaseViewSet):
             return Response({"status": status.HTTP_200_OK, "data": serializer.data}, status=status.HTTP_200_OK)
 
         elif request.method == "POST":
-            serializer = AnswerSerializer(data=request.data)
+            serializer = AnswerSerializer(data=request.data, context={"question": question})
             if serializer.is_valid():
                 answer = serializer.save(question=question)
                 logger.info(f"Create answer: {request.user} created answer {answer.id} for question {question.id}.")
@@ -225,11 +314,21 @@ class AssessmentViewSet(BaseViewSet):
         question = get_object_or_404(Question, pk=question_id)
         answer = get_object_or_404(Answer, pk=answer_id, question=question)
 
-        serializer = AnswerSerializer(answer, data=request.data, partial=True)
+        was_correct = answer.is_correct
+        serializer = AnswerSerializer(answer, data=request.data, partial=True, context={"question": question})
         if serializer.is_valid():
-            answer = serializer.save()
+            with transaction.atomic():
+                answer = serializer.save()
+                rescore_job = None
+                if answer.is_correct != was_correct:
+                    # The answer key changed, so every stored score of this type may be stale
+                    rescore_job = schedule_rescore(question.assessment_type_id)
             logger.info(f"Update answer: {request.user} updated answer {answer.id} for question {question.id}.")
-            return Response({"status": status.HTTP_200_OK, "data": serializer.data, "message": "Answer updated successfully"}, status=status.HTTP_200_OK)
+            response_data = {"status": status.HTTP_200_OK, "data": serializer.data, "message": "Answer updated successfully"}
+            if rescore_job is not None:
+                response_data["rescore_job"] = RescoreJobSerializer(rescore_job).data
+                logger.info(f"Update answer: queued rescore job {rescore_job.id} for assessment type {question.assessment_type_id}.")
+            return Response(response_data, status=status.HTTP_200_OK)
 
         logger.error(f"Update answer failed: {request.user} attempted to update answer {answer.id} with invalid data: {serializer.errors}.")
         return Response({"errors": serializer.errors, "status": status.HTTP_400_BAD_REQUEST}, status=status.HTTP_400_BAD_REQUEST)
@@ -310,4 +409,17 @@ class AssessmentViewSet(BaseViewSet):
         assessment_type = get_object_or_404(AssessmentType, pk=kwargs["pk"])
         assessment_type.delete()
         logger.info(f"Delete assessment type: {request.user} deleted assessment type {assessment_type.id}.")
-        return Response({"status": status.HTTP_204_NO_CONTENT, "message": "Assessment type deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
\ No newline at end of file
+        return Response({"status": status.HTTP_204_NO_CONTENT, "message": "Assessment type deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
+
+    @swagger_auto_schema(
+        operation_summary="Get rescore job progress",
+        operation_description="Retrieve the status and progress of a background rescoring job.",
+        responses={200: openapi.Response("Success", RescoreJobSerializer)}
+    )
+    @action(detail=False, methods=["get"], url_path="rescore-jobs/(?P<job_id>[^/.]+)", description="Get the progress of a rescore job")
+    @method_decorator(practitioner_access_only(), name="dispatch")
+    def rescore_job(self, request, *args, **kwargs):
+        """Retrieve the progress of a rescoring job."""
+        job = get_object_or_404(RescoreJob, pk=kwargs.get("job_id"))
+        serializer = RescoreJobSerializer(job)
+        return Response({"status": status.HTTP_200_OK, "data": serializer.data}, status=status.HTTP_200_OK)
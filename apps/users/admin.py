@@ -6,9 +6,12 @@ from .forms import (
 from .models import (
     Allergy,
     AuthToken,
+    DocumentBlob,
+    EmailOutbox,
     EmergencyContact,
     Medication,
     Patient,
+    PatientImportJob,
     Practitioner,
     PractitionerSpecialization,
     User,
@@ -98,6 +101,32 @@ class PractitionerAdmin(admin.ModelAdmin):
     )
 
 
+class EmailOutboxAdmin(admin.ModelAdmin):
+    list_display = (
+        "to_email",
+        "subject",
+        "status",
+        "attempts",
+        "next_attempt_at",
+        "sent_at",
+        "created_at",
+    )
+    search_fields = ("to_email", "subject")
+    list_filter = ("status", "created_at")
+
+
+class DocumentBlobAdmin(admin.ModelAdmin):
+    list_display = ("name", "ref_count", "created_at", "updated_at")
+    search_fields = ("name",)
+    readonly_fields = ("name", "ref_count")
+
+
+class PatientImportJobAdmin(admin.ModelAdmin):
+    list_display = ("requested_by", "status", "total", "started_at", "finished_at")
+    list_filter = ("status", "created_at")
+    exclude = ("rows",)
+
+
 admin.site.register(User, UserAdmin)
 admin.site.register(EmergencyContact, EmergencyContactAdmin)
 admin.site.register(AuthToken, AuthTokenAdmin)
@@ -109,3 +138,6 @@ admin.site.register(
     PractitionerSpecialization, PractitionerSpecializationAdmin
 )
 admin.site.register(Practitioner, PractitionerAdmin)
+admin.site.register(EmailOutbox, EmailOutboxAdmin)
+admin.site.register(DocumentBlob, DocumentBlobAdmin)
+admin.site.register(PatientImportJob, PatientImportJobAdmin)
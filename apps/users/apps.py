@@ -1,9 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class UsersConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "apps.users"
 
-    # def ready(self):
-    #     import apps.users.signals
+    def ready(self):
+        import apps.users.signals
+        from apps.users.search_indexes import create_search_indexes_after_migrate
+
+        post_migrate.connect(create_search_indexes_after_migrate, sender=self)
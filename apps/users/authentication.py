@@ -0,0 +1,150 @@
+"""
+JWT authentication with role claims and per-user token versions.
+
+Tokens minted by ``AuthViewSet.get_tokens_for_user`` carry the user's role, group
+names and ``token_version``. Group membership changes bump ``User.token_version``,
+which invalidates every token minted before the change, so the permission layer
+can trust the signed claims instead of querying the groups table.
+
+``CachedProfileJWTAuthentication`` also skips the user SELECT: the user is rebuilt
+from a short-lived cached copy of its row, which ``User`` saves invalidate.
+"""
+import uuid
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import DEFERRED
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.serializers import TokenRefreshSerializer
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from apps.users.models import USER_PROFILE_CACHE_KEY, USER_PROFILE_GENERATION_KEY, User
+
+ROLE_CLAIM = "role"
+GROUPS_CLAIM = "groups"
+TOKEN_VERSION_CLAIM = "token_version"
+PROFILE_CACHE_TIMEOUT = 5 * 60
+# Cache generation the profile was read under, see User.invalidate_profile_cache
+PROFILE_GENERATION = "_generation"
+# Never cached, loaded from the database on access
+PROFILE_EXCLUDED_FIELDS = ("password",)
+
+
+def get_token_claims(user):
+    return {
+        ROLE_CLAIM: user.user_role,
+        GROUPS_CLAIM: sorted(group.name for group in user.groups.all()),
+        TOKEN_VERSION_CLAIM: user.token_version,
+    }
+
+
+def get_tokens_for_user(user):
+    refresh = RefreshToken.for_user(user)
+    for claim, value in get_token_claims(user).items():
+        refresh[claim] = value
+    return {
+        "refresh": str(refresh),
+        "access": str(refresh.access_token),
+    }
+
+
+def get_claim_groups(request):
+    """The group names signed into the request's JWT, or None when it carries none."""
+    token = getattr(request, "auth", None)
+    if token is None or not hasattr(token, "get"):
+        return None
+    return token.get(GROUPS_CLAIM)
+
+
+class VersionedJWTAuthentication(JWTAuthentication):
+    """Rejects tokens minted before the user's last role or group change."""
+
+    def get_user(self, validated_token):
+        user = super().get_user(validated_token)
+        # Tokens minted before versioning carry no claim and match the initial version
+        if validated_token.get(TOKEN_VERSION_CLAIM, 0) != user.token_version:
+            raise AuthenticationFailed("Token has been revoked", code="token_revoked")
+        return user
+
+
+def cache_profile(user, generation):
+    """Cache the profile of ``user``, whose row was read under ``generation``."""
+    profile = {
+        field.attname: getattr(user, field.attname)
+        for field in User._meta.concrete_fields
+        if field.attname not in PROFILE_EXCLUDED_FIELDS
+    }
+    profile[PROFILE_GENERATION] = generation
+    cache.set(USER_PROFILE_CACHE_KEY.format(user.pk), profile, PROFILE_CACHE_TIMEOUT)
+
+
+def profile_generation(user_id, cached):
+    """The current profile generation of a user, starting one if the cache has none."""
+    key = USER_PROFILE_GENERATION_KEY.format(user_id)
+    generation = cached.get(key)
+    if generation is None:
+        # Never reused, so a lost generation cannot revive an old profile
+        generation = uuid.uuid4().hex
+        if not cache.add(key, generation, None):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def user_from_profile(profile):
+    """A ``User`` built from a cached profile, as if loaded with the password deferred."""
+    fields = User._meta.concrete_fields
+    return User.from_db(
+        DEFAULT_DB_ALIAS,
+        [field.attname for field in fields],
+        [profile.get(field.attname, DEFERRED) for field in fields],
+    )
+
+
+class CachedProfileJWTAuthentication(VersionedJWTAuthentication):
+    """
+    Resolves the user from the cached profile when its token version matches the
+    token's, so most requests run no user query. Misses and version mismatches
+    load the row and re-cache it under the generation read before the row.
+    """
+
+    def get_user(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+
+        profile_key = USER_PROFILE_CACHE_KEY.format(user_id)
+        cached = cache.get_many([profile_key, USER_PROFILE_GENERATION_KEY.format(user_id)])
+        generation = profile_generation(user_id, cached)
+        profile = cached.get(profile_key)
+        if (
+            profile
+            and profile.get(PROFILE_GENERATION) == generation
+            and profile.get("token_version") == validated_token.get(TOKEN_VERSION_CLAIM, 0)
+        ):
+            if not profile.get("is_active"):
+                raise AuthenticationFailed("User is inactive", code="user_inactive")
+            return user_from_profile(profile)
+
+        user = super().get_user(validated_token)
+        cache_profile(user, generation)
+        return user
+
+
+class VersionedTokenRefreshSerializer(TokenRefreshSerializer):
+    """Refuses to refresh tokens that were revoked by a token version bump."""
+
+    def validate(self, attrs):
+        refresh = self.token_class(attrs["refresh"])
+        token_version = (
+            User.objects.filter(
+                **{api_settings.USER_ID_FIELD: refresh[api_settings.USER_ID_CLAIM]}
+            )
+            .values_list("token_version", flat=True)
+            .first()
+        )
+        if token_version is None or refresh.get(TOKEN_VERSION_CLAIM, 0) != token_version:
+            raise InvalidToken("Token has been revoked")
+        return super().validate(attrs)
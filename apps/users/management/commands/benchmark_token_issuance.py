@@ -0,0 +1,74 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.users.models import AuthToken
+from apps.users.token_pool import issue_token
+from apps.utils.base import Addon
+from apps.utils.enums import AuthTokenEnum
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure OTP issuance latency as the auth_token table grows, comparing the "
+        "token pool with the legacy recursive generator. Runs in a rolled back transaction."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes",
+            type=int,
+            nargs="+",
+            default=[0, 1000, 5000, 9000, 9900],
+            help="Numbers of live tokens in the table for each measurement.",
+        )
+        parser.add_argument(
+            "--samples", type=int, default=100, help="Codes issued per measurement."
+        )
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options["sizes"], options["samples"])
+                raise Rollback()
+        except Rollback:
+            pass
+
+    def run(self, sizes, samples):
+        token_type = AuthTokenEnum.VERIFICATION
+        expiry = timezone.now() + timedelta(days=1)
+        addon = Addon()
+        self.stdout.write(f"{'live tokens':>12} {'pool p50 ms':>12} {'pool p99 ms':>12} {'legacy p50 ms':>14} {'legacy p99 ms':>14}")
+
+        for size in sorted(sizes):
+            AuthToken.objects.filter(type=token_type).delete()
+            codes = [str(number).zfill(4) for number in range(10000)]
+            AuthToken.objects.bulk_create(
+                [AuthToken(type=token_type, token=code, expiry=expiry) for code in codes[:size]],
+                batch_size=1000,
+            )
+            pool = self.measure(lambda: issue_token(token_type), samples)
+            legacy = self.measure(
+                lambda: addon.unique_number_generator(AuthToken, "token", 4), samples
+            )
+            self.stdout.write(
+                f"{size:>12} {pool[0]:>12.3f} {pool[1]:>12.3f} {legacy[0]:>14.3f} {legacy[1]:>14.3f}"
+            )
+
+    @staticmethod
+    def measure(issue, samples):
+        timings = []
+        for _ in range(samples):
+            started = time.perf_counter()
+            issue()
+            timings.append((time.perf_counter() - started) * 1000)
+        timings.sort()
+        return statistics.median(timings), timings[min(len(timings) - 1, int(len(timings) * 0.99))]
@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS
+
+from apps.users.search_indexes import create_search_indexes
+
+
+class Command(BaseCommand):
+    help = (
+        "Create the trigram GIN indexes used by user and patient search "
+        "(PostgreSQL only; does nothing on other databases)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+        parser.add_argument(
+            "--concurrently",
+            action="store_true",
+            help="Build with CREATE INDEX CONCURRENTLY to avoid locking large tables.",
+        )
+
+    def handle(self, *args, **options):
+        statements = create_search_indexes(
+            using=options["database"], concurrently=options["concurrently"]
+        )
+        if not statements:
+            self.stdout.write("Not a PostgreSQL database, no search indexes created.")
+            return
+        for statement in statements:
+            self.stdout.write(statement)
+        self.stdout.write(self.style.SUCCESS(f"Ensured {len(statements)} search indexes."))
@@ -0,0 +1,102 @@
+import os
+from collections import Counter
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
+
+from apps.users.models import DocumentBlob, Practitioner
+from apps.utils.renditions import is_rendition, rendition_source
+from apps.utils.storage import TEMP_DIRECTORY, get_document_storage
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete content-addressed document blobs that no record references. Blobs "
+        "released or re-uploaded within the grace period are kept, as an upload in "
+        "flight may still be about to reference them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--grace-minutes",
+            type=int,
+            default=60,
+            help="Only collect blobs unreferenced for at least this long.",
+        )
+        parser.add_argument(
+            "--recount",
+            action="store_true",
+            help="Rebuild every reference count from the practitioner records first.",
+        )
+        parser.add_argument(
+            "--orphans",
+            action="store_true",
+            help="Also walk the blob directories for files without a DocumentBlob row.",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def handle(self, *args, **options):
+        storage = get_document_storage()
+        cutoff = timezone.now() - timedelta(minutes=options["grace_minutes"])
+        dry_run = options["dry_run"]
+
+        if options["recount"] and not dry_run:
+            self.recount(storage)
+
+        collected = 0
+        unreferenced = DocumentBlob.objects.filter(ref_count__lte=0, updated_at__lt=cutoff)
+        for blob in unreferenced.iterator():
+            if not dry_run:
+                with transaction.atomic():
+                    # Skip blobs that were referenced or re-uploaded since they were listed
+                    if not DocumentBlob.objects.filter(
+                        pk=blob.pk, ref_count__lte=0, updated_at__lt=cutoff
+                    ).delete()[0]:
+                        continue
+                    storage.delete_blob(blob.name)
+            collected += 1
+            self.stdout.write(f"Collected {blob.name}")
+
+        if options["orphans"]:
+            collected += self.collect_orphans(storage, cutoff.timestamp(), dry_run)
+
+        verb = "Would collect" if dry_run else "Collected"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {collected} blobs"))
+
+    def recount(self, storage):
+        counts = Counter()
+        for names in Practitioner.objects.values_list(*Practitioner.DOCUMENT_FIELDS).iterator():
+            counts.update(name for name in names if storage.is_blob(name))
+        with transaction.atomic():
+            DocumentBlob.objects.bulk_create(
+                [DocumentBlob(name=name) for name in counts], ignore_conflicts=True
+            )
+            blobs = list(DocumentBlob.objects.select_for_update())
+            for blob in blobs:
+                blob.ref_count = counts.get(blob.name, 0)
+            DocumentBlob.objects.bulk_update(blobs, ["ref_count"], batch_size=1000)
+
+    def collect_orphans(self, storage, cutoff, dry_run):
+        """Remove files no DocumentBlob row knows about, stale partial writes and renditions of unknown blobs."""
+        root = storage.path(storage.prefix)
+        known = set(DocumentBlob.objects.values_list("name", flat=True))
+        collected = 0
+        for directory, _, files in os.walk(root):
+            for filename in files:
+                path = os.path.join(directory, filename)
+                name = os.path.relpath(path, storage.location).replace(os.sep, "/")
+                if name in known or os.path.getmtime(path) >= cutoff:
+                    continue
+                if is_rendition(name):
+                    # Renditions go with their blob, so only those of unknown blobs
+                    if rendition_source(name) in known:
+                        continue
+                elif not name.startswith(f"{storage.prefix}/{TEMP_DIRECTORY}/") and not storage.is_blob(name):
+                    continue
+                if not dry_run:
+                    os.remove(path)
+                collected += 1
+                self.stdout.write(f"Collected orphan {name}")
+        return collected
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+from apps.users.models import Medication
+from apps.utils.bulk import merge_duplicate_names
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge medications that share a name and repoint the patients linked to "
+        "them. Run before the migration that makes Medication.name unique."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def handle(self, *args, **options):
+        using = options["database"]
+        if Medication._meta.db_table not in connections[using].introspection.table_names():
+            self.stdout.write("No medication table yet, nothing to merge.")
+            return
+        with transaction.atomic(using=using):
+            merged = merge_duplicate_names(Medication, using=using)
+        self.stdout.write(self.style.SUCCESS(f"Merged {merged} duplicate medications."))
@@ -1,21 +1,40 @@
+import logging
+import uuid
 from datetime import date
 
 from django.contrib.auth.models import AbstractUser, Group, Permission
-from django.db import models
+from django.core.cache import cache
+from django.db import models, transaction
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 from apps.utils.abstracts import AbstractUUID
+from apps.utils.storage import get_document_storage
 from apps.utils.country.countries import country_codes
 from apps.utils.enums import (
     AuthTokenEnum,
     AuthTokenStatusEnum,
     BloodGroupType,
+    EmailStatusEnum,
     GenderType,
+    ProgressStatusEnum,
+    UserGroup,
     UserType,
     Genotype,
     ValidIDType,
 )
 
+logger = logging.getLogger("user")
+
+USER_PROFILE_CACHE_KEY = "users:profile:{}"
+USER_PROFILE_GENERATION_KEY = "users:profile_generation:{}"
+
+# Groups that imply a role, mirrored into User.user_role
+GROUP_ROLES = {
+    UserGroup.USER: UserType.USER,
+    UserGroup.PRACTITIONER: UserType.PRACTITIONER,
+}
+
 
 class Address(AbstractUUID):
     country = models.CharField(
@@ -36,13 +55,14 @@ class User(AbstractUser, AbstractUUID):
     Custom User Model
     """
 
+    # Kept in sync with group membership by apps.users.signals
     user_role = models.PositiveSmallIntegerField(
-        default=UserType.USER, choices=UserType.choices()
+        default=UserType.USER, choices=UserType.choices(), db_index=True
     )
     phone_number = models.CharField(
         max_length=20, unique=True, null=True, blank=True
     )
-    email = models.EmailField(max_length=255, null=True, blank=True)
+    email = models.EmailField(max_length=255, null=True, blank=True, db_index=True)
     address = models.ForeignKey(
         Address,
         on_delete=models.SET_NULL,
@@ -54,6 +74,8 @@ class User(AbstractUser, AbstractUUID):
         choices=GenderType.choices(), max_length=255, null=True, blank=True
     )
     avatar = models.ImageField(upload_to="profile", null=True, blank=True)
+    # WebP thumbnails of the avatar, written by the generate_renditions task
+    avatar_renditions = models.JSONField(default=dict, blank=True, editable=False)
     is_accept_terms_and_condition = models.BooleanField(
         default=False, blank=True
     )
@@ -62,18 +84,90 @@ class User(AbstractUser, AbstractUUID):
     date_of_birth = models.DateField(null=True, blank=True)
     updated_at = models.DateTimeField(auto_now=True, editable=False)
     is_verified = models.BooleanField(default=False)
+    # Bumped on role or group changes to revoke previously minted JWTs
+    token_version = models.PositiveIntegerField(default=0, editable=False)
+    date_joined = models.DateTimeField("date joined", default=timezone.now)
 
     #
     class Meta:
         db_table = "users"
         ordering = ("-date_joined",)
+        indexes = [
+            # The keyset of user, patient and practitioner list pages
+            models.Index(fields=["date_joined", "id"], name="users_date_joined_id_idx"),
+        ]
 
     def __str__(self):
         return f"{self.phone_number} {self.get_full_name()} {self.id} {self.group()}"
 
+    def queue_email(self, subject, message, from_email=None):
+        """
+        Queue an email to this user in the outbox instead of sending it inline;
+        the outbox is drained by a background worker over one SMTP connection.
+        Users registered with a phone number only get nothing.
+        """
+        if not self.email:
+            logger.info(f"Email outbox: {self.pk} has no email address, not queuing '{subject}'")
+            return None
+        return EmailOutbox.queue(
+            subject=subject,
+            message=message,
+            to_email=self.email,
+            from_email=from_email,
+            user=self,
+        )
+
     def group(self):
-        """Returns the first group name that the user belongs to."""
-        return self.groups.first().name if self.groups.exists() else "user"
+        """
+        Returns the first group name that the user belongs to. Uses the groups
+        loaded by ``prefetch_related("groups")`` when present, so listing users
+        costs no query per row; otherwise a single query.
+        """
+        groups = getattr(self, "_prefetched_objects_cache", {}).get("groups")
+        if groups is None:
+            group = self.groups.first()
+        else:
+            # Same group as groups.first(), which orders by primary key
+            group = min(groups, key=lambda group: group.pk, default=None)
+        return group.name if group else UserGroup.USER
+
+    def sync_role(self):
+        """
+        Store the role implied by the user's group in ``user_role``. Admins and
+        groups without a role keep the stored role.
+        """
+        role = GROUP_ROLES.get(self.group())
+        if role is None or role == self.user_role or self.user_role == UserType.ADMIN:
+            return False
+        self.user_role = role
+        User.objects.filter(pk=self.pk).update(user_role=role)
+        User.invalidate_profile_cache([self.pk])
+        return True
+
+    @classmethod
+    def revoke_tokens(cls, user_ids):
+        """Invalidate every JWT minted for these users so fresh role claims are issued."""
+        updated = cls.objects.filter(pk__in=user_ids).update(
+            token_version=models.F("token_version") + 1
+        )
+        cls.invalidate_profile_cache(user_ids)
+        return updated
+
+    @staticmethod
+    def invalidate_profile_cache(user_ids):
+        """
+        Retire the cached authentication profiles of these users, now and again on
+        commit. A profile is only served with the generation that was current
+        before its row was read, so a request that read the old row meanwhile
+        cannot bring it back by caching it after the commit.
+        """
+        keys = [USER_PROFILE_GENERATION_KEY.format(user_id) for user_id in user_ids]
+
+        def retire():
+            cache.set_many({key: uuid.uuid4().hex for key in keys}, None)
+
+        retire()
+        transaction.on_commit(retire)
 
     @property
     def age(self):
@@ -117,7 +211,7 @@ class Allergy(AbstractUUID):
 class Medication(AbstractUUID):
     """Model to represent medication."""
 
-    name = models.CharField(max_length=255)
+    name = models.CharField(max_length=255, unique=True)
 
     class Meta:
         db_table = "medication"
@@ -196,23 +290,166 @@ class Practitioner(AbstractUUID):
     means_of_identification_type = models.CharField(
         max_length=50, choices=ValidIDType.choices(), null=True, blank=True
     )
+    # Stored once per distinct content and reference-counted by DocumentBlob
     means_of_identification = models.FileField(
-        upload_to="documents/uploaded_ids", null=True, blank=True
+        upload_to="documents/uploaded_ids",
+        storage=get_document_storage,
+        null=True,
+        blank=True,
     )
     certificate = models.FileField(
-        upload_to="documents/certificates", null=True, blank=True
+        upload_to="documents/certificates",
+        storage=get_document_storage,
+        null=True,
+        blank=True,
+    )
+    # WebP previews of the first page of an ID image
+    means_of_identification_renditions = models.JSONField(
+        default=dict, blank=True, editable=False
     )
     updated_at = models.DateTimeField(auto_now=True)
 
+    DOCUMENT_FIELDS = ("means_of_identification", "certificate")
+
     class Meta:
         db_table = "clinician"
         ordering = ("-user__date_joined",)
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        loaded = dict(zip(field_names, values))
+        # Document names as stored, to release replaced blobs after a save
+        instance._stored_documents = {
+            loaded[field] for field in cls.DOCUMENT_FIELDS if loaded.get(field)
+        }
+        return instance
+
+    def document_names(self):
+        return {
+            getattr(self, field).name
+            for field in self.DOCUMENT_FIELDS
+            if getattr(self, field)
+        }
+
     def __str__(self):
         subcategory = f" - {self.subcategory}" if self.subcategory else ""
         return f"{self.user.get_full_name()} - {self.category}{subcategory} at {self.organization.name}"
 
 
+class DocumentBlob(AbstractUUID):
+    """A content-addressed file and the number of records referencing it."""
+
+    name = models.CharField(max_length=255, unique=True)
+    ref_count = models.IntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, editable=False)
+
+    class Meta:
+        db_table = "document_blob"
+        indexes = [
+            models.Index(
+                fields=["ref_count", "updated_at"], name="document_blob_gc_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
+
+    @classmethod
+    def adjust(cls, names, delta):
+        """Add ``delta`` to the reference count of each blob, creating missing rows."""
+        names = [name for name in names if get_document_storage().is_blob(name)]
+        if not names:
+            return
+        cls.objects.bulk_create(
+            [cls(name=name) for name in names], ignore_conflicts=True
+        )
+        cls.objects.filter(name__in=names).update(
+            ref_count=models.F("ref_count") + delta, updated_at=timezone.now()
+        )
+
+    @classmethod
+    def retain(cls, names):
+        cls.adjust(names, 1)
+
+    @classmethod
+    def release(cls, names):
+        cls.adjust(names, -1)
+
+    @classmethod
+    def touch(cls, name):
+        cls.objects.filter(name=name).update(updated_at=timezone.now())
+
+
+class DocumentUpload(AbstractUUID):
+    """
+    A resumable upload of a practitioner document. Chunks are appended to a part
+    file until ``offset`` reaches ``size``; the upload is then finalized onto the
+    practitioner's ``field``. Sessions idle past ``expires_at`` are discarded.
+    """
+
+    practitioner = models.ForeignKey(
+        Practitioner, on_delete=models.CASCADE, related_name="document_uploads"
+    )
+    field = models.CharField(
+        max_length=50,
+        choices=[(field, field) for field in Practitioner.DOCUMENT_FIELDS],
+    )
+    means_of_identification_type = models.CharField(
+        max_length=50, choices=ValidIDType.choices(), null=True, blank=True
+    )
+    file_name = models.CharField(max_length=255)
+    content_type = models.CharField(max_length=100)
+    size = models.PositiveIntegerField()
+    offset = models.PositiveIntegerField(default=0)
+    # Hex SHA-256 of the whole file, checked when the upload is finalized
+    checksum = models.CharField(max_length=64)
+    expires_at = models.DateTimeField(db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, editable=False)
+
+    class Meta:
+        db_table = "document_upload"
+
+    def __str__(self):
+        return f"{self.file_name} ({self.offset}/{self.size})"
+
+    @property
+    def is_complete(self):
+        return self.offset == self.size
+
+
+class PatientImportJob(AbstractUUID):
+    """
+    A bulk patient import queued from the API. The rows are kept until the import
+    has run; ``report`` then holds what ``onboard_patients`` returned.
+    """
+
+    requested_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, null=True, related_name="patient_imports"
+    )
+    status = models.CharField(
+        max_length=20,
+        choices=ProgressStatusEnum.choices(),
+        default=ProgressStatusEnum.PENDING,
+    )
+    total = models.PositiveIntegerField(default=0)
+    rows = models.JSONField(default=list)
+    report = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default="")
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, editable=False)
+
+    class Meta:
+        db_table = "patient_import_job"
+
+    def __str__(self):
+        return f"Patient import of {self.total} rows ({self.status})"
+
+
 class AuthToken(AbstractUUID):
     """Authentication Token Model."""
 
@@ -242,6 +479,97 @@ class AuthToken(AbstractUUID):
         db_table = "auth_token"
         ordering = ("-created_at",)
         verbose_name = "Token"
+        indexes = [
+            models.Index(
+                fields=["token", "type", "status"], name="auth_token_lookup_idx"
+            ),
+            models.Index(fields=["expiry"], name="auth_token_expiry_idx"),
+        ]
 
     def __str__(self):
         return f"{self.user.get_full_name()} {self.type}"
+
+    @classmethod
+    def live(cls, token_type):
+        """Pending, unexpired tokens of ``token_type``."""
+        return cls.objects.filter(
+            models.Q(expiry__isnull=True) | models.Q(expiry__gt=timezone.now()),
+            type=token_type,
+            status=AuthTokenStatusEnum.PENDING,
+        )
+
+    @classmethod
+    def get_live(cls, token, token_type):
+        """The live token holding ``token``, with its user, in one indexed query."""
+        return cls.live(token_type).select_related("user").filter(token=token).first()
+
+    @classmethod
+    def expired_or_used(cls):
+        return cls.objects.filter(
+            models.Q(expiry__lte=timezone.now())
+            | models.Q(status=AuthTokenStatusEnum.USED)
+        )
+
+
+class EmailOutbox(AbstractUUID):
+    """Outgoing email waiting to be delivered by the outbox worker."""
+
+    user = models.ForeignKey(
+        User,
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="queued_emails",
+    )
+    to_email = models.EmailField(max_length=255)
+    from_email = models.CharField(max_length=255, null=True, blank=True)
+    subject = models.CharField(max_length=255)
+    message = models.TextField()
+    status = models.PositiveSmallIntegerField(
+        choices=EmailStatusEnum.choices(), default=EmailStatusEnum.PENDING
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(null=True, blank=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, editable=False)
+
+    class Meta:
+        db_table = "email_outbox"
+        ordering = ("created_at",)
+        indexes = [
+            models.Index(
+                fields=["status", "next_attempt_at"],
+                name="email_outbox_ready_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.to_email} - {self.subject}"
+
+    @classmethod
+    def queue(cls, subject, message, to_email, from_email=None, user=None):
+        """Insert an outbox row and wake the worker once the transaction commits."""
+        from apps.users.tasks import send_queued_emails
+
+        email = cls.objects.create(
+            subject=subject,
+            message=message,
+            to_email=to_email,
+            from_email=from_email,
+            user=user,
+        )
+        # robust: a broker outage must not fail the request, the beat schedule drains later
+        transaction.on_commit(send_queued_emails.delay, robust=True)
+        return email
+
+    @classmethod
+    def queue_many(cls, emails, batch_size=1000):
+        """Insert many unsaved outbox rows at once and wake the worker once on commit."""
+        from apps.users.tasks import send_queued_emails
+
+        emails = cls.objects.bulk_create(emails, batch_size=batch_size)
+        if emails:
+            transaction.on_commit(send_queued_emails.delay, robust=True)
+        return emails
@@ -0,0 +1,250 @@
+"""
+Bulk onboarding of patients, e.g. when migrating a partner clinic.
+
+Rows are validated with ``PatientImportSerializer`` and checked for phone number
+and username clashes with one query per chunk. Passwords are hashed in a process
+pool, since the configured hasher is deliberately slow and would otherwise
+dominate the run. Each chunk then bulk inserts its users, group memberships,
+patients and welcome emails in one transaction; the emails go through the outbox.
+Imports posted to the API are queued as a ``PatientImportJob`` and run by a
+Celery worker with ``run_import_job``. Their passwords never reach the job row:
+they travel in the task message only and are hashed by the worker.
+"""
+import csv
+import logging
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import Group
+from django.db import transaction
+from django.utils import timezone
+
+from apps.users.models import EmailOutbox, Patient, PatientImportJob, User
+from apps.users.serializer import PatientImportSerializer
+from apps.utils.enums import ProgressStatusEnum, UserGroup, UserType
+
+logger = logging.getLogger("user")
+
+ONBOARDING_CHUNK_SIZE = 1000
+# Larger imports go through the import_patients management command
+ONBOARDING_MAX_REQUEST_ROWS = 5000
+# Below this many passwords per chunk, hashing inline beats shipping them to workers
+POOL_MIN_PASSWORDS = 16
+WELCOME_SUBJECT = "Account created"
+WELCOME_MESSAGE = (
+    "An account has been created for you. Sign in with the password you were "
+    "given, or request a password reset to choose one."
+)
+
+
+def setup_worker():
+    """Make Django usable in pool workers started with the spawn method."""
+    django.setup()
+
+
+class PasswordHasher:
+    """Hashes passwords in a process pool; use as a context manager."""
+
+    def __init__(self, workers=None):
+        self.workers = workers or os.cpu_count() or 1
+        self.pool = None
+
+    def __enter__(self):
+        if self.workers > 1:
+            self.pool = ProcessPoolExecutor(
+                max_workers=self.workers, initializer=setup_worker
+            )
+        return self
+
+    def __exit__(self, *exc_info):
+        if self.pool:
+            self.pool.shutdown()
+
+    def hash(self, passwords):
+        """Hash ``passwords`` in order; missing passwords become unusable ones."""
+        indexes = [index for index, password in enumerate(passwords) if password]
+        hashed = [None if password else make_password(None) for password in passwords]
+        raw = [passwords[index] for index in indexes]
+        if self.pool and len(raw) >= POOL_MIN_PASSWORDS:
+            chunksize = max(1, len(raw) // (self.workers * 4))
+            results = self.pool.map(make_password, raw, chunksize=chunksize)
+        else:
+            results = map(make_password, raw)
+        for index, password in zip(indexes, results):
+            hashed[index] = password
+        return hashed
+
+
+def parse_patient_csv(lines):
+    """Rows of a patient CSV with a header line; empty cells count as missing."""
+    return [
+        {field: value for field, value in row.items() if field and value not in ("", None)}
+        for row in csv.DictReader(lines)
+    ]
+
+
+def validate_rows(rows, start=0):
+    """Split rows into validated data and ``{"row": n, "errors": ...}`` reports."""
+    valid, skipped = [], []
+    for number, row in enumerate(rows, start=start + 1):
+        serializer = PatientImportSerializer(data=row)
+        if serializer.is_valid():
+            data = dict(serializer.validated_data)
+            data["username"] = data.get("username") or str(uuid.uuid4())
+            valid.append((number, data))
+        else:
+            skipped.append({"row": number, "errors": serializer.errors})
+    return valid, skipped
+
+
+def drop_duplicates(rows, seen):
+    """
+    Drop rows whose phone number or username is already taken, in the database or
+    by an earlier row; ``seen`` carries the values claimed by earlier chunks.
+    """
+    phones = [data["phone_number"] for _, data in rows]
+    usernames = [data["username"] for _, data in rows]
+    seen["phone_number"].update(
+        User.objects.filter(phone_number__in=phones).values_list("phone_number", flat=True)
+    )
+    seen["username"].update(
+        User.objects.filter(username__in=usernames).values_list("username", flat=True)
+    )
+
+    kept, skipped = [], []
+    for number, data in rows:
+        clashes = {
+            field: [f"A user with this {field.replace('_', ' ')} already exists."]
+            for field in ("phone_number", "username")
+            if data[field] in seen[field]
+        }
+        if clashes:
+            skipped.append({"row": number, "errors": clashes})
+            continue
+        seen["phone_number"].add(data["phone_number"])
+        seen["username"].add(data["username"])
+        kept.append((number, data))
+    return kept, skipped
+
+
+def create_patients(rows, passwords, group, notify=True):
+    """Bulk insert one chunk of users with their group membership and patient rows."""
+    users = [
+        User(
+            username=data["username"],
+            email=data.get("email") or None,
+            phone_number=data["phone_number"],
+            first_name=data["first_name"],
+            last_name=data["last_name"],
+            password=password,
+            is_accept_terms_and_condition=data["is_accept_terms_and_condition"],
+            user_role=UserType.USER,
+        )
+        for (_, data), password in zip(rows, passwords)
+    ]
+    with transaction.atomic():
+        User.objects.bulk_create(users)
+        User.groups.through.objects.bulk_create(
+            [User.groups.through(user_id=user.pk, group_id=group.pk) for user in users]
+        )
+        Patient.objects.bulk_create([Patient(user=user) for user in users])
+        if notify:
+            EmailOutbox.queue_many(
+                [
+                    EmailOutbox(
+                        user=user,
+                        to_email=user.email,
+                        from_email="info@mail.com",
+                        subject=WELCOME_SUBJECT,
+                        message=WELCOME_MESSAGE,
+                    )
+                    for user in users
+                    if user.email
+                ]
+            )
+    return users
+
+
+def onboard_patients(rows, chunk_size=ONBOARDING_CHUNK_SIZE, workers=None, notify=True):
+    """
+    Import patient rows (dicts shaped like the registration payload) and return
+    ``{"created", "skipped", "seconds", "per_second"}``. Chunks commit on their own,
+    so a failure part way keeps the chunks already imported.
+    """
+    rows = list(rows)
+    started = time.monotonic()
+    group, _ = Group.objects.get_or_create(name=UserGroup.USER)
+    seen = {"phone_number": set(), "username": set()}
+    created, skipped = 0, []
+
+    with PasswordHasher(workers) as hasher:
+        for start in range(0, len(rows), chunk_size):
+            valid, invalid = validate_rows(rows[start:start + chunk_size], start)
+            valid, clashing = drop_duplicates(valid, seen)
+            skipped += invalid + clashing
+            if not valid:
+                continue
+            passwords = hasher.hash([data.get("password") for _, data in valid])
+            created += len(create_patients(valid, passwords, group, notify))
+
+    seconds = time.monotonic() - started
+    per_second = created / seconds if seconds else float(created)
+    logger.info(
+        f"Patient onboarding: created {created}, skipped {len(skipped)} "
+        f"in {seconds:.2f}s ({per_second:.0f}/s)"
+    )
+    return {
+        "created": created,
+        "skipped": skipped,
+        "seconds": round(seconds, 3),
+        "per_second": round(per_second, 1),
+    }
+
+
+def split_passwords(rows):
+    """Rows without their ``password`` and the passwords in row order (None if absent)."""
+    stripped, passwords = [], []
+    for row in rows:
+        if isinstance(row, dict):
+            row = dict(row)
+            passwords.append(row.pop("password", None))
+        else:
+            passwords.append(None)
+        stripped.append(row)
+    return stripped, passwords
+
+
+def run_import_job(job, passwords=None):
+    """
+    Run a queued import with the passwords split off its rows, recording its
+    report on the job. The rows are dropped whether the import succeeds or fails.
+    """
+    job.status = ProgressStatusEnum.IN_PROGRESS
+    job.started_at = timezone.now()
+    job.save(update_fields=["status", "started_at", "updated_at"])
+
+    rows = [
+        dict(row, password=password) if password else row
+        for row, password in zip(job.rows, passwords or [None] * len(job.rows))
+    ]
+    try:
+        # Celery's prefork workers are daemonic and may not start a process pool,
+        # so passwords are hashed in-process; more workers import more jobs at once
+        job.report = onboard_patients(rows, workers=1)
+        job.status = ProgressStatusEnum.COMPLETED
+    except Exception as e:
+        job.status = ProgressStatusEnum.FAILED
+        job.error = str(e)
+        logger.error(f"Patient import {job.id} failed: {e}")
+        raise
+    finally:
+        job.rows = []
+        job.finished_at = timezone.now()
+        job.save(
+            update_fields=["status", "report", "error", "rows", "finished_at", "updated_at"]
+        )
+    return job
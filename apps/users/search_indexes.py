@@ -0,0 +1,60 @@
+"""
+Trigram GIN indexes backing the ranked user and patient search on PostgreSQL.
+
+Expression indexes with an operator class are not expressible on the models
+without breaking SQLite, so they are created with raw SQL: after ``migrate``
+through ``post_migrate``, or with ``manage.py create_search_indexes
+--concurrently`` on a live database.
+"""
+import logging
+
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from apps.users.models import Patient, User
+
+logger = logging.getLogger("user")
+
+# (model, field) pairs searched with icontains, i.e. UPPER(column) LIKE UPPER(term)
+TRIGRAM_INDEXED_FIELDS = (
+    (User, "first_name"),
+    (User, "last_name"),
+    (User, "email"),
+    (User, "phone_number"),
+    (Patient, "nationality"),
+)
+
+
+def trigram_index_sql(connection, model, field_name, concurrently=False):
+    table = model._meta.db_table
+    column = model._meta.get_field(field_name).column
+    quote = connection.ops.quote_name
+    return (
+        f"CREATE INDEX {'CONCURRENTLY ' if concurrently else ''}IF NOT EXISTS "
+        f"{quote(f'{table}_{column}_trgm_idx')} ON {quote(table)} "
+        f"USING gin (UPPER({quote(column)}) gin_trgm_ops)"
+    )
+
+
+def create_search_indexes(using=DEFAULT_DB_ALIAS, concurrently=False):
+    """Create the pg_trgm extension and the trigram indexes; a no-op off PostgreSQL."""
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return []
+    statements = [
+        trigram_index_sql(connection, model, field_name, concurrently)
+        for model, field_name in TRIGRAM_INDEXED_FIELDS
+    ]
+    with connection.cursor() as cursor:
+        cursor.execute("CREATE EXTENSION IF NOT EXISTS pg_trgm")
+        for statement in statements:
+            cursor.execute(statement)
+    logger.info(f"Search indexes: ensured {len(statements)} trigram indexes.")
+    return statements
+
+
+def create_search_indexes_after_migrate(sender, using=DEFAULT_DB_ALIAS, **kwargs):
+    # Missing CREATE EXTENSION rights must not fail the migration itself
+    try:
+        create_search_indexes(using=using)
+    except DatabaseError as e:
+        logger.error(f"Search indexes: could not create trigram indexes: {e}")
@@ -3,6 +3,7 @@ import uuid
 
 from django.conf import settings
 from django.contrib.auth.models import Group
+from django.db.models import Prefetch
 from apps.utils.enums import (
     BloodGroupType,
     GenderType,
@@ -15,6 +16,8 @@ from rest_framework import serializers
 from .models import (
     Address,
     Allergy,
+    DocumentUpload,
+    PatientImportJob,
     PractitionerSpecialization,
     User,
     EmergencyContact,
@@ -22,7 +25,10 @@ from .models import (
     Patient,
     Practitioner,
 )
+from apps.utils.bulk import set_related
 from apps.utils.constant import DATETIME_FORMAT, DATE_FORMAT
+from apps.utils.renditions import rendition_urls
+from apps.utils.validators import upload_errors, validate_file, validate_image
 
 
 logger = logging.getLogger("user")
@@ -100,9 +106,13 @@ class UserSerializer(serializers.ModelSerializer):
     full_name = serializers.SerializerMethodField(
         "get_name", help_text="User's full name"
     )
-    # avatar = serializers.SerializerMethodField(
-    #     "get_avatar", help_text="User's avatar URL"
-    # )
+    avatar = serializers.SerializerMethodField(
+        "get_avatar", help_text="User's avatar URL"
+    )
+    avatar_thumbnails = serializers.SerializerMethodField(
+        "get_avatar_thumbnails",
+        help_text="WebP avatar thumbnail URLs by size (list, detail); null until generated",
+    )
     address = AddressSerializer(read_only=True, required=False)
 
     class Meta:
@@ -114,7 +124,8 @@ class UserSerializer(serializers.ModelSerializer):
             "phone_number",
             "address",
             "gender",
-            # "avatar",
+            "avatar",
+            "avatar_thumbnails",
             "is_accept_terms_and_condition",
             "date_of_birth",
             "group",
@@ -129,6 +140,16 @@ class UserSerializer(serializers.ModelSerializer):
             "id": {"read_only": True},
         }
 
+    @staticmethod
+    def setup_eager_loading(queryset, prefix=""):
+        """
+        Load the address and groups the serializer reads, for users reached
+        through ``prefix`` (e.g. ``"user__"``), so a page costs no query per row.
+        """
+        return queryset.select_related(f"{prefix}address").prefetch_related(
+            Prefetch(f"{prefix}groups", queryset=Group.objects.only("id", "name"))
+        )
+
     @staticmethod
     def get_avatar(obj):
         """
@@ -138,6 +159,10 @@ class UserSerializer(serializers.ModelSerializer):
             return f"{settings.BASE_BE_URL}{obj.avatar.url}"
         return None
 
+    @staticmethod
+    def get_avatar_thumbnails(obj):
+        return rendition_urls(obj, "avatar")
+
     @staticmethod
     def get_name(obj):
         """
@@ -197,8 +222,14 @@ class UserFormSerializer(serializers.Serializer):
     date_of_birth = serializers.DateField(
         format=DATE_FORMAT, required=False
     )
+    avatar = serializers.ImageField(
+        required=False, validators=[validate_image], help_text="Profile picture"
+    )
 
     def validate(self, attrs):
+        errors = upload_errors(self.context.get("request"))
+        if errors:
+            raise serializers.ValidationError(errors)
         if "address" in attrs:
             attrs["address"], _ = Address.objects.get_or_create(
                 **attrs["address"]
@@ -265,6 +296,43 @@ class PatientRegistrationSerializer(serializers.Serializer):
         return instance
 
 
+class PatientImportSerializer(PatientRegistrationSerializer):
+    """
+    Validates one row of a bulk patient import. Rows without a password get an
+    unusable one and set it through the password reset flow.
+    """
+
+    email = serializers.EmailField(
+        required=False,
+        allow_blank=True,
+        allow_null=True,
+        help_text="Email address of the patient",
+    )
+    password = serializers.CharField(
+        required=False,
+        allow_blank=True,
+        allow_null=True,
+        min_length=8,
+        write_only=True,
+        help_text="Password for patient login",
+    )
+    is_accept_terms_and_condition = serializers.BooleanField(
+        required=False,
+        default=False,
+        help_text="Acceptance of terms and conditions",
+    )
+
+
+class PatientImportJobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = PatientImportJob
+        fields = [
+            "id", "status", "total", "report", "error",
+            "created_at", "started_at", "finished_at",
+        ]
+        read_only_fields = fields
+
+
 class EmergencyContactSerializer(serializers.ModelSerializer):
     """
     Serializer for Emergency Contact information.
@@ -363,6 +431,21 @@ class PatientSerializer(serializers.ModelSerializer):
         ]
         read_only_fields = ["id"]
 
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load every relation the serializer nests in a fixed number of queries."""
+        queryset = queryset.select_related("user", "emergency_contact")
+        return UserSerializer.setup_eager_loading(queryset, "user__").prefetch_related(
+            Prefetch(
+                "medications",
+                queryset=Medication.objects.only(*MedicationSerializer.Meta.fields),
+            ),
+            Prefetch(
+                "allergies",
+                queryset=Allergy.objects.only(*AllergySerializer.Meta.fields),
+            ),
+        )
+
 
 class PatientFormSerializer(serializers.Serializer):
     emergency_contact = serializers.CharField(
@@ -397,17 +480,10 @@ class PatientFormSerializer(serializers.Serializer):
         self.update_patient_fields(instance, payload)
 
         if validated_data.get("medications") is not None:
-            self.update_related_fields(
-                instance,
-                validated_data,
-                "medications",
-                instance.medications,
-            )
+            self.update_related_fields(instance, validated_data, "medications")
 
         if validated_data.get("allergies") is not None:
-            self.update_related_fields(
-                instance, validated_data, "allergies", instance.allergies
-            )
+            self.update_related_fields(instance, validated_data, "allergies")
 
         instance.save()
         return instance
@@ -418,29 +494,11 @@ class PatientFormSerializer(serializers.Serializer):
         Patient.objects.filter(id=instance.id).update(**validated_data)
         instance.refresh_from_db()
 
-    def update_related_fields(
-        self, instance, validated_data, field_name, related_manager
-    ):
-        """Update many-to-many related fields."""
+    def update_related_fields(self, instance, validated_data, field_name):
+        """Replace a many-to-many relation with one diff on its through table."""
         related_ids = validated_data.pop(field_name, None)
-
         if related_ids is not None:
-            if related_ids:
-                current_related_ids = set(
-                    related_manager.values_list("id", flat=True)
-                )
-                new_related_ids = set(related_ids)
-
-                # Remove relationships that are no longer valid
-                to_remove = current_related_ids - new_related_ids
-                if to_remove:
-                    for pr in related_manager.filter(id__in=to_remove):
-                        related_manager.remove(pr)
-
-                # Add new relationships
-                related_manager.set(new_related_ids)
-            else:
-                related_manager.clear()
+            set_related(instance, field_name, related_ids)
 
     def validate(self, attrs):
         """
@@ -489,6 +547,9 @@ class PractitionerSerializer(serializers.ModelSerializer):
     specializations = PractitionerSpecializationSerializer(
         read_only=True, many=True
     )
+    means_of_identification_preview = serializers.SerializerMethodField(
+        help_text="WebP preview URLs of the ID's first page by size (list, detail)"
+    )
 
     class Meta:
         model = Practitioner
@@ -499,10 +560,28 @@ class PractitionerSerializer(serializers.ModelSerializer):
             "specializations",
             "means_of_identification_type",
             "means_of_identification",
+            "means_of_identification_preview",
             "certificate",
             "updated_at",
         ]
 
+    @staticmethod
+    def get_means_of_identification_preview(obj):
+        return rendition_urls(obj, "means_of_identification")
+
+    @staticmethod
+    def setup_eager_loading(queryset):
+        """Load every relation the serializer nests in a fixed number of queries."""
+        queryset = queryset.select_related("user")
+        return UserSerializer.setup_eager_loading(queryset, "user__").prefetch_related(
+            Prefetch(
+                "specializations",
+                queryset=PractitionerSpecialization.objects.only(
+                    *PractitionerSpecializationSerializer.Meta.fields
+                ),
+            )
+        )
+
 
 class PractitionerMiniSerializer(serializers.ModelSerializer):
     user = UserSerializer(read_only=True)
@@ -519,16 +598,69 @@ class PractitionerDocumentUploadSerializer(serializers.Serializer):
     means_of_identification_type = serializers.ChoiceField(
         choices=ValidIDType.choices(), required=False
     )
-    means_of_identification = serializers.FileField(required=False)
+    means_of_identification = serializers.FileField(
+        required=False, validators=[validate_file]
+    )
     certificate = serializers.FileField(
-        required=False, help_text="Practitioner certificate."
+        required=False,
+        validators=[validate_file],
+        help_text="Practitioner certificate.",
     )
 
+    def validate(self, attrs):
+        # Files refused while the request streamed in never reach the fields
+        errors = upload_errors(self.context.get("request"))
+        if errors:
+            raise serializers.ValidationError(errors)
+        if attrs.get("means_of_identification") and not attrs.get(
+            "means_of_identification_type"
+        ):
+            raise serializers.ValidationError(
+                {"means_of_identification_type": "This field is required."}
+            )
+        return attrs
+
     def create(self, validated_data):
         pass
 
     def update(self, instance, validated_data):
-        pass
+        for field, value in validated_data.items():
+            setattr(instance, field, value)
+        instance.save()
+        return instance
+
+
+class DocumentUploadStartSerializer(serializers.Serializer):
+    """Announces a resumable document upload before its chunks are sent."""
+
+    field = serializers.ChoiceField(
+        choices=Practitioner.DOCUMENT_FIELDS,
+        help_text="Practitioner document the file is for.",
+    )
+    means_of_identification_type = serializers.ChoiceField(
+        choices=ValidIDType.choices(), required=False, allow_null=True
+    )
+    file_name = serializers.CharField(max_length=255)
+    content_type = serializers.CharField(max_length=100)
+    size = serializers.IntegerField(min_value=1, help_text="File size in bytes.")
+    checksum = serializers.RegexField(
+        r"^[0-9a-fA-F]{64}$", help_text="Hex SHA-256 of the whole file."
+    )
+
+    def validate(self, attrs):
+        if attrs["field"] == "means_of_identification" and not attrs.get(
+            "means_of_identification_type"
+        ):
+            raise serializers.ValidationError(
+                {"means_of_identification_type": "This field is required."}
+            )
+        return attrs
+
+
+class DocumentUploadSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = DocumentUpload
+        fields = ["id", "field", "file_name", "size", "offset", "expires_at"]
 
 
 class PractitionerFormSerializer(serializers.Serializer):
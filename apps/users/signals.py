@@ -1,3 +1,71 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from apps.utils.renditions import delete_renditions
+
+from .models import DocumentBlob, Practitioner, User
+from .tasks import schedule_renditions
+
+
+@receiver(post_save, sender=Practitioner)
+def count_practitioner_document_references(sender, instance, **kwargs):
+    stored = getattr(instance, "_stored_documents", set())
+    current = instance.document_names()
+    DocumentBlob.retain(current - stored)
+    DocumentBlob.release(stored - current)
+    instance._stored_documents = current
+
+
+@receiver(post_save, sender=Practitioner)
+def render_identification_preview(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "means_of_identification" in update_fields:
+        schedule_renditions(instance, "means_of_identification")
+
+
+@receiver(post_save, sender=User)
+def render_avatar(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or "avatar" in update_fields:
+        schedule_renditions(instance, "avatar", crop=True)
+
+
+@receiver(post_delete, sender=User)
+def delete_avatar_renditions(sender, instance, **kwargs):
+    # Read without loading: a deferred field cannot be fetched from a deleted row
+    renditions = instance.__dict__.get("avatar_renditions")
+    storage = User._meta.get_field("avatar").storage
+    transaction.on_commit(lambda: delete_renditions(storage, renditions))
+
+
+@receiver(post_delete, sender=Practitioner)
+def release_practitioner_documents(sender, instance, **kwargs):
+    DocumentBlob.release(getattr(instance, "_stored_documents", set()))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_profile_cache(sender, instance, **kwargs):
+    User.invalidate_profile_cache([instance.pk])
+
+
+@receiver(m2m_changed, sender=User.groups.through)
+def sync_user_role_with_groups(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Keep the denormalized ``user_role`` in step with group membership and revoke
+    the JWTs whose role claims the change made stale.
+    """
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        instance.sync_role()
+        User.revoke_tokens([instance.pk])
+        instance.refresh_from_db(fields=["token_version"])
+    elif pk_set:
+        for user in User.objects.filter(pk__in=pk_set).prefetch_related("groups"):
+            user.sync_role()
+        User.revoke_tokens(pk_set)
+
+
 # from django.db.models.signals import post_save
 # from django.dispatch import receiver
 
@@ -0,0 +1,244 @@
+import logging
+from datetime import timedelta
+
+from celery import shared_task
+from django.apps import apps
+from django.core.cache import cache
+from django.core.mail import EmailMessage, get_connection
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from apps.users.models import AuthToken, EmailOutbox, PatientImportJob, User
+from apps.users.onboarding import run_import_job, split_passwords
+from apps.users.uploads import expire_uploads
+from apps.utils.renditions import create_renditions, delete_renditions
+from apps.utils.enums import EmailStatusEnum, ProgressStatusEnum
+
+logger = logging.getLogger("user")
+
+EMAIL_BATCH_SIZE = 100
+EMAIL_MAX_BATCHES = 10
+EMAIL_MAX_ATTEMPTS = 5
+EMAIL_RETRY_BASE_DELAY = timedelta(minutes=1)
+# Consecutive delivery failures that open the circuit, and how long it stays open
+EMAIL_CIRCUIT_FAILURE_THRESHOLD = 3
+EMAIL_CIRCUIT_OPEN_SECONDS = 5 * 60
+EMAIL_CIRCUIT_CACHE_KEY = "users:email_outbox:circuit_open"
+# Rows left in SENDING longer than this belong to a worker that died mid-batch
+EMAIL_SENDING_TIMEOUT = timedelta(minutes=10)
+
+AUTH_TOKEN_SWEEP_BATCH_SIZE = 1000
+AUTH_TOKEN_SWEEP_MAX_BATCHES = 100
+
+
+def circuit_is_open():
+    return bool(cache.get(EMAIL_CIRCUIT_CACHE_KEY))
+
+
+def open_circuit(reason):
+    cache.set(EMAIL_CIRCUIT_CACHE_KEY, True, EMAIL_CIRCUIT_OPEN_SECONDS)
+    logger.error(f"Email outbox: SMTP circuit opened for {EMAIL_CIRCUIT_OPEN_SECONDS}s: {reason}")
+
+
+def claim_batch(batch_size):
+    """Move a batch of due emails to SENDING so concurrent workers never pick the same rows."""
+    now = timezone.now()
+    EmailOutbox.objects.filter(
+        status=EmailStatusEnum.SENDING, updated_at__lt=now - EMAIL_SENDING_TIMEOUT
+    ).update(status=EmailStatusEnum.PENDING, updated_at=now)
+    with transaction.atomic():
+        emails = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailStatusEnum.PENDING, next_attempt_at__lte=now)
+            .order_by("next_attempt_at")[:batch_size]
+        )
+        EmailOutbox.objects.filter(pk__in=[email.pk for email in emails]).update(
+            status=EmailStatusEnum.SENDING, updated_at=now
+        )
+    return emails
+
+
+def record_failure(email, error, now):
+    email.attempts += 1
+    email.last_error = str(error)
+    if email.attempts >= EMAIL_MAX_ATTEMPTS:
+        email.status = EmailStatusEnum.FAILED
+    else:
+        email.status = EmailStatusEnum.PENDING
+        email.next_attempt_at = now + EMAIL_RETRY_BASE_DELAY * 2 ** (email.attempts - 1)
+
+
+def deliver_batch(emails):
+    """
+    Send a claimed batch over one SMTP connection. Returns False when the circuit
+    opened, in which case the undelivered rest of the batch is released untouched.
+    """
+    now = timezone.now()
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        for email in emails:
+            email.status, email.updated_at = EmailStatusEnum.PENDING, now
+        EmailOutbox.objects.bulk_update(emails, ["status", "updated_at"])
+        open_circuit(e)
+        return False
+
+    consecutive_failures = 0
+    delivered = True
+    try:
+        for index, email in enumerate(emails):
+            email.updated_at = now
+            try:
+                EmailMessage(
+                    subject=email.subject,
+                    body=email.message,
+                    from_email=email.from_email,
+                    to=[email.to_email],
+                    connection=connection,
+                ).send()
+            except Exception as e:
+                record_failure(email, e, now)
+                consecutive_failures += 1
+                if consecutive_failures >= EMAIL_CIRCUIT_FAILURE_THRESHOLD:
+                    for pending in emails[index + 1:]:
+                        pending.status = EmailStatusEnum.PENDING
+                    open_circuit(e)
+                    delivered = False
+                    break
+            else:
+                email.status = EmailStatusEnum.SENT
+                email.sent_at = now
+                consecutive_failures = 0
+    finally:
+        connection.close()
+        EmailOutbox.objects.bulk_update(
+            emails,
+            ["status", "attempts", "last_error", "next_attempt_at", "sent_at", "updated_at"],
+        )
+    return delivered
+
+
+@shared_task
+def send_queued_emails(batch_size=EMAIL_BATCH_SIZE, max_batches=EMAIL_MAX_BATCHES):
+    """Drain due outbox emails in batches, each over a single reused SMTP connection."""
+    sent = 0
+    for _ in range(max_batches):
+        if circuit_is_open():
+            logger.info("Email outbox: SMTP circuit is open, skipping drain.")
+            break
+        emails = claim_batch(batch_size)
+        if not emails:
+            break
+        delivered = deliver_batch(emails)
+        sent += sum(1 for email in emails if email.status == EmailStatusEnum.SENT)
+        if not delivered or len(emails) < batch_size:
+            break
+    return sent
+
+
+@shared_task
+def sweep_auth_tokens(
+    batch_size=AUTH_TOKEN_SWEEP_BATCH_SIZE, max_batches=AUTH_TOKEN_SWEEP_MAX_BATCHES
+):
+    """
+    Delete expired and consumed auth tokens, at most ``batch_size`` rows per
+    statement so no single delete holds long locks; the next run picks up the rest.
+    """
+    deleted = 0
+    for _ in range(max_batches):
+        pks = list(
+            AuthToken.expired_or_used()
+            .order_by()
+            .values_list("pk", flat=True)[:batch_size]
+        )
+        if not pks:
+            break
+        count, _ = AuthToken.objects.filter(pk__in=pks).delete()
+        deleted += count
+        if len(pks) < batch_size:
+            break
+    if deleted:
+        logger.info(f"Auth token sweeper: deleted {deleted} expired or used tokens.")
+    return deleted
+
+
+@shared_task
+def expire_document_uploads():
+    """Discard resumable document uploads abandoned past their expiry."""
+    return expire_uploads()
+
+
+@shared_task
+def import_patients(job_id, passwords=None):
+    """Background entry point of a bulk patient import."""
+    job = PatientImportJob.objects.filter(
+        pk=job_id, status=ProgressStatusEnum.PENDING
+    ).first()
+    if job is None:
+        logger.info(f"Patient import {job_id} is no longer pending, skipping.")
+        return None
+    run_import_job(job, passwords)
+    return str(job.id)
+
+
+def schedule_patient_import(rows, requested_by=None):
+    """
+    Store the rows as a pending import and queue it once the transaction commits.
+    Plaintext passwords are not stored with the rows, they go with the task.
+    """
+    rows, passwords = split_passwords(rows)
+    job = PatientImportJob.objects.create(
+        requested_by=requested_by, rows=rows, total=len(rows)
+    )
+    transaction.on_commit(lambda: import_patients.delay(str(job.id), passwords))
+    return job
+
+
+@shared_task
+def generate_renditions(model_label, pk, field, crop=False):
+    """
+    Write the WebP renditions of one file field, record them on its row and
+    remove the ones they replace. A cleared field just loses its renditions.
+    """
+    model = apps.get_model(model_label)
+    instance = model.objects.filter(pk=pk).only(field).first()
+    if instance is None:
+        return None
+    file = getattr(instance, field)
+    renditions = create_renditions(file, crop=crop) if file else {}
+    source = Q(**{field: file.name}) if file else Q(**{field: ""}) | Q(**{f"{field}__isnull": True})
+
+    with transaction.atomic():
+        stored = list(
+            model.objects.select_for_update()
+            .filter(source, pk=pk)
+            .values_list(f"{field}_renditions", flat=True)
+        )
+        if stored:
+            model.objects.filter(pk=pk).update(**{f"{field}_renditions": renditions})
+    if not stored:
+        # The file was replaced meanwhile and its own task follows
+        delete_renditions(file.storage, renditions)
+        return None
+    delete_renditions(file.storage, stored[0], keep=renditions)
+    if model is User:
+        User.invalidate_profile_cache([pk])
+    return renditions
+
+
+def schedule_renditions(instance, field, crop=False):
+    """Queue renditions of ``instance.<field>`` on commit unless they are current."""
+    if instance.get_deferred_fields() & {field, f"{field}_renditions"}:
+        return
+    file = getattr(instance, field)
+    renditions = getattr(instance, f"{field}_renditions") or {}
+    if renditions.get("source") == (file.name if file else None):
+        return
+    transaction.on_commit(
+        lambda: generate_renditions.delay(
+            instance._meta.label, str(instance.pk), field, crop
+        ),
+        robust=True,
+    )
@@ -0,0 +1,125 @@
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from apps.users.authentication import (
+    GROUPS_CLAIM,
+    ROLE_CLAIM,
+    TOKEN_VERSION_CLAIM,
+    VersionedJWTAuthentication,
+)
+from apps.users.models import User
+from apps.utils.enums import UserGroup, UserType
+
+
+class JWTTestCase(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            first_name="Uncle",
+            last_name="Rukus",
+            phone_number="1234567890",
+            email="sistermagret007@gmail.com",
+            username="sistermagret007@gmail.com",
+            password="password123",
+        )
+        self.group, _ = Group.objects.get_or_create(name=UserGroup.PRACTITIONER)
+        self.user.groups.add(self.group)
+
+    def login(self):
+        self.client.credentials()
+        response = self.client.post(
+            reverse("api-auth-login"),
+            {"username": self.user.username, "password": "password123"},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["token"]
+
+    def list_assessments(self, access):
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {access}")
+        return self.client.get(reverse("assessment-api-list"))
+
+
+class RoleClaimTests(JWTTestCase):
+    def test_tokens_carry_role_claims(self):
+        claims = AccessToken(self.login()["access"])
+        self.assertEqual(claims[ROLE_CLAIM], UserType.PRACTITIONER)
+        self.assertEqual(claims[GROUPS_CLAIM], [UserGroup.PRACTITIONER])
+        self.assertEqual(claims[TOKEN_VERSION_CLAIM], self.user.token_version)
+
+    def test_role_check_reads_the_claims(self):
+        access = self.login()["access"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.list_assessments(access)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # The group check itself issues no membership query
+        self.assertFalse(
+            [query for query in queries if '"auth_group"."name" =' in query["sql"]]
+        )
+
+    def test_group_change_revokes_tokens(self):
+        tokens = self.login()
+        self.user.groups.remove(self.group)
+
+        response = self.list_assessments(tokens["access"])
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(
+            reverse("token_refresh"), {"refresh": tokens["refresh"]}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+        # A fresh login carries the new groups, which no longer grant access
+        response = self.list_assessments(self.login()["access"])
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+
+class CachedProfileAuthenticationTests(JWTTestCase):
+    def user_lookups(self, access):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.list_assessments(access)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [
+            query for query in queries if 'FROM "users" WHERE "users"."id" =' in query["sql"]
+        ]
+
+    def test_cached_profile_skips_the_user_query(self):
+        access = self.login()["access"]
+        self.assertEqual(len(self.user_lookups(access)), 1)
+        self.assertEqual(self.user_lookups(access), [])
+
+    def test_saving_the_user_invalidates_the_profile(self):
+        access = self.login()["access"]
+        self.user_lookups(access)
+        self.user.first_name = "Robert"
+        self.user.save()
+        self.assertEqual(len(self.user_lookups(access)), 1)
+
+        self.user.is_active = False
+        self.user.save()
+        response = self.list_assessments(access)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_row_read_before_a_deactivation_is_not_cached_after_it(self):
+        access = self.login()["access"]
+        load_user = VersionedJWTAuthentication.get_user
+
+        def load_then_deactivate(authentication, validated_token):
+            user = load_user(authentication, validated_token)
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.is_active = False
+                self.user.save()
+            return user
+
+        with mock.patch.object(
+            VersionedJWTAuthentication, "get_user", load_then_deactivate
+        ):
+            self.assertEqual(self.list_assessments(access).status_code, status.HTTP_200_OK)
+
+        response = self.list_assessments(access)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
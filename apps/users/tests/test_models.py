@@ -64,6 +64,29 @@ def test_user_group_with_group(user):
     assert user.group() == "Admin"
 
 
+@pytest.mark.django_db
+def test_user_group_uses_prefetched_groups(user, django_assert_num_queries):
+    """The group method reads prefetched groups without querying."""
+    user.groups.add(Group.objects.create(name="Admin"))
+    user = User.objects.prefetch_related("groups").get(pk=user.pk)
+    with django_assert_num_queries(0):
+        assert user.group() == "Admin"
+
+
+@pytest.mark.django_db
+def test_user_role_follows_group_membership(user):
+    """Joining or leaving a role group updates the stored user_role."""
+    practitioners = Group.objects.create(name="practitioner")
+    user.groups.add(practitioners)
+    assert User.objects.get(pk=user.pk).user_role == UserType.PRACTITIONER
+
+    user.groups.remove(practitioners)
+    assert User.objects.get(pk=user.pk).user_role == UserType.USER
+
+    practitioners.user_set.add(user)
+    assert User.objects.get(pk=user.pk).user_role == UserType.PRACTITIONER
+
+
 @pytest.mark.django_db
 def test_user_age(user):
     """Test the age property."""
@@ -0,0 +1,150 @@
+import io
+import tempfile
+from unittest import mock
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.users.models import EmailOutbox, Patient, PatientImportJob, User
+from apps.users.onboarding import (
+    POOL_MIN_PASSWORDS,
+    PasswordHasher,
+    onboard_patients,
+    run_import_job,
+)
+from apps.users.tasks import schedule_patient_import
+from apps.utils.enums import ProgressStatusEnum, UserGroup, UserType
+
+FAST_HASHERS = ["django.contrib.auth.hashers.MD5PasswordHasher"]
+
+
+def patient_row(index, **kwargs):
+    row = {
+        "first_name": "Patient",
+        "last_name": str(index),
+        "phone_number": f"070{index:08}",
+        "email": f"patient{index}@example.com",
+        "password": "password123",
+        "is_accept_terms_and_condition": True,
+    }
+    row.update(kwargs)
+    return row
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class OnboardPatientsTests(TestCase):
+    def test_creates_users_memberships_patients_and_emails_in_chunks(self):
+        rows = [patient_row(index) for index in range(5)]
+        rows.append(patient_row(5, email=None, password=None))
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            report = onboard_patients(rows, chunk_size=2, workers=1)
+
+        self.assertEqual(report["created"], 6)
+        self.assertEqual(report["skipped"], [])
+        group = Group.objects.get(name=UserGroup.USER)
+        self.assertEqual(group.user_set.count(), 6)
+        self.assertEqual(Patient.objects.count(), 6)
+        self.assertEqual(EmailOutbox.objects.count(), 5)
+        # One wake-up of the outbox worker per committed chunk that queued emails
+        self.assertEqual(len(callbacks), 3)
+
+        user = User.objects.get(phone_number="07000000000")
+        self.assertTrue(user.check_password("password123"))
+        self.assertEqual(user.user_role, UserType.USER)
+        self.assertEqual(user.group(), UserGroup.USER)
+        self.assertFalse(User.objects.get(phone_number="07000000005").has_usable_password())
+
+    def test_invalid_and_duplicate_rows_are_reported(self):
+        User.objects.create_user(username="taken", phone_number="07000000000")
+        rows = [
+            patient_row(0),
+            patient_row(1),
+            patient_row(2, phone_number="07000000001"),
+            patient_row(3, first_name=""),
+        ]
+
+        report = onboard_patients(rows, workers=1, notify=False)
+
+        self.assertEqual(report["created"], 1)
+        self.assertEqual(
+            sorted((skipped["row"], list(skipped["errors"])) for skipped in report["skipped"]),
+            [(1, ["phone_number"]), (3, ["phone_number"]), (4, ["first_name"])],
+        )
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_pool_hashes_match_inline_hashes(self):
+        passwords = [f"password{index}" for index in range(POOL_MIN_PASSWORDS)] + [None]
+        with PasswordHasher(workers=2) as hasher:
+            hashed = hasher.hash(passwords)
+        user = User(username="pool")
+        for password, encoded in zip(passwords[:-1], hashed):
+            user.password = encoded
+            self.assertTrue(user.check_password(password))
+        self.assertTrue(hashed[-1].startswith("!"))
+
+    def test_import_patients_command_reads_csv(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as patient_file:
+            patient_file.write("first_name,last_name,phone_number,email,password\n")
+            patient_file.write("Ada,Okafor,07000000001,ada@example.com,password123\n")
+            patient_file.write("Tunde,Bello,07000000002,,\n")
+        stdout, stderr = io.StringIO(), io.StringIO()
+
+        call_command(
+            "import_patients", patient_file.name, "--workers", "1", stdout=stdout, stderr=stderr
+        )
+
+        self.assertIn("Created 2 patients, skipped 0", stdout.getvalue())
+        self.assertEqual(Patient.objects.filter(user__first_name="Tunde").count(), 1)
+
+
+@override_settings(PASSWORD_HASHERS=FAST_HASHERS)
+class BulkImportEndpointTests(APITestCase):
+    def setUp(self):
+        self.url = reverse("api-patient-bulk-import")
+
+    def test_staff_import(self):
+        staff = User.objects.create_superuser(
+            username="admin", email="admin@example.com", password="password123"
+        )
+        self.client.force_authenticate(staff)
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                self.url, {"patients": [patient_row(0), patient_row(1)]}, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(response.data["data"]["status"], ProgressStatusEnum.PENDING)
+        self.assertFalse(
+            any("password" in row for row in PatientImportJob.objects.get().rows)
+        )
+        for callback in callbacks:
+            callback()
+
+        response = self.client.get(
+            reverse("api-patient-bulk-import-job", kwargs={"job_id": response.data["data"]["id"]})
+        )
+        self.assertEqual(response.data["data"]["status"], ProgressStatusEnum.COMPLETED)
+        self.assertEqual(response.data["data"]["report"]["created"], 2)
+        self.assertEqual(PatientImportJob.objects.get().rows, [])
+        self.assertTrue(User.objects.get(phone_number="07000000000").check_password("password123"))
+
+    def test_failed_import_drops_its_rows(self):
+        job = schedule_patient_import([patient_row(0)])
+        with mock.patch(
+            "apps.users.onboarding.onboard_patients", side_effect=RuntimeError("boom")
+        ), self.assertRaises(RuntimeError):
+            run_import_job(job, ["password123"])
+
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.error, job.rows), (ProgressStatusEnum.FAILED, "boom", []))
+
+    def test_non_staff_users_are_refused(self):
+        user = User.objects.create_user(username="patient", phone_number="07000000099")
+        self.client.force_authenticate(user)
+        response = self.client.post(self.url, {"patients": [patient_row(0)]}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        self.assertFalse(Patient.objects.exists())
@@ -0,0 +1,160 @@
+import io
+import shutil
+import tempfile
+
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from PIL import Image
+
+from apps.users.models import Practitioner, User
+from apps.users.serializer import PractitionerSerializer, UserSerializer
+from apps.utils.renditions import RENDITION_SIZES
+from apps.utils.storage import get_document_storage
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+def jpeg_bytes(size=(2400, 1600)):
+    buffer = io.BytesIO()
+    Image.effect_noise(size, 64).convert("RGB").save(buffer, "JPEG", quality=95)
+    return buffer.getvalue()
+
+
+def png_bytes(size=(300, 300)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (0, 0, 255)).save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+def is_blue(file):
+    red, green, blue = Image.open(file).convert("RGB").getpixel((0, 0))
+    return blue > 200 and red < 40 and green < 40
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT, BASE_BE_URL="https://api.example.com")
+class RenditionTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="doctor", phone_number="08000000001")
+
+    def save_avatar(self, content, name="avatar.jpg"):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.avatar = ContentFile(content, name=name)
+            self.user.save()
+        self.user.refresh_from_db()
+
+    def test_avatar_thumbnails_are_generated_and_exposed(self):
+        original = jpeg_bytes()
+        self.save_avatar(original)
+
+        renditions = self.user.avatar_renditions
+        self.assertEqual(renditions["source"], self.user.avatar.name)
+        for rendition, size in RENDITION_SIZES.items():
+            with self.user.avatar.storage.open(renditions[rendition]) as file:
+                image = Image.open(file)
+                self.assertEqual((image.format, image.size), ("WEBP", size))
+        self.assertTrue(renditions["list"].startswith("profile/"))
+        self.assertLess(
+            self.user.avatar.storage.size(renditions["list"]) * 10, len(original)
+        )
+
+        thumbnails = UserSerializer(self.user).data["avatar_thumbnails"]
+        self.assertEqual(
+            thumbnails["list"], f"https://api.example.com/media/{renditions['list']}"
+        )
+
+    def test_replaced_avatar_hides_stale_thumbnails(self):
+        self.save_avatar(jpeg_bytes())
+        self.user.avatar = ContentFile(jpeg_bytes((300, 300)), name="new.jpg")
+        self.assertIsNone(UserSerializer(self.user).data["avatar_thumbnails"])
+
+    def test_replaced_cleared_and_deleted_avatars_leave_no_renditions(self):
+        storage = self.user.avatar.storage
+        self.save_avatar(jpeg_bytes((400, 300)), name="old.jpg")
+        old = self.user.avatar_renditions
+
+        self.save_avatar(png_bytes(), name="new.png")
+        new = self.user.avatar_renditions
+        for rendition in RENDITION_SIZES:
+            self.assertFalse(storage.exists(old[rendition]))
+            self.assertTrue(storage.exists(new[rendition]))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.avatar = None
+            self.user.save()
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.avatar_renditions, {})
+        for rendition in RENDITION_SIZES:
+            self.assertFalse(storage.exists(new[rendition]))
+
+        self.save_avatar(png_bytes(), name="last.png")
+        last = self.user.avatar_renditions
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.get(pk=self.user.pk).delete()
+        for rendition in RENDITION_SIZES:
+            self.assertFalse(storage.exists(last[rendition]))
+
+    def test_sources_sharing_a_stem_keep_their_own_thumbnails(self):
+        other = User.objects.create_user(username="other", phone_number="08000000002")
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.avatar = ContentFile(jpeg_bytes((400, 300)), name="me.jpg")
+            self.user.save()
+            other.avatar = ContentFile(png_bytes(), name="me.png")
+            other.save()
+        self.user.refresh_from_db()
+        other.refresh_from_db()
+
+        mine, theirs = self.user.avatar_renditions, other.avatar_renditions
+        self.assertEqual(mine["list"], "profile/me.jpg.list.webp")
+        self.assertEqual(theirs["list"], "profile/me.png.list.webp")
+        storage = self.user.avatar.storage
+        for rendition in RENDITION_SIZES:
+            with storage.open(mine[rendition]) as file:
+                self.assertFalse(is_blue(file))
+            with storage.open(theirs[rendition]) as file:
+                self.assertTrue(is_blue(file))
+        self.assertTrue(storage.exists(self.user.avatar.name))
+        self.assertTrue(storage.exists(other.avatar.name))
+
+    def test_identification_preview_shares_the_blob_lifecycle(self):
+        practitioner = Practitioner.objects.create(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            practitioner.means_of_identification = ContentFile(jpeg_bytes(), name="id.jpg")
+            practitioner.save()
+        practitioner.refresh_from_db()
+
+        storage = get_document_storage()
+        blob = practitioner.means_of_identification.name
+        preview = practitioner.means_of_identification_renditions["detail"]
+        self.assertEqual(preview, f"{blob}.detail.webp")
+        self.assertFalse(storage.is_blob(preview))
+        with storage.open(preview) as file:
+            self.assertLessEqual(max(Image.open(file).size), 720)
+        self.assertIsNotNone(
+            PractitionerSerializer(practitioner).data["means_of_identification_preview"]
+        )
+
+        practitioner.delete()
+        call_command("gc_document_blobs", "--grace-minutes", "0", stdout=io.StringIO())
+        self.assertFalse(storage.exists(blob))
+        self.assertFalse(storage.exists(preview))
+
+    def test_documents_pillow_cannot_read_get_no_preview(self):
+        practitioner = Practitioner.objects.create(user=self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            practitioner.means_of_identification = ContentFile(b"%PDF-1.7\n", name="id.pdf")
+            practitioner.save()
+        practitioner.refresh_from_db()
+
+        self.assertEqual(
+            practitioner.means_of_identification_renditions,
+            {"source": practitioner.means_of_identification.name},
+        )
+        self.assertIsNone(
+            PractitionerSerializer(practitioner).data["means_of_identification_preview"]
+        )
@@ -0,0 +1,70 @@
+from django.core.management import call_command
+from django.db import connection
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.users.models import Patient, User
+from apps.users.search_indexes import TRIGRAM_INDEXED_FIELDS, trigram_index_sql
+
+
+class SearchTests(APITestCase):
+    def setUp(self):
+        people = [
+            ("Ada", "Okafor", "Nigerian"),
+            ("Adaeze", "Bello", "Ghanaian"),
+            ("Tunde", "Ada", "Nigerian"),
+            ("Grace", "Hopper", "American"),
+        ]
+        for index, (first_name, last_name, nationality) in enumerate(people):
+            user = User.objects.create_user(
+                username=f"{first_name.lower()}{index}@example.com",
+                email=f"{first_name.lower()}{index}@example.com",
+                phone_number=f"080{index:08}",
+                first_name=first_name,
+                last_name=last_name,
+            )
+            Patient.objects.create(user=user, nationality=nationality)
+
+    def search(self, url_name, query):
+        response = self.client.get(reverse(url_name), {"search": query})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data["data"]["results"]
+
+    def test_user_search_ranks_exact_matches_first(self):
+        names = [user["full_name"] for user in self.search("api-user-list", "ada")]
+        self.assertEqual(set(names[:2]), {"Ada Okafor", "Tunde Ada"})
+        self.assertEqual(names[2:], ["Adaeze Bello"])
+
+    def test_every_term_has_to_match(self):
+        results = self.search("api-user-list", "ada okafor")
+        self.assertEqual([user["full_name"] for user in results], ["Ada Okafor"])
+
+    def test_patient_search_covers_nationality_and_contact_fields(self):
+        results = self.search("api-patient-list", "nigerian")
+        self.assertEqual(
+            {patient["user"]["full_name"] for patient in results},
+            {"Ada Okafor", "Tunde Ada"},
+        )
+        results = self.search("api-patient-list", "08000000003")
+        self.assertEqual([patient["user"]["full_name"] for patient in results], ["Grace Hopper"])
+
+    def test_cursor_pages_keep_ranking_and_reject_bad_cursors(self):
+        params = {"search": "ada", "pagination": "cursor", "limit": 2}
+        first = self.client.get(reverse("api-user-list"), params).data["data"]
+        second = self.client.get(
+            reverse("api-user-list"), dict(params, cursor=first["next"])
+        ).data["data"]
+        names = [user["full_name"] for user in first["results"] + second["results"]]
+        self.assertEqual(set(names[:2]), {"Ada Okafor", "Tunde Ada"})
+        self.assertEqual(names[2:], ["Adaeze Bello"])
+
+        response = self.client.get(reverse("api-patient-list"), {"cursor": "not-a-cursor"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["message"], "Invalid cursor")
+
+    def test_index_command_only_runs_on_postgresql(self):
+        call_command("create_search_indexes")
+        sql = trigram_index_sql(connection, *TRIGRAM_INDEXED_FIELDS[0])
+        self.assertIn("USING gin (UPPER(", sql)
+        self.assertIn("gin_trgm_ops", sql)
@@ -0,0 +1,120 @@
+import io
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from apps.users.models import DocumentBlob, Practitioner, User
+from apps.utils.storage import get_document_storage
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class DocumentStorageTests(TestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def create_practitioner(self, index):
+        user = User.objects.create_user(
+            username=f"doctor{index}", phone_number=f"080{index:08}"
+        )
+        return Practitioner.objects.create(user=user)
+
+    def upload(self, practitioner, content, name="certificate.PDF"):
+        practitioner.certificate = ContentFile(content, name=name)
+        practitioner.save()
+        return practitioner.certificate.name
+
+    def blob_files(self):
+        root = get_document_storage().path(get_document_storage().prefix)
+        return [
+            os.path.relpath(os.path.join(directory, filename), root)
+            for directory, _, files in os.walk(root)
+            for filename in files
+        ]
+
+    def test_duplicate_uploads_share_one_sharded_blob(self):
+        first = self.upload(self.create_practitioner(1), b"same scan")
+        second = self.upload(self.create_practitioner(2), b"same scan")
+
+        self.assertEqual(first, second)
+        digest = first.rsplit("/", 1)[1].split(".")[0]
+        self.assertEqual(first, f"documents/blobs/{digest[:2]}/{digest[2:4]}/{digest}.pdf")
+        self.assertEqual(len(self.blob_files()), 1)
+        self.assertEqual(DocumentBlob.objects.get(name=first).ref_count, 2)
+
+    def test_names_shaped_like_renditions_are_still_content_addressed(self):
+        first = self.upload(self.create_practitioner(1), b"first scan", "scan.list.webp")
+        second = self.upload(self.create_practitioner(2), b"second scan", "scan.list.webp")
+
+        self.assertNotEqual(first, second)
+        self.assertTrue(get_document_storage().is_blob(first))
+        self.assertEqual(DocumentBlob.objects.get(name=first).ref_count, 1)
+        with get_document_storage().open(first) as file:
+            self.assertEqual(file.read(), b"first scan")
+
+    def test_renditions_are_only_written_next_to_blobs(self):
+        storage = get_document_storage()
+        blob = self.upload(self.create_practitioner(1), b"scan")
+        self.assertEqual(
+            storage.save_rendition(f"{blob}.list.webp", ContentFile(b"thumb")),
+            f"{blob}.list.webp",
+        )
+        for name in ("documents/certificates/scan.list.webp", f"{blob}.list.png"):
+            with self.subTest(name), self.assertRaises(SuspiciousFileOperation):
+                storage.save_rendition(name, ContentFile(b"thumb"))
+
+    def test_replacing_and_deleting_release_references(self):
+        practitioner = self.create_practitioner(1)
+        old = self.upload(practitioner, b"old scan")
+        new = self.upload(practitioner, b"new scan")
+        self.assertEqual(DocumentBlob.objects.get(name=old).ref_count, 0)
+        self.assertEqual(DocumentBlob.objects.get(name=new).ref_count, 1)
+
+        Practitioner.objects.get(pk=practitioner.pk).delete()
+        self.assertEqual(DocumentBlob.objects.get(name=new).ref_count, 0)
+
+    def test_gc_removes_unreferenced_blobs_only(self):
+        practitioner = self.create_practitioner(1)
+        old = self.upload(practitioner, b"old scan")
+        kept = self.upload(practitioner, b"kept scan")
+
+        call_command("gc_document_blobs", stdout=io.StringIO())
+        self.assertTrue(get_document_storage().exists(old))
+
+        call_command("gc_document_blobs", "--grace-minutes", "0", stdout=io.StringIO())
+        self.assertFalse(get_document_storage().exists(old))
+        self.assertTrue(get_document_storage().exists(kept))
+        self.assertEqual(list(DocumentBlob.objects.values_list("name", flat=True)), [kept])
+
+    def test_reuploading_an_old_unreferenced_blob_restarts_its_grace_period(self):
+        practitioner = self.create_practitioner(1)
+        old = self.upload(practitioner, b"old scan")
+        self.upload(practitioner, b"new scan")
+        DocumentBlob.objects.filter(name=old).update(
+            updated_at=timezone.now() - timedelta(days=1)
+        )
+
+        # Stored again, but the record pointing at it is not saved yet
+        storage = get_document_storage()
+        self.assertEqual(storage.save("certificate.pdf", ContentFile(b"old scan")), old)
+
+        call_command("gc_document_blobs", stdout=io.StringIO())
+        self.assertTrue(storage.exists(old))
+        self.assertTrue(DocumentBlob.objects.filter(name=old).exists())
+
+    def test_recount_rebuilds_reference_counts(self):
+        name = self.upload(self.create_practitioner(1), b"scan")
+        DocumentBlob.objects.update(ref_count=5)
+
+        call_command("gc_document_blobs", "--recount", stdout=io.StringIO())
+        self.assertEqual(DocumentBlob.objects.get(name=name).ref_count, 1)
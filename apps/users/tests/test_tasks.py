@@ -0,0 +1,150 @@
+from datetime import timedelta
+from smtplib import SMTPServerDisconnected
+from unittest import mock
+
+from django.core import mail
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+
+from apps.users.models import AuthToken, EmailOutbox, User
+from apps.users.tasks import (
+    EMAIL_CIRCUIT_CACHE_KEY,
+    EMAIL_CIRCUIT_FAILURE_THRESHOLD,
+    send_queued_emails,
+    sweep_auth_tokens,
+)
+from apps.utils.enums import AuthTokenEnum, AuthTokenStatusEnum, EmailStatusEnum
+
+
+# Tasks run eagerly under the local settings (CELERY_TASK_ALWAYS_EAGER)
+@override_settings(EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend")
+class EmailOutboxTests(TestCase):
+    def setUp(self):
+        cache.delete(EMAIL_CIRCUIT_CACHE_KEY)
+        self.user = User.objects.create_user(
+            first_name="Uncle",
+            last_name="Rukus",
+            phone_number="1234567890",
+            email="sistermagret007@gmail.com",
+            username="sistermagret007@gmail.com",
+            password="password123",
+            is_accept_terms_and_condition=True,
+        )
+
+    def queue(self, count):
+        for index in range(count):
+            self.user.queue_email(subject=f"Subject {index}", message="Hello")
+
+    def test_login_only_queues_the_notification(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.post(
+                reverse("api-auth-login"),
+                {"username": "sistermagret007@gmail.com", "password": "password123"},
+                content_type="application/json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(mail.outbox), 0)
+        email = EmailOutbox.objects.get()
+        self.assertEqual(email.status, EmailStatusEnum.PENDING)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertEqual(mail.outbox[0].subject, "login notification")
+        email.refresh_from_db()
+        self.assertEqual(email.status, EmailStatusEnum.SENT)
+
+    def test_users_without_email_are_skipped(self):
+        self.user.email = None
+        self.user.save()
+        self.assertIsNone(self.user.queue_email(subject="Subject", message="Hello"))
+        self.assertFalse(EmailOutbox.objects.exists())
+
+    def test_batch_reuses_one_connection(self):
+        self.queue(5)
+        with mock.patch(
+            "apps.users.tasks.get_connection", wraps=mail.get_connection
+        ) as get_connection:
+            self.assertEqual(send_queued_emails(), 5)
+        get_connection.assert_called_once()
+        self.assertEqual(len(mail.outbox), 5)
+
+    def test_failures_are_retried_and_open_the_circuit(self):
+        self.queue(EMAIL_CIRCUIT_FAILURE_THRESHOLD + 2)
+        with mock.patch(
+            "apps.users.tasks.EmailMessage.send",
+            side_effect=SMTPServerDisconnected("down"),
+        ):
+            self.assertEqual(send_queued_emails(), 0)
+
+        self.assertTrue(cache.get(EMAIL_CIRCUIT_CACHE_KEY))
+        failed = EmailOutbox.objects.filter(attempts=1)
+        self.assertEqual(failed.count(), EMAIL_CIRCUIT_FAILURE_THRESHOLD)
+        self.assertFalse(EmailOutbox.objects.exclude(status=EmailStatusEnum.PENDING).exists())
+        self.assertTrue(all(email.next_attempt_at > email.created_at for email in failed))
+
+        # While the circuit is open nothing is attempted
+        self.assertEqual(send_queued_emails(), 0)
+        self.assertEqual(EmailOutbox.objects.filter(attempts=0).count(), 2)
+
+
+class AuthTokenSweeperTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            first_name="Uncle",
+            last_name="Rukus",
+            phone_number="1234567890",
+            email="sistermagret007@gmail.com",
+            username="sistermagret007@gmail.com",
+            password="password123",
+            is_accept_terms_and_condition=True,
+        )
+
+    def create_token(self, token, **kwargs):
+        kwargs.setdefault("type", AuthTokenEnum.VERIFICATION)
+        return AuthToken.objects.create(user=self.user, token=token, **kwargs)
+
+    def test_deletes_expired_and_used_tokens_in_batches(self):
+        past = timezone.now() - timedelta(minutes=1)
+        for index in range(5):
+            self.create_token(f"{index:04}", expiry=past)
+        self.create_token("0100", status=AuthTokenStatusEnum.USED)
+        live = self.create_token("0200", expiry=timezone.now() + timedelta(minutes=20))
+        unexpiring = self.create_token("0300")
+
+        with self.assertNumQueries(7):
+            self.assertEqual(sweep_auth_tokens(batch_size=2), 6)
+        self.assertQuerySetEqual(
+            AuthToken.objects.order_by("token"), [live, unexpiring]
+        )
+
+    def test_max_batches_bounds_a_run(self):
+        past = timezone.now() - timedelta(minutes=1)
+        for index in range(5):
+            self.create_token(f"{index:04}", expiry=past)
+
+        self.assertEqual(sweep_auth_tokens(batch_size=2, max_batches=1), 2)
+        self.assertEqual(AuthToken.objects.count(), 3)
+
+    def test_verification_looks_the_token_up_once(self):
+        token = self.create_token(
+            "4321", expiry=timezone.now() + timedelta(minutes=20)
+        )
+        url = reverse("api-auth-verify-token", kwargs={"token": token.token})
+        with self.captureOnCommitCallbacks():
+            response = self.client.post(
+                url, {"action": "verification"}, content_type="application/json"
+            )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.is_verified)
+        self.assertFalse(AuthToken.objects.filter(pk=token.pk).exists())
+
+        response = self.client.post(
+            url, {"action": "verification"}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
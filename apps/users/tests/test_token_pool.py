@@ -0,0 +1,34 @@
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from apps.users.models import AuthToken
+from apps.users.token_pool import TokenPoolExhausted, issue_token
+from apps.utils.enums import AuthTokenEnum, AuthTokenStatusEnum
+
+
+class TokenPoolTests(TestCase):
+    def fill(self, codes, token_type=AuthTokenEnum.VERIFICATION, **kwargs):
+        AuthToken.objects.bulk_create(
+            [AuthToken(type=token_type, token=code, **kwargs) for code in codes]
+        )
+
+    def test_issued_code_is_unique_among_live_tokens(self):
+        codes = [str(number).zfill(4) for number in range(10000)]
+        self.fill(codes[:-1])
+        self.assertEqual(issue_token(AuthTokenEnum.VERIFICATION), codes[-1])
+
+    def test_codes_of_dead_tokens_and_other_types_are_reused(self):
+        codes = [str(number).zfill(4) for number in range(10000)]
+        self.fill(codes[:5000], token_type=AuthTokenEnum.RESET_TOKEN)
+        self.fill(codes[5000:7000], expiry=timezone.now() - timedelta(minutes=1))
+        self.fill(codes[7000:], status=AuthTokenStatusEnum.USED)
+        code = issue_token(AuthTokenEnum.VERIFICATION)
+        self.assertEqual(len(code), 4)
+        self.assertTrue(code.isdigit())
+
+    def test_exhausted_code_space(self):
+        self.fill([str(number).zfill(4) for number in range(10000)])
+        with self.assertRaises(TokenPoolExhausted):
+            issue_token(AuthTokenEnum.VERIFICATION)
@@ -0,0 +1,151 @@
+import hashlib
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.contrib.auth.models import Group
+from django.test import override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.users.models import DocumentBlob, DocumentUpload, Practitioner, User
+from apps.users.tasks import expire_document_uploads
+from apps.users.uploads import finish_upload, part_path
+from apps.utils.enums import UserGroup, ValidIDType
+
+MEDIA_ROOT = tempfile.mkdtemp()
+SCAN = b"%PDF-1.7\n" + os.urandom(3000)
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ResumableUploadTests(APITestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        user = User.objects.create_user(username="doctor", phone_number="08000000001")
+        user.groups.add(Group.objects.get_or_create(name=UserGroup.PRACTITIONER)[0])
+        self.practitioner = Practitioner.objects.create(user=user)
+        self.client.force_authenticate(user)
+
+    def start(self, content=SCAN, **kwargs):
+        payload = {
+            "field": "certificate",
+            "file_name": "certificate.pdf",
+            "content_type": "application/pdf",
+            "size": len(content),
+            "checksum": hashlib.sha256(content).hexdigest(),
+        }
+        payload.update(kwargs)
+        return self.client.post(
+            reverse("api-practitioner-start-document-upload"), payload, format="json"
+        )
+
+    def upload_url(self, upload_id, finalize=False):
+        name = "finalize-document-upload" if finalize else "document-upload"
+        return reverse(f"api-practitioner-{name}", kwargs={"upload_id": upload_id})
+
+    def put_chunk(self, upload_id, chunk, offset, **headers):
+        return self.client.generic(
+            "PUT",
+            self.upload_url(upload_id),
+            chunk,
+            content_type="application/octet-stream",
+            HTTP_UPLOAD_OFFSET=str(offset),
+            **headers,
+        )
+
+    def test_chunks_resume_and_finalize_onto_practitioner(self):
+        upload_id = self.start().data["data"]["id"]
+
+        self.assertEqual(self.put_chunk(upload_id, SCAN[:1000], 0).data["data"]["offset"], 1000)
+        # A retried chunk at a stale offset is told where to resume
+        response = self.put_chunk(upload_id, SCAN[:1000], 0)
+        self.assertEqual(response.status_code, status.HTTP_409_CONFLICT)
+        self.assertEqual(response.data["data"]["offset"], 1000)
+        self.assertEqual(
+            self.client.post(self.upload_url(upload_id, finalize=True)).status_code,
+            status.HTTP_409_CONFLICT,
+        )
+        self.assertEqual(self.client.get(self.upload_url(upload_id)).data["data"]["offset"], 1000)
+
+        self.put_chunk(upload_id, SCAN[1000:], 1000)
+        response = self.client.post(self.upload_url(upload_id, finalize=True))
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.practitioner.refresh_from_db()
+        self.assertEqual(self.practitioner.certificate.read(), SCAN)
+        self.assertEqual(
+            DocumentBlob.objects.get(name=self.practitioner.certificate.name).ref_count, 1
+        )
+        self.assertFalse(DocumentUpload.objects.exists())
+
+    def test_concurrent_finalize_attaches_the_file_once(self):
+        upload_id = self.start().data["data"]["id"]
+        self.put_chunk(upload_id, SCAN, 0)
+        # Both callers loaded the upload before either finalized it
+        first, second = DocumentUpload.objects.get(pk=upload_id), DocumentUpload.objects.get(pk=upload_id)
+
+        self.assertEqual(finish_upload(first).pk, self.practitioner.pk)
+        self.assertIsNone(finish_upload(second))
+
+        self.practitioner.refresh_from_db()
+        self.assertEqual(
+            DocumentBlob.objects.get(name=self.practitioner.certificate.name).ref_count, 1
+        )
+        response = self.client.post(self.upload_url(upload_id, finalize=True))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_corrupt_chunk_is_discarded(self):
+        upload_id = self.start().data["data"]["id"]
+
+        response = self.put_chunk(
+            upload_id, SCAN[:1000], 0, HTTP_UPLOAD_CHECKSUM="0" * 64
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        upload = DocumentUpload.objects.get(pk=upload_id)
+        self.assertEqual(upload.offset, 0)
+        self.assertEqual(os.path.getsize(part_path(upload)), 0)
+
+    def test_checksum_mismatch_rejects_the_file(self):
+        upload_id = self.start(checksum="a" * 64).data["data"]["id"]
+        self.put_chunk(upload_id, SCAN, 0)
+
+        response = self.client.post(self.upload_url(upload_id, finalize=True))
+
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.practitioner.refresh_from_db()
+        self.assertFalse(self.practitioner.certificate)
+        self.assertFalse(DocumentUpload.objects.exists())
+
+    def test_upload_rules_apply_when_starting(self):
+        response = self.start(file_name="certificate.exe", content_type="application/x-msdownload")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.start(field="means_of_identification")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("means_of_identification_type", response.data["errors"])
+
+        response = self.start(
+            field="means_of_identification",
+            means_of_identification_type=ValidIDType.PASSPORT,
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_abandoned_uploads_expire(self):
+        upload_id = self.start().data["data"]["id"]
+        self.put_chunk(upload_id, SCAN[:1000], 0)
+        upload = DocumentUpload.objects.get(pk=upload_id)
+        path = part_path(upload)
+        DocumentUpload.objects.update(expires_at=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(self.client.get(self.upload_url(upload_id)).status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(expire_document_uploads(), 1)
+        self.assertFalse(DocumentUpload.objects.exists())
+        self.assertFalse(os.path.exists(path))
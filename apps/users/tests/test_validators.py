@@ -0,0 +1,119 @@
+import io
+import shutil
+import tempfile
+
+from django.contrib.auth.models import Group
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.files.uploadhandler import StopUpload
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from apps.users.models import Practitioner, User
+from apps.utils.enums import UserGroup
+from apps.utils.validators import (
+    SNIFF_SIZE,
+    ValidatingUploadHandler,
+    validate_file,
+    validate_image,
+)
+
+MEDIA_ROOT = tempfile.mkdtemp()
+PDF = b"%PDF-1.7\n" + b"0" * 4000
+
+
+def png_bytes():
+    buffer = io.BytesIO()
+    Image.new("RGB", (4, 4), "red").save(buffer, "PNG")
+    return buffer.getvalue()
+
+
+class ValidateFileTests(SimpleTestCase):
+    def test_content_is_sniffed_instead_of_trusting_headers(self):
+        upload = SimpleUploadedFile("scan.pdf", PDF, content_type="image/png")
+        validate_file(upload)
+        self.assertEqual(upload.content_type, "application/pdf")
+        self.assertEqual(upload.tell(), 0)
+
+        validate_file(SimpleUploadedFile("photo.png", png_bytes()))
+
+    def test_spoofed_unknown_and_oversized_files_are_rejected(self):
+        for upload in (
+            SimpleUploadedFile("photo.png", PDF, content_type="image/png"),
+            SimpleUploadedFile("script.pdf", b"#!/bin/sh\n", content_type="application/pdf"),
+            SimpleUploadedFile("scan.exe", PDF),
+        ):
+            with self.subTest(upload.name), self.assertRaises(ValidationError):
+                validate_file(upload)
+
+        with override_settings(MAX_FILE_SIZE=1024), self.assertRaises(ValidationError):
+            validate_file(SimpleUploadedFile("scan.pdf", PDF))
+
+    def test_images_only_where_images_are_expected(self):
+        with self.assertRaises(ValidationError):
+            validate_image(SimpleUploadedFile("scan.pdf", PDF))
+
+    def test_handler_stops_at_the_first_bad_chunk(self):
+        request = RequestFactory().post("/")
+        handler = ValidatingUploadHandler(request, ["certificate"])
+        handler.new_file("certificate", "photo.png", "image/png", None)
+
+        with self.assertRaises(StopUpload) as stopped:
+            handler.receive_data_chunk(PDF[:SNIFF_SIZE], 0)
+
+        self.assertTrue(stopped.exception.connection_reset)
+        self.assertIn("certificate", request.upload_errors)
+
+    def test_handler_leaves_other_fields_alone(self):
+        handler = ValidatingUploadHandler(RequestFactory().post("/"), ["certificate"])
+        handler.new_file("file", "patients.csv", "text/csv", None)
+        self.assertEqual(handler.receive_data_chunk(b"first_name\n", 0), b"first_name\n")
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class UploadEndpointValidationTests(APITestCase):
+    @classmethod
+    def tearDownClass(cls):
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="doctor", phone_number="08000000001")
+        self.user.groups.add(Group.objects.get_or_create(name=UserGroup.PRACTITIONER)[0])
+        self.practitioner = Practitioner.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def upload(self, **files):
+        return self.client.put(
+            reverse("api-practitioner-upload", kwargs={"pk": self.practitioner.pk}),
+            files,
+            format="multipart",
+        )
+
+    def test_practitioner_documents_are_validated(self):
+        response = self.upload(certificate=SimpleUploadedFile("certificate.png", PDF))
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("certificate", response.data["errors"])
+
+        response = self.upload(certificate=SimpleUploadedFile("certificate.pdf", PDF))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.practitioner.refresh_from_db()
+        self.assertTrue(self.practitioner.certificate.name.endswith(".pdf"))
+
+    def test_avatar_must_be_an_image(self):
+        url = reverse("api-user-detail", kwargs={"pk": self.user.pk})
+
+        response = self.client.put(
+            url, {"avatar": SimpleUploadedFile("avatar.png", PDF)}, format="multipart"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+        response = self.client.put(
+            url, {"avatar": SimpleUploadedFile("avatar.png", png_bytes())}, format="multipart"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.avatar.name.startswith("profile/"))
@@ -1,9 +1,32 @@
+import io
+
+from django.contrib.auth.models import Group
+from django.core.management import call_command
+from django.db import connection, models
+from django.test import TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 from django.contrib.auth import get_user_model
 
-from apps.users.models import AuthToken
+from apps.users.models import (
+    Address,
+    Allergy,
+    AuthToken,
+    EmergencyContact,
+    Medication,
+    Patient,
+    Practitioner,
+    PractitionerSpecialization,
+)
+from apps.utils.enums import UserGroup
+
+# Queries allowed for a page of the patient or practitioner list, whatever its size
+LIST_QUERY_BUDGET = 5
+PAGE_SIZE = 50
+# Queries allowed for replacing a patient's medications, however many are sent
+RELATED_UPSERT_QUERY_BUDGET = 7
 
 User = get_user_model()
 
@@ -84,3 +107,213 @@ class AuthViewSetTests(APITestCase):
 
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertIn("message", response.data)
+
+    def test_forget_password_token_expires(self):
+        response = self.client.post(
+            reverse("api-auth-forget-password"),
+            {"username": "sistermagret007@gmail.com"},
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        token = AuthToken.objects.get(user=self.user, type=0)
+        self.assertIsNotNone(token.expiry)
+        self.assertFalse(AuthToken.expired_or_used().filter(pk=token.pk).exists())
+
+
+class UserViewSetTests(APITestCase):
+    def create_users(self, count, start=0):
+        group = Group.objects.get_or_create(name=UserGroup.USER)[0]
+        for index in range(start, start + count):
+            user = User.objects.create_user(
+                username=f"user{index}@example.com",
+                email=f"user{index}@example.com",
+                phone_number=f"080{index:08}",
+                password="password123",
+            )
+            user.groups.add(group)
+
+    def list_users(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse("api-user-list"))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response, len(queries)
+
+    def test_list_query_count_does_not_grow_with_page_size(self):
+        self.create_users(2)
+        response, small_page_queries = self.list_users()
+        self.assertEqual(len(response.data["data"]["results"]), 2)
+
+        self.create_users(20, start=2)
+        response, large_page_queries = self.list_users()
+        self.assertEqual(len(response.data["data"]["results"]), 22)
+        self.assertEqual(large_page_queries, small_page_queries)
+        self.assertEqual(response.data["data"]["results"][0]["group"], UserGroup.USER)
+
+
+class ProfileListQueryBudgetTests(APITestCase):
+    def create_user(self, index, group):
+        user = User.objects.create_user(
+            username=f"user{index}@example.com",
+            email=f"user{index}@example.com",
+            phone_number=f"080{index:08}",
+            address=Address.objects.create(address=f"{index} Test Ave"),
+        )
+        user.groups.add(group)
+        return user
+
+    def assert_within_budget(self, url_name):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse(url_name), {"limit": PAGE_SIZE})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["data"]["results"]), PAGE_SIZE)
+        self.assertLessEqual(
+            len(queries),
+            LIST_QUERY_BUDGET,
+            "\n".join(query["sql"] for query in queries),
+        )
+        return response.data["data"]["results"]
+
+    def test_patient_list_stays_within_query_budget(self):
+        group = Group.objects.get_or_create(name=UserGroup.USER)[0]
+        allergies = [Allergy.objects.create(name=f"Allergy {i}") for i in range(2)]
+        medications = [Medication.objects.create(name=f"Medication {i}") for i in range(2)]
+        for index in range(PAGE_SIZE):
+            patient = Patient.objects.create(
+                user=self.create_user(index, group),
+                emergency_contact=EmergencyContact.objects.create(
+                    name=f"Contact {index}", phone_number=f"090{index:08}"
+                ),
+            )
+            patient.allergies.set(allergies)
+            patient.medications.set(medications)
+
+        results = self.assert_within_budget("api-patient-list")
+        self.assertEqual(len(results[0]["allergies"]), 2)
+        self.assertEqual(len(results[0]["medications"]), 2)
+        self.assertEqual(results[0]["user"]["group"], UserGroup.USER)
+        self.assertIsNotNone(results[0]["user"]["address"])
+        self.assertIsNotNone(results[0]["emergency_contact"])
+
+    def test_practitioner_list_stays_within_query_budget(self):
+        group = Group.objects.get_or_create(name=UserGroup.PRACTITIONER)[0]
+        specializations = [
+            PractitionerSpecialization.objects.create(name=f"Specialization {i}")
+            for i in range(2)
+        ]
+        for index in range(PAGE_SIZE):
+            practitioner = Practitioner.objects.create(
+                user=self.create_user(index, group), license_number=f"LIC{index}"
+            )
+            practitioner.specializations.set(specializations)
+
+        results = self.assert_within_budget("api-practitioner-list")
+        self.assertEqual(len(results[0]["specializations"]), 2)
+        self.assertEqual(results[0]["user"]["group"], UserGroup.PRACTITIONER)
+
+
+class RelatedListUpsertTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="patient", phone_number="08000000001")
+        self.user.groups.add(Group.objects.get_or_create(name=UserGroup.USER)[0])
+        self.patient = Patient.objects.create(user=self.user)
+        self.client.force_authenticate(self.user)
+
+    def post_medications(self, names):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                reverse("api-patient-medication"),
+                [{"name": name} for name in names],
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        return len(queries)
+
+    def test_medication_list_is_replaced_in_constant_queries(self):
+        kept, dropped = Medication.objects.create(name="Kept"), Medication.objects.create(name="Dropped")
+        self.patient.medications.set([kept, dropped])
+
+        small_queries = self.post_medications(["Kept", "New 0", "New 1"])
+        names = ["Kept"] + [f"New {index}" for index in range(29)]
+        large_queries = self.post_medications(names)
+
+        self.assertLessEqual(small_queries, RELATED_UPSERT_QUERY_BUDGET)
+        self.assertLessEqual(large_queries, RELATED_UPSERT_QUERY_BUDGET)
+        self.assertEqual(
+            set(self.patient.medications.values_list("name", flat=True)), set(names)
+        )
+        self.assertEqual(Medication.objects.filter(name="Kept").count(), 1)
+        self.assertTrue(Medication.objects.filter(name="Dropped").exists())
+
+    def test_existing_allergy_descriptions_are_kept(self):
+        Allergy.objects.create(name="Peanuts", description="Legume allergy")
+
+        response = self.client.post(
+            reverse("api-patient-allergy"),
+            [{"name": "Peanuts", "description": "Mine"}, {"name": "Dust"}],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(Allergy.objects.get(name="Peanuts").description, "Legume allergy")
+        self.assertEqual(
+            set(self.patient.allergies.values_list("name", flat=True)), {"Peanuts", "Dust"}
+        )
+
+    def test_practitioner_specializations_are_replaced(self):
+        user = User.objects.create_user(username="doctor", phone_number="08000000002")
+        user.groups.add(Group.objects.get_or_create(name=UserGroup.PRACTITIONER)[0])
+        practitioner = Practitioner.objects.create(user=user)
+        practitioner.specializations.add(PractitionerSpecialization.objects.create(name="Old"))
+        self.client.force_authenticate(user)
+
+        response = self.client.post(
+            reverse("api-practitioner-specialization"),
+            [{"name": "Cardiology"}, {"name": "Cardiology"}, {"name": "Oncology"}],
+            format="json",
+        )
+
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            set(practitioner.specializations.values_list("name", flat=True)),
+            {"Cardiology", "Oncology"},
+        )
+
+
+class MergeDuplicateMedicationsTests(TransactionTestCase):
+    """Databases from before Medication.name was unique may hold duplicate names."""
+
+    def setUp(self):
+        self.unique_name = Medication._meta.get_field("name")
+        self.plain_name = models.CharField(max_length=255)
+        self.plain_name.set_attributes_from_name("name")
+        self.plain_name.model = Medication
+        with connection.schema_editor() as editor:
+            editor.alter_field(Medication, self.unique_name, self.plain_name)
+
+    def tearDown(self):
+        with connection.schema_editor() as editor:
+            editor.alter_field(Medication, self.plain_name, self.unique_name)
+
+    def test_duplicates_are_merged_into_one_row(self):
+        aspirins = [Medication.objects.create(name="Aspirin") for _ in range(3)]
+        ibuprofen = Medication.objects.create(name="Ibuprofen")
+        patients = [
+            Patient.objects.create(
+                user=User.objects.create_user(username=f"patient{index}", phone_number=f"0800000001{index}")
+            )
+            for index in range(3)
+        ]
+        patients[0].medications.set([aspirins[0], aspirins[1], ibuprofen])
+        patients[1].medications.set([aspirins[2]])
+        patients[2].medications.set(aspirins[1:])
+
+        call_command("merge_duplicate_medications", stdout=io.StringIO())
+
+        kept = min(aspirin.pk for aspirin in aspirins)
+        self.assertEqual(list(Medication.objects.filter(name="Aspirin").values_list("pk", flat=True)), [kept])
+        self.assertEqual(
+            set(patients[0].medications.values_list("pk", flat=True)), {kept, ibuprofen.pk}
+        )
+        self.assertEqual(list(patients[1].medications.values_list("pk", flat=True)), [kept])
+        self.assertEqual(list(patients[2].medications.values_list("pk", flat=True)), [kept])
@@ -0,0 +1,130 @@
+"""
+Issuance of short numeric one-time codes for AuthToken.
+
+A code only has to be unique among the live (pending, unexpired) tokens of its
+type. With Redis available, each type keeps a pre-shuffled list of free codes and
+issuing one is a single LPOP; the list is rebuilt from the live tokens when it runs
+dry. Without Redis a batch of ``secrets`` candidates is checked against the live
+tokens in one query. Neither path recurses or issues a query per draw.
+"""
+import logging
+import secrets
+
+from django.conf import settings
+
+from apps.users.models import AuthToken
+
+logger = logging.getLogger("user")
+
+TOKEN_LENGTH = 4
+TOKEN_POOL_KEY = "users:token_pool:{}:{}"
+TOKEN_POOL_LOCK_TIMEOUT = 30
+# Random candidates checked per query before enumerating the free codes
+TOKEN_RANDOM_DRAWS = 16
+# Popped codes re-checked against live tokens before falling back to the database
+TOKEN_POOL_POPS = 3
+
+
+class TokenPoolExhausted(Exception):
+    pass
+
+
+def live_codes(token_type):
+    """Codes held by pending, unexpired tokens of the given type."""
+    return set(AuthToken.live(token_type).values_list("token", flat=True))
+
+
+def free_codes(token_type, length=TOKEN_LENGTH):
+    """Every code of ``length`` digits not held by a live token, in random order."""
+    taken = live_codes(token_type)
+    codes = [
+        code
+        for code in (str(number).zfill(length) for number in range(10**length))
+        if code not in taken
+    ]
+    secrets.SystemRandom().shuffle(codes)
+    return codes
+
+
+def get_redis():
+    """The Redis client behind the default cache, or None when the cache is not Redis."""
+    if not settings.CACHES["default"]["BACKEND"].startswith("django_redis"):
+        return None
+    from django_redis import get_redis_connection
+
+    return get_redis_connection("default")
+
+
+def issue_from_database(token_type, length=TOKEN_LENGTH):
+    """
+    Draw a batch of random candidates and keep the first one no live token holds,
+    checked with a single indexed query. Only a nearly exhausted code space falls
+    back to reading every live code.
+    """
+    candidates = list(
+        dict.fromkeys(
+            str(secrets.randbelow(10**length)).zfill(length)
+            for _ in range(TOKEN_RANDOM_DRAWS)
+        )
+    )
+    taken = set(
+        AuthToken.live(token_type)
+        .filter(token__in=candidates)
+        .values_list("token", flat=True)
+    )
+    for code in candidates:
+        if code not in taken:
+            return code
+
+    codes = free_codes(token_type, length)
+    if not codes:
+        raise TokenPoolExhausted(f"No free {length}-digit codes left for token type {token_type}")
+    return codes[0]
+
+
+def refill_pool(redis, token_type, length=TOKEN_LENGTH):
+    """Rebuild the free-code list of a type; only one worker refills at a time."""
+    key = TOKEN_POOL_KEY.format(token_type, length)
+    if not redis.set(f"{key}:lock", 1, nx=True, ex=TOKEN_POOL_LOCK_TIMEOUT):
+        return False
+    try:
+        codes = free_codes(token_type, length)
+        pipeline = redis.pipeline()
+        pipeline.delete(key)
+        if codes:
+            pipeline.rpush(key, *codes)
+        pipeline.execute()
+    finally:
+        redis.delete(f"{key}:lock")
+    return True
+
+
+def is_live(token_type, code):
+    return AuthToken.live(token_type).filter(token=code).exists()
+
+
+def issue_token(token_type, length=TOKEN_LENGTH):
+    """Return a numeric code not held by any live token of ``token_type``."""
+    try:
+        redis = get_redis()
+    except Exception as e:
+        logger.error(f"Token pool: Redis unavailable, using database fallback: {e}")
+        redis = None
+    if redis is None:
+        return issue_from_database(token_type, length)
+
+    key = TOKEN_POOL_KEY.format(token_type, length)
+    try:
+        for _ in range(TOKEN_POOL_POPS):
+            code = redis.lpop(key)
+            if code is None:
+                if not refill_pool(redis, token_type, length):
+                    break
+                continue
+            code = code.decode() if isinstance(code, bytes) else code
+            # A list built before a concurrent issue may still hold its code
+            if not is_live(token_type, code):
+                return code
+    except Exception as e:
+        logger.error(f"Token pool: Redis error, using database fallback: {e}")
+    return issue_from_database(token_type, length)
@@ -0,0 +1,191 @@
+"""
+Resumable chunked uploads of practitioner documents.
+
+A client starts an upload with the file's name, type, size and SHA-256, then
+PUTs the bytes in chunks, each with the offset it starts at. Chunks are streamed
+from the request straight onto a part file, so neither a chunk nor the file is
+ever held in memory. After a dropped connection the client asks for the current
+offset and resumes from there; a partly written chunk is truncated away. Once
+every byte has arrived, finalizing verifies the checksum, runs ``validate_file``
+and saves the file onto the practitioner through the document storage. The
+extension and size are checked when the upload starts and the content is
+sniffed from the first chunk, so a spoofed file is refused before the rest is
+sent.
+"""
+import hashlib
+import logging
+import os
+from datetime import timedelta
+
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.db import transaction
+from django.utils import timezone
+
+from apps.users.models import DocumentUpload
+from apps.utils.storage import get_document_storage
+from apps.utils.validators import FileValidator, validate_file
+
+logger = logging.getLogger("user")
+
+UPLOAD_PART_DIRECTORY = "documents/uploads"
+UPLOAD_READ_SIZE = 64 * 1024
+# Every chunk received extends the session by this long
+UPLOAD_SESSION_LIFETIME = timedelta(hours=24)
+
+
+class UploadOffsetMismatch(Exception):
+    """The chunk does not start where the upload currently ends."""
+
+    def __init__(self, offset):
+        self.offset = offset
+        super().__init__(f"Upload is at offset {offset}.")
+
+
+def part_path(upload):
+    return get_document_storage().path(f"{UPLOAD_PART_DIRECTORY}/{upload.pk}.part")
+
+
+def file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as part:
+        for block in iter(lambda: part.read(UPLOAD_READ_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def start_upload(practitioner, data):
+    """Validate the announced file and open a session with an empty part file."""
+    FileValidator(data["file_name"]).check_size(data["size"])
+    upload = DocumentUpload.objects.create(
+        practitioner=practitioner,
+        expires_at=timezone.now() + UPLOAD_SESSION_LIFETIME,
+        **data,
+    )
+    path = part_path(upload)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    open(path, "wb").close()
+    return upload
+
+
+def append_chunk(upload, stream, offset, length, checksum=None):
+    """
+    Append ``length`` bytes read from ``stream`` at ``offset``. ``checksum`` is
+    an optional hex SHA-256 of the chunk; a chunk that fails it, or arrives
+    short, is cut off again so the client can resend it.
+    """
+    path = part_path(upload)
+    if not os.path.exists(path):
+        # The part file is gone, e.g. with a wiped volume; the upload starts over
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        open(path, "wb").close()
+        DocumentUpload.objects.filter(pk=upload.pk).update(offset=0)
+
+    with transaction.atomic():
+        # Concurrent writers to one upload are refused rather than interleaved
+        upload = DocumentUpload.objects.select_for_update(nowait=True).get(pk=upload.pk)
+        if offset != upload.offset:
+            raise UploadOffsetMismatch(upload.offset)
+        if offset + length > upload.size:
+            raise ValidationError(
+                f"Chunk ends at byte {offset + length}, past the announced size of {upload.size}."
+            )
+
+        digest = hashlib.sha256()
+        received = 0
+        validator = FileValidator(upload.file_name) if offset == 0 else None
+        with open(path, "r+b") as part:
+            # Drop whatever an interrupted earlier attempt left past the offset
+            part.truncate(offset)
+            part.seek(offset)
+            try:
+                while received < length:
+                    block = stream.read(min(UPLOAD_READ_SIZE, length - received))
+                    if not block:
+                        break
+                    if validator:
+                        validator.feed(block)
+                    digest.update(block)
+                    part.write(block)
+                    received += len(block)
+                if received != length:
+                    raise ValidationError(
+                        f"Chunk was cut short at {received} of {length} bytes."
+                    )
+                if checksum and digest.hexdigest() != checksum.lower():
+                    raise ValidationError("Chunk checksum does not match.")
+                if validator:
+                    validator.finish()
+            except BaseException:
+                part.truncate(offset)
+                raise
+
+        upload.offset = offset + received
+        upload.expires_at = timezone.now() + UPLOAD_SESSION_LIFETIME
+        upload.save(update_fields=["offset", "expires_at", "updated_at"])
+    return upload
+
+
+def finish_upload(upload):
+    """
+    Verify the assembled file and attach it to the practitioner. Returns None when
+    a concurrent call finalized or discarded the upload first.
+    """
+    path = part_path(upload)
+    with transaction.atomic():
+        # Concurrent finalizes wait here and then find the upload gone
+        upload = (
+            DocumentUpload.objects.select_for_update()
+            .select_related("practitioner")
+            .filter(pk=upload.pk)
+            .first()
+        )
+        if upload is None:
+            return None
+        if not upload.is_complete:
+            raise UploadOffsetMismatch(upload.offset)
+        checksum_matches = file_digest(path) == upload.checksum.lower()
+        practitioner = upload.practitioner
+        if checksum_matches:
+            with open(path, "rb") as part:
+                document = UploadedFile(
+                    file=part,
+                    name=upload.file_name,
+                    content_type=upload.content_type,
+                    size=upload.size,
+                )
+                validate_file(document)
+                setattr(practitioner, upload.field, document)
+                if upload.means_of_identification_type:
+                    practitioner.means_of_identification_type = (
+                        upload.means_of_identification_type
+                    )
+                practitioner.save()
+        upload.delete()
+    remove_part(path)
+    if not checksum_matches:
+        raise ValidationError("File checksum does not match; start a new upload.")
+    return practitioner
+
+
+def remove_part(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+def discard_upload(upload):
+    path = part_path(upload)
+    upload.delete()
+    remove_part(path)
+
+
+def expire_uploads():
+    """Discard uploads idle past their expiry, with their part files."""
+    expired = list(DocumentUpload.objects.filter(expires_at__lt=timezone.now()))
+    for upload in expired:
+        discard_upload(upload)
+    if expired:
+        logger.info(f"Document uploads: discarded {len(expired)} abandoned uploads.")
+    return len(expired)
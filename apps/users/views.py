@@ -1,3 +1,4 @@
+import io
 import logging
 from datetime import datetime, timedelta
 
@@ -5,25 +6,30 @@ import pytz
 from django.contrib.auth import authenticate
 from django.contrib.auth import logout
 from django.core.exceptions import ValidationError
+from django.db import DatabaseError
 from django.db.models import Q
 from django.shortcuts import get_object_or_404, redirect
+from django.utils import timezone
 from django.utils.decorators import method_decorator
 from django.utils.timezone import make_aware
 from drf_yasg import openapi
-from drf_yasg.utils import swagger_auto_schema
+from drf_yasg.utils import no_body, swagger_auto_schema
 from rest_framework import status
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.viewsets import ViewSet
-from rest_framework_simplejwt.tokens import RefreshToken
 
+from apps.users.authentication import get_tokens_for_user
+from apps.users.onboarding import ONBOARDING_MAX_REQUEST_ROWS, parse_patient_csv
 from apps.users.models import (
     Address,
     Allergy,
     AuthToken,
+    DocumentUpload,
     EmergencyContact,
     Medication,
     Patient,
+    PatientImportJob,
     Practitioner,
     PractitionerSpecialization,
     User,
@@ -31,11 +37,14 @@ from apps.users.models import (
 from apps.users.serializer import (
     AddressSerializer,
     AllergySerializer,
+    DocumentUploadSerializer,
+    DocumentUploadStartSerializer,
     EmergencyContactSerializer,
     PractitionerDocumentUploadSerializer,
     MedicationSerializer,
     OauthCodeSerializer,
     PatientFormSerializer,
+    PatientImportJobSerializer,
     PatientRegistrationSerializer,
     PatientSerializer,
     PractitionerFormSerializer,
@@ -45,19 +54,35 @@ from apps.users.serializer import (
     UserFormSerializer,
     UserSerializer,
 )
+from apps.users.tasks import schedule_patient_import
+from apps.users.token_pool import issue_token
+from apps.users.uploads import (
+    UploadOffsetMismatch,
+    append_chunk,
+    discard_upload,
+    finish_upload,
+    start_upload,
+)
 from apps.utils.base import (
     Addon,
     BaseModelViewSet,
     BaseNoAuthViewSet,
     BaseViewSet,
 )
+from apps.utils.bulk import set_related, upsert_by_name
 from apps.utils.encrypt_util import Encrypt
-from apps.utils.enums import UserGroup, UserType
+from apps.utils.enums import (
+    AuthTokenEnum,
+    AuthTokenStatusEnum,
+    UserGroup,
+    UserType,
+)
 from apps.utils.permissions import (
     patient_access_only,
     practitioner_access_only,
+    staff_user_access_only,
 )
-from apps.utils.validators import validate_file
+from apps.utils.validators import IMAGE_FILE_TYPES, validate_uploads
 
 logger = logging.getLogger("user")
 
@@ -71,11 +96,7 @@ class AuthViewSet(ViewSet, Addon):
 
     @staticmethod
     def get_tokens_for_user(user):
-        refresh = RefreshToken.for_user(user)
-        return {
-            "refresh": str(refresh),
-            "access": str(refresh.access_token),
-        }
+        return get_tokens_for_user(user)
 
     @staticmethod
     def get_user(username):
@@ -159,7 +180,7 @@ class AuthViewSet(ViewSet, Addon):
 
         message = f"You signed in from {self.get_device(request).get('device')} device with ip address {self.get_ip_address(request)}"
 
-        user.email_user(
+        user.queue_email(
             subject="login notification",
             message=message,
             from_email="info@mail.com",
@@ -341,7 +362,7 @@ class AuthViewSet(ViewSet, Addon):
                     status=status.HTTP_400_BAD_REQUEST,
                 )
             user = serializer.save()
-            token = self.unique_number_generator(AuthToken, "token", 4)
+            token = issue_token(AuthTokenEnum.VERIFICATION)
             self.create_auth_token(
                 {
                     "type": 2,
@@ -357,7 +378,7 @@ class AuthViewSet(ViewSet, Addon):
                 f"account created and your verification token is {token}"
             )
 
-            user.email_user(
+            user.queue_email(
                 subject="Account created",
                 message=message,
                 from_email="info@mail.com",
@@ -383,7 +404,7 @@ class AuthViewSet(ViewSet, Addon):
 
         if serializer.is_valid():
             user = serializer.save()
-            token = self.unique_number_generator(AuthToken, "token", 4)
+            token = issue_token(AuthTokenEnum.VERIFICATION)
             self.create_auth_token(
                 {
                     "type": 2,
@@ -399,7 +420,7 @@ class AuthViewSet(ViewSet, Addon):
                 f"account created and your verification token is {token}"
             )
 
-            user.email_user(
+            user.queue_email(
                 subject="Account created",
                 message=message,
                 from_email="info@mail.com",
@@ -465,12 +486,21 @@ class AuthViewSet(ViewSet, Addon):
             )
 
         AuthToken.objects.filter(user=user, type=0).delete()
-        token = self.unique_number_generator(AuthToken, "token", 4)
+        token = issue_token(AuthTokenEnum.RESET_TOKEN)
 
-        AuthToken.objects.create(user=user, token=token, type=0)
+        self.create_auth_token(
+            {
+                "type": 0,
+                "token": token,
+                "status": 0,
+                "user": user,
+                "expiry": make_aware(datetime.now(), timezone=pytz.utc)
+                + timedelta(minutes=20),
+            }
+        )
 
         message = f"Password reset token is {token}"
-        user.email_user(
+        user.queue_email(
             subject="Password Reset",
             message=message,
             from_email="info@mail.com",
@@ -522,7 +552,7 @@ class AuthViewSet(ViewSet, Addon):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        auth_token = AuthToken.objects.filter(token=token, type=0).first()
+        auth_token = AuthToken.get_live(token, AuthTokenEnum.RESET_TOKEN)
 
         if not auth_token:
             return Response(
@@ -536,6 +566,10 @@ class AuthViewSet(ViewSet, Addon):
         user = auth_token.user
         user.set_password(new_password)
         user.save()
+        # Consumed tokens are removed by the auth token sweeper
+        AuthToken.objects.filter(pk=auth_token.pk).update(
+            status=AuthTokenStatusEnum.USED
+        )
 
         return Response(
             {
@@ -545,25 +579,15 @@ class AuthViewSet(ViewSet, Addon):
             status=status.HTTP_200_OK,
         )
 
-    def verify_user(self, request, token):
+    def verify_user(self, request, instance):
         context = {"status": status.HTTP_200_OK}
         try:
-
-            if not AuthToken.objects.filter(
-                token=token, status=0, type=2
-            ).exists():
-                raise Exception(
-                    "System could not validate your credentials ,Kindly ensure you enter correct code sent to your mail"
-                )
-            instance = AuthToken.objects.filter(
-                token=token, status=0, type=2
-            ).first()
             if instance.user.is_verified:
                 raise Exception("User already verified")
             instance.user.is_verified = True
             instance.user.save()
             message = f"Your account have been activated"
-            instance.user.email_user(
+            instance.user.queue_email(
                 subject="Account activation",
                 message=message,
                 from_email="info@mail.com",
@@ -575,7 +599,7 @@ class AuthViewSet(ViewSet, Addon):
                     "status": status.HTTP_200_OK,
                 }
             )
-            self.delete_auth_token({"token": token})
+            instance.delete()
         except Exception as ex:
             context.update(
                 {
@@ -627,23 +651,21 @@ class AuthViewSet(ViewSet, Addon):
                     "Kindly supply an action [verification, password_reset]"
                 )
             if data.get("action") == "verification":
-                if not AuthToken.objects.filter(
-                    token=token, status=0, type=2
-                ).exists():
+                instance = AuthToken.get_live(token, AuthTokenEnum.VERIFICATION)
+                if not instance:
                     raise Exception(
                         "System could not validate your credentials ,"
                         "Kindly ensure you copy correctly, the code sent to your phone"
                     )
-                return self.verify_user(request=request, token=token)
+                return self.verify_user(request=request, instance=instance)
             elif data.get("action") == "password_reset":
-                if not AuthToken.objects.filter(
-                    token=token, status=0, type=0
-                ).exists():
+                instance = AuthToken.get_live(token, AuthTokenEnum.RESET_TOKEN)
+                if not instance:
                     raise Exception(
                         "System could not validate your credentials ,"
                         "Kindly ensure your click the link sent to your mail"
                     )
-                return self.password_reset(request, token)
+                return self.password_reset(request, instance)
 
         except Exception as ex:
             context.update(
@@ -655,18 +677,17 @@ class AuthViewSet(ViewSet, Addon):
             )
         return Response(context, status=context["status"])
 
-    def password_reset(self, request, token):
+    def password_reset(self, request, instance):
         context = {"status": status.HTTP_200_OK}
         try:
-            auth_user = AuthToken.objects.get(token=token)
             context.update(
                 {
                     "message": "OK",
                     "status": status.HTTP_200_OK,
-                    "data": UserSerializer(auth_user.user).data,
+                    "data": UserSerializer(instance.user).data,
                 }
             )
-            self.delete_auth_token({"token": token})
+            instance.delete()
         except Exception as ex:
             context.update(
                 {
@@ -705,7 +726,8 @@ class AuthViewSet(ViewSet, Addon):
 
         try:
             data = self.get_data(request)
-            if not User.objects.filter(email=email).exists():
+            user = User.objects.filter(email=email).first()
+            if not user:
                 raise ValidationError(
                     "User with this mobile does not exist inside our system"
                 )
@@ -717,11 +739,8 @@ class AuthViewSet(ViewSet, Addon):
                 raise Exception(
                     "Kindly supply an action [verification, password_reset]"
                 )
-            user = User.objects.filter(email=email).first()
             if data.get("action") == "verification":
-                number_token = self.unique_number_generator(
-                    AuthToken, "token", 4
-                )
+                number_token = issue_token(AuthTokenEnum.VERIFICATION)
 
                 self.delete_auth_token({"user": user, "type": 2})
                 auth_token = self.create_auth_token(
@@ -737,9 +756,7 @@ class AuthViewSet(ViewSet, Addon):
                     }
                 )
             elif data.get("action") == "password_reset":
-                number_token = self.unique_number_generator(
-                    AuthToken, "token", 4
-                )
+                number_token = issue_token(AuthTokenEnum.RESET_TOKEN)
 
                 self.delete_auth_token({"user": user, "type": 0})
                 auth_token = self.create_auth_token(
@@ -756,26 +773,17 @@ class AuthViewSet(ViewSet, Addon):
                 )
 
             message = f"Your token {number_token}"
-            resp = user.email_user(
+            user.queue_email(
                 subject="New Token",
                 message=message,
                 from_email="info@mail.com",
             )
-            if resp is None:
-                context.update(
-                    {
-                        "status": status.HTTP_200_OK,
-                        "message": f"New token sent successfully",
-                    }
-                )
-            else:
-                auth_token.delete()
-                context.update(
-                    {
-                        "status": status.HTTP_400_BAD_REQUEST,
-                        "message": "Token could not be sent currently ,Kindly try again",
-                    }
-                )
+            context.update(
+                {
+                    "status": status.HTTP_200_OK,
+                    "message": f"New token sent successfully",
+                }
+            )
         except ValidationError as ex:
             context.update(
                 {
@@ -810,7 +818,9 @@ class AuthViewSet(ViewSet, Addon):
 
 class UserViewSet(BaseViewSet):
     serializer_class = UserSerializer
-    queryset = User.objects.select_related("address").all()
+    queryset = UserSerializer.setup_eager_loading(User.objects.all())
+    cursor_ordering = ("-date_joined", "-id")
+    search_fields = ("first_name", "last_name", "email", "phone_number")
 
     def get_queryset(self):
         return self.queryset.exclude(
@@ -823,6 +833,14 @@ class UserViewSet(BaseViewSet):
     @swagger_auto_schema(
         operation_summary="List all users account",
         operation_description="Retrieve a paginated list of users.",
+        manual_parameters=[
+            openapi.Parameter(
+                "search",
+                openapi.IN_QUERY,
+                description="Ranked search over name, email and phone number",
+                type=openapi.TYPE_STRING,
+            )
+        ],
         responses={
             200: openapi.Response(
                 "Success", PractitionerSerializer(many=True)
@@ -833,7 +851,7 @@ class UserViewSet(BaseViewSet):
         context = {}
         try:
             paginate = self.get_paginated_data(
-                queryset=self.get_queryset(),
+                queryset=self.get_list(self.get_queryset()),
                 serializer_class=self.serializer_class,
             )
             context.update(
@@ -877,8 +895,11 @@ class UserViewSet(BaseViewSet):
         context = {"status": status.HTTP_400_BAD_REQUEST}
         try:
             instance = request.user
+            validate_uploads(request, ["avatar"], IMAGE_FILE_TYPES)
             data = self.get_data(request)
-            serializer = UserFormSerializer(data=data, instance=instance)
+            serializer = UserFormSerializer(
+                data=data, instance=instance, context={"request": request}
+            )
             if serializer.is_valid():
 
                 all_users_exclude_current = User.objects.all().exclude(
@@ -1094,12 +1115,13 @@ class UserViewSet(BaseViewSet):
 
 
 class PractitionerViewSet(BaseViewSet):
-    queryset = Practitioner.objects.select_related("user").all()
+    queryset = PractitionerSerializer.setup_eager_loading(Practitioner.objects.all())
     serializer_class = PractitionerSerializer
     serializer_form_class = PractitionerFormSerializer
+    cursor_ordering = ("-user__date_joined", "-id")
 
     def get_object(self):
-        return get_object_or_404(Practitioner, pk=self.kwargs.get("pk"))
+        return get_object_or_404(self.get_queryset(), pk=self.kwargs.get("pk"))
 
     def get_queryset(self):
         return self.queryset
@@ -1226,27 +1248,23 @@ class PractitionerViewSet(BaseViewSet):
         context = {}
         try:
             instance = self.get_object()
-            files_updated = False
-
-            # Validate and save certificate
-            if request.FILES.get("certificate"):
-                instance.certificate = request.FILES["certificate"]
-                files_updated = True
-
-            # Validate and save means of identification
-            if request.FILES.get(
-                "means_of_identification"
-            ) and request.data.get("means_of_identification_type"):
-                instance.means_of_identification_type = request.POST.get(
-                    "means_of_identification_type"
+            # Spoofed or oversized files are refused at their first chunk
+            validate_uploads(request, Practitioner.DOCUMENT_FIELDS)
+            serializer = PractitionerDocumentUploadSerializer(
+                data=request.data, context={"request": request}
+            )
+            if not serializer.is_valid():
+                context.update(
+                    {
+                        "status": status.HTTP_400_BAD_REQUEST,
+                        "errors": serializer.errors,
+                    }
                 )
-                instance.means_of_identification = request.FILES[
-                    "means_of_identification"
-                ]
-                files_updated = True
-
-            if files_updated:
-                instance.save()  # Save changes
+            elif any(
+                serializer.validated_data.get(field)
+                for field in Practitioner.DOCUMENT_FIELDS
+            ):
+                instance = serializer.update(instance, serializer.validated_data)
                 context.update(
                     {
                         "status": status.HTTP_200_OK,
@@ -1268,6 +1286,204 @@ class PractitionerViewSet(BaseViewSet):
             )
         return Response(context, status=context["status"])
 
+    @staticmethod
+    def get_document_upload(request, upload_id):
+        return (
+            DocumentUpload.objects.select_related("practitioner")
+            .filter(
+                pk=upload_id,
+                practitioner__user=request.user,
+                expires_at__gte=timezone.now(),
+            )
+            .first()
+        )
+
+    @swagger_auto_schema(
+        request_body=DocumentUploadStartSerializer,
+        operation_summary="Start a resumable document upload",
+        operation_description="Announce a document's name, type, size and SHA-256. "
+        "Its bytes are then sent in chunks to uploads/{upload_id} and the upload is "
+        "finalized at uploads/{upload_id}/finalize.",
+        responses={201: openapi.Response("Created", DocumentUploadSerializer)},
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        description="Start a resumable document upload",
+        url_path="uploads",
+    )
+    @method_decorator(practitioner_access_only(), name="dispatch")
+    def start_document_upload(self, request, *args, **kwargs):
+        context = {"status": status.HTTP_201_CREATED}
+        try:
+            practitioner = Practitioner.objects.filter(user=request.user).first()
+            if practitioner is None:
+                raise Exception("Practitioner not found.")
+            serializer = DocumentUploadStartSerializer(data=request.data)
+            if serializer.is_valid():
+                upload = start_upload(practitioner, serializer.validated_data)
+                context.update({"data": DocumentUploadSerializer(upload).data})
+            else:
+                context.update(
+                    {
+                        "status": status.HTTP_400_BAD_REQUEST,
+                        "errors": serializer.errors,
+                    }
+                )
+        except ValidationError as ex:
+            context.update(
+                {"status": status.HTTP_400_BAD_REQUEST, "message": ex.messages[0]}
+            )
+        except Exception as ex:
+            context.update(
+                {"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)}
+            )
+        return Response(context, status=context["status"])
+
+    @swagger_auto_schema(
+        methods=["put"],
+        request_body=openapi.Schema(type=openapi.TYPE_STRING, format="binary"),
+        manual_parameters=[
+            openapi.Parameter(
+                "Upload-Offset",
+                openapi.IN_HEADER,
+                description="Byte offset the chunk starts at",
+                type=openapi.TYPE_INTEGER,
+                required=True,
+            ),
+            openapi.Parameter(
+                "Upload-Checksum",
+                openapi.IN_HEADER,
+                description="Optional hex SHA-256 of the chunk",
+                type=openapi.TYPE_STRING,
+            ),
+        ],
+        operation_summary="Send a chunk of a document upload",
+        operation_description="The body is the raw chunk. A chunk that does not start "
+        "at the current offset gets 409 with the offset to resume from.",
+        responses={200: openapi.Response("Success", DocumentUploadSerializer)},
+    )
+    @swagger_auto_schema(
+        methods=["get", "delete"],
+        operation_summary="Get the offset of, or cancel, a document upload",
+        responses={200: openapi.Response("Success", DocumentUploadSerializer)},
+    )
+    @action(
+        detail=False,
+        methods=["get", "put", "delete"],
+        description="Resume, send a chunk of, or cancel a document upload",
+        url_path=r"uploads/(?P<upload_id>[0-9a-f-]+)",
+    )
+    @method_decorator(practitioner_access_only(), name="dispatch")
+    def document_upload(self, request, upload_id=None, *args, **kwargs):
+        context = {"status": status.HTTP_200_OK}
+        try:
+            upload = self.get_document_upload(request, upload_id)
+            if upload is None:
+                context.update(
+                    {
+                        "status": status.HTTP_404_NOT_FOUND,
+                        "message": "Upload not found or expired.",
+                    }
+                )
+            elif request.method == "DELETE":
+                discard_upload(upload)
+                context.update({"message": "Upload cancelled"})
+            else:
+                if request.method == "PUT":
+                    offset = request.headers.get("Upload-Offset", "")
+                    if not offset.isdigit():
+                        raise Exception("Kindly supply the Upload-Offset header")
+                    # Read the raw body as a stream; request.data would buffer it
+                    upload = append_chunk(
+                        upload,
+                        request.stream,
+                        int(offset),
+                        int(request.headers.get("Content-Length") or 0),
+                        request.headers.get("Upload-Checksum"),
+                    )
+                context.update({"data": DocumentUploadSerializer(upload).data})
+        except UploadOffsetMismatch as ex:
+            context.update(
+                {
+                    "status": status.HTTP_409_CONFLICT,
+                    "message": str(ex),
+                    "data": {"offset": ex.offset},
+                }
+            )
+        except DatabaseError:
+            context.update(
+                {
+                    "status": status.HTTP_409_CONFLICT,
+                    "message": "Another chunk of this upload is being written.",
+                }
+            )
+        except ValidationError as ex:
+            context.update(
+                {"status": status.HTTP_400_BAD_REQUEST, "message": ex.messages[0]}
+            )
+        except Exception as ex:
+            context.update(
+                {"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)}
+            )
+        return Response(context, status=context["status"])
+
+    @swagger_auto_schema(
+        request_body=no_body,
+        operation_summary="Finalize a document upload",
+        operation_description="Verify the uploaded file against its checksum and the "
+        "upload rules, then attach it to the practitioner.",
+        responses={
+            200: openapi.Response("Success", PractitionerSerializer),
+            400: openapi.Response("Validation Error"),
+        },
+    )
+    @action(
+        detail=False,
+        methods=["post"],
+        description="Finalize a document upload",
+        url_path=r"uploads/(?P<upload_id>[0-9a-f-]+)/finalize",
+    )
+    @method_decorator(practitioner_access_only(), name="dispatch")
+    def finalize_document_upload(self, request, upload_id=None, *args, **kwargs):
+        context = {"status": status.HTTP_200_OK}
+        try:
+            upload = self.get_document_upload(request, upload_id)
+            practitioner = finish_upload(upload) if upload else None
+            if practitioner is None:
+                context.update(
+                    {
+                        "status": status.HTTP_404_NOT_FOUND,
+                        "message": "Upload not found or expired.",
+                    }
+                )
+            else:
+                context.update(
+                    {
+                        "message": "Documents uploaded successfully",
+                        "data": self.serializer_class(
+                            self.get_queryset().get(pk=practitioner.pk)
+                        ).data,
+                    }
+                )
+        except UploadOffsetMismatch as ex:
+            context.update(
+                {
+                    "status": status.HTTP_409_CONFLICT,
+                    "message": f"Upload is incomplete; {ex}",
+                    "data": {"offset": ex.offset},
+                }
+            )
+        except ValidationError as ex:
+            context.update(
+                {"status": status.HTTP_400_BAD_REQUEST, "message": ex.messages[0]}
+            )
+        except Exception as ex:
+            context.update(
+                {"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)}
+            )
+        return Response(context, status=context["status"])
+
     @swagger_auto_schema(
         request_body=PractitionerSpecializationSerializer,
         operation_description="Add practitioner specialization",
@@ -1295,14 +1511,12 @@ class PractitionerViewSet(BaseViewSet):
                 data=data, many=True
             )
             if serializer.is_valid(raise_exception=True):
-                specializations = {
-                    PractitionerSpecialization.objects.get_or_create(**v)[
-                        0
-                    ].id
-                    for v in data
-                }
-
-                practitioner.specializations.set(specializations)
+                specializations = upsert_by_name(
+                    PractitionerSpecialization, serializer.validated_data
+                )
+                set_related(
+                    practitioner, "specializations", specializations.values()
+                )
                 context.update({"data": "Specialization added"})
             else:
                 context.update(
@@ -1335,12 +1549,20 @@ class PractitionerViewSet(BaseViewSet):
 
 
 class PatientViewSet(BaseViewSet):
-    queryset = Patient.objects.select_related("user").all()
+    queryset = PatientSerializer.setup_eager_loading(Patient.objects.all())
     serializer_class = PatientSerializer
     serializer_form_class = PatientFormSerializer
+    cursor_ordering = ("-user__date_joined", "-id")
+    search_fields = (
+        "user__first_name",
+        "user__last_name",
+        "user__email",
+        "user__phone_number",
+        "nationality",
+    )
 
     def get_object(self):
-        return get_object_or_404(Patient, pk=self.kwargs.get("pk"))
+        return get_object_or_404(self.get_queryset(), pk=self.kwargs.get("pk"))
 
     def get_queryset(self):
         return self.queryset
@@ -1348,6 +1570,14 @@ class PatientViewSet(BaseViewSet):
     @swagger_auto_schema(
         operation_summary="List all patients users account",
         operation_description="Retrieve a paginated list of patients.",
+        manual_parameters=[
+            openapi.Parameter(
+                "search",
+                openapi.IN_QUERY,
+                description="Ranked search over name, email, phone number and nationality",
+                type=openapi.TYPE_STRING,
+            )
+        ],
         responses={
             200: openapi.Response("Success", PatientSerializer(many=True))
         },
@@ -1356,7 +1586,7 @@ class PatientViewSet(BaseViewSet):
         context = {}
         try:
             paginate = self.get_paginated_data(
-                queryset=self.get_queryset(),
+                queryset=self.get_list(self.get_queryset()),
                 serializer_class=self.serializer_class,
             )
             context.update(
@@ -1455,6 +1685,78 @@ class PatientViewSet(BaseViewSet):
             )
         return Response(context, status=context["status"])
 
+    @swagger_auto_schema(
+        request_body=openapi.Schema(
+            type=openapi.TYPE_OBJECT,
+            properties={
+                "patients": openapi.Schema(
+                    type=openapi.TYPE_ARRAY,
+                    items=openapi.Schema(type=openapi.TYPE_OBJECT),
+                    description="Patients shaped like the registration payload; password is optional",
+                ),
+                "file": openapi.Schema(
+                    type=openapi.TYPE_FILE,
+                    description="CSV of patients with a header line, instead of patients",
+                ),
+            },
+        ),
+        operation_description=f"Queue an import of up to {ONBOARDING_MAX_REQUEST_ROWS} "
+        "patients and return the job to poll for its report; larger migrations use "
+        "the import_patients management command",
+        responses={202: openapi.Response("Accepted", PatientImportJobSerializer)},
+        operation_summary="Bulk patient onboarding",
+    )
+    @action(detail=False, methods=["post"], url_path="import")
+    @method_decorator(staff_user_access_only(), name="dispatch")
+    def bulk_import(self, request, *args, **kwargs):
+        context = {"status": status.HTTP_202_ACCEPTED}
+        try:
+            if request.FILES.get("file"):
+                rows = parse_patient_csv(
+                    io.TextIOWrapper(request.FILES["file"], encoding="utf-8")
+                )
+            elif isinstance(request.data, list):
+                rows = request.data
+            else:
+                rows = request.data.get("patients") or []
+            if not rows:
+                raise Exception("Kindly supply patients or a CSV file")
+            if len(rows) > ONBOARDING_MAX_REQUEST_ROWS:
+                raise Exception(
+                    f"At most {ONBOARDING_MAX_REQUEST_ROWS} patients can be imported per request"
+                )
+            job = schedule_patient_import(rows, request.user)
+            context.update(
+                {
+                    "message": "Patient import queued",
+                    "data": PatientImportJobSerializer(job).data,
+                }
+            )
+        except Exception as ex:
+            context.update(
+                {"status": status.HTTP_400_BAD_REQUEST, "message": str(ex)}
+            )
+        return Response(context, status=context["status"])
+
+    @swagger_auto_schema(
+        operation_summary="Bulk patient onboarding progress",
+        operation_description="The status of a queued patient import, with its "
+        "report once it has completed",
+        responses={200: openapi.Response("Success", PatientImportJobSerializer)},
+    )
+    @action(
+        detail=False,
+        methods=["get"],
+        url_path=r"import/(?P<job_id>[0-9a-f-]+)",
+    )
+    @method_decorator(staff_user_access_only(), name="dispatch")
+    def bulk_import_job(self, request, job_id=None, *args, **kwargs):
+        job = get_object_or_404(PatientImportJob, pk=job_id)
+        return Response(
+            {"status": status.HTTP_200_OK, "data": PatientImportJobSerializer(job).data},
+            status=status.HTTP_200_OK,
+        )
+
     @swagger_auto_schema(
         request_body=EmergencyContactSerializer,
         operation_description="Add emergency contact",
@@ -1526,19 +1828,8 @@ class PatientViewSet(BaseViewSet):
             serializer = AllergySerializer(data=data, many=True)
             if serializer.is_valid(raise_exception=True):
 
-                allergies = [
-                    Allergy.objects.get_or_create(**v)[0].id for v in data
-                ]
-
-                if patient.allergies.all():
-                    allergies + list(
-                        patient.allergies.all().values_list(
-                            "id", flat=True
-                        )
-                    )
-
-                patient.allergies.set(set(allergies))
-                patient.save()
+                allergies = upsert_by_name(Allergy, serializer.validated_data)
+                set_related(patient, "allergies", allergies.values())
                 context.update({"message": "Allergies added"})
             else:
                 context.update(
@@ -1578,18 +1869,10 @@ class PatientViewSet(BaseViewSet):
             patient = self.get_patient(request)
             serializer = MedicationSerializer(data=data, many=True)
             if serializer.is_valid(raise_exception=True):
-                medications = [
-                    Medication.objects.get_or_create(**v)[0].id
-                    for v in data
-                ]
-                if patient.medications.all():
-                    medications + list(
-                        patient.medications.all().values_list(
-                            "id", flat=True
-                        )
-                    )
-                patient.medications.set(set(medications))
-                patient.save()
+                medications = upsert_by_name(
+                    Medication, serializer.validated_data
+                )
+                set_related(patient, "medications", medications.values())
                 context.update({"message": "Medication added"})
             else:
                 context.update(
@@ -12,10 +12,11 @@ from rest_framework.filters import OrderingFilter, SearchFilter
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet, ViewSet
-from rest_framework_simplejwt.authentication import JWTAuthentication
 
+from apps.users.authentication import CachedProfileJWTAuthentication
 from apps.users.models import AuthToken, Patient, Practitioner, User
 from apps.utils.pagination import CustomPaginator
+from apps.utils.search import RankedSearchFilter, ranked_ordering
 
 logger = logging.getLogger("__name__")
 
@@ -134,10 +135,12 @@ class CustomFilter(DjangoFilterBackend):
 
 class AbstractBaseViewSet:
     custom_filter_class = CustomFilter()
-    search_backends = SearchFilter()
+    search_backends = RankedSearchFilter()
     order_backend = OrderingFilter()
     filter_backends = [SearchFilter, DjangoFilterBackend]
     paginator_class = CustomPaginator()
+    # Unique, indexed ordering used for list ordering and cursor pagination
+    cursor_ordering = None
 
     def __init__(self):
         pass
@@ -207,18 +210,22 @@ class BaseViewSet(ViewSet, AbstractBaseViewSet, Addon):
                 request=self.request, queryset=queryset, view=self
             )
         else:
-            query_set = query_set.order_by("-pk")  # was originally 'pk'
+            query_set = query_set.order_by(
+                *ranked_ordering(
+                    query_set, self.paginator_class.get_cursor_ordering(self)
+                )
+            )
         return query_set
 
     def get_paginated_data(self, queryset, serializer_class):
         paginated_data = self.paginator_class.generate_response(
-            queryset, serializer_class, self.request
+            queryset, serializer_class, self.request, view=self
         )
         return paginated_data
 
 
 class BaseModelViewSet(ModelViewSet, AbstractBaseViewSet, Addon):
-    authentication_classes = [SessionAuthentication, JWTAuthentication]
+    authentication_classes = [SessionAuthentication, CachedProfileJWTAuthentication]
     permission_classes = [IsAuthenticated]
 
     @staticmethod
@@ -245,12 +252,16 @@ class BaseModelViewSet(ModelViewSet, AbstractBaseViewSet, Addon):
                 request=self.request, queryset=queryset, view=self
             )
         else:
-            query_set = query_set.order_by("-pk")  # was originally 'pk'
+            query_set = query_set.order_by(
+                *ranked_ordering(
+                    query_set, self.paginator_class.get_cursor_ordering(self)
+                )
+            )
         return query_set
 
     def get_paginated_data(self, queryset, serializer_class):
         paginated_data = self.paginator_class.generate_response(
-            queryset, serializer_class, self.request
+            queryset, serializer_class, self.request, view=self
         )
         return paginated_data
 
@@ -261,7 +272,7 @@ class BaseNoAuthViewSet(ViewSet, Addon):
     """
 
     custom_filter_class = CustomFilter()
-    search_backends = SearchFilter()
+    search_backends = RankedSearchFilter()
     order_backend = OrderingFilter()
     paginator_class = CustomPaginator()
     serializer_class = None
@@ -306,12 +317,16 @@ class BaseNoAuthViewSet(ViewSet, Addon):
                 query_set, self.request, self
             )
         else:
-            query_set = query_set.order_by("-pk")
+            query_set = query_set.order_by(
+                *ranked_ordering(
+                    query_set, self.paginator_class.get_cursor_ordering(self)
+                )
+            )
         return query_set
 
     def paginator(self, queryset, serializer_class):
         paginated_data = self.paginator_class.generate_response(
-            queryset, serializer_class, self.request
+            queryset, serializer_class, self.request, view=self
         )
         return paginated_data
 
@@ -0,0 +1,87 @@
+"""
+Set-based writes for lookup tables and many-to-many links.
+
+``upsert_by_name`` stores a list of named lookup rows (allergies, medications,
+specializations) with one insert and one select, however long the list.
+``set_related`` replaces a many-to-many relation with at most one select, one
+delete and one insert on the through table. Neither sends ``m2m_changed``.
+``merge_duplicate_names`` folds rows sharing a name into one, so a ``name``
+column can be made unique on a database that already holds duplicates.
+"""
+
+from django.db import DEFAULT_DB_ALIAS, models
+
+
+def upsert_by_name(model, rows):
+    """
+    Insert the rows whose ``name`` is new and return ``{name: pk}`` for every
+    row. Existing rows are kept as they are, so a payload cannot rewrite the
+    description of an entry other records share.
+    """
+    rows = {row["name"]: row for row in rows}
+    if not rows:
+        return {}
+    model.objects.bulk_create(
+        [model(**row) for row in rows.values()], ignore_conflicts=True
+    )
+    return dict(model.objects.filter(name__in=rows).values_list("name", "pk"))
+
+
+def set_related(instance, field_name, pks):
+    """Make ``instance.<field_name>`` link exactly ``pks``."""
+    field = instance._meta.get_field(field_name)
+    through = field.remote_field.through
+    source = through._meta.get_field(field.m2m_field_name()).attname
+    target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+
+    links = through.objects.filter(**{source: instance.pk})
+    current = set(links.values_list(target, flat=True))
+    pks = set(pks)
+    if current - pks:
+        links.filter(**{f"{target}__in": current - pks}).delete()
+    if pks - current:
+        through.objects.bulk_create(
+            [through(**{source: instance.pk, target: pk}) for pk in pks - current],
+            ignore_conflicts=True,
+        )
+    getattr(instance, "_prefetched_objects_cache", {}).pop(field_name, None)
+
+
+def merge_duplicate_names(model, using=DEFAULT_DB_ALIAS):
+    """
+    Keep one row per ``name`` and repoint the many-to-many links of the others
+    at it before deleting them. Works with historical models, so it can run as a
+    ``RunPython`` step. Returns the number of rows merged away.
+    """
+    names = (
+        model.objects.using(using).values("name")
+        .annotate(rows=models.Count("pk"))
+        .filter(rows__gt=1)
+        .values_list("name", flat=True)
+    )
+    duplicates = {}
+    rows = model.objects.using(using).filter(name__in=list(names)).order_by("name", "pk")
+    for name, pk in rows.values_list("name", "pk"):
+        duplicates.setdefault(name, []).append(pk)
+    replacements = {pk: pks[0] for pks in duplicates.values() for pk in pks[1:]}
+    if not replacements:
+        return 0
+
+    for relation in model._meta.related_objects:
+        if not relation.many_to_many:
+            continue
+        field = relation.field
+        through = field.remote_field.through
+        source = through._meta.get_field(field.m2m_field_name()).attname
+        target = through._meta.get_field(field.m2m_reverse_field_name()).attname
+        links = through.objects.using(using).filter(**{f"{target}__in": replacements})
+        moved = {
+            (owner, replacements[pk]) for owner, pk in links.values_list(source, target)
+        }
+        links.delete()
+        through.objects.using(using).bulk_create(
+            [through(**{source: owner, target: pk}) for owner, pk in moved],
+            ignore_conflicts=True,
+        )
+    model.objects.using(using).filter(pk__in=replacements).delete()
+    return len(replacements)
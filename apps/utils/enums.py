@@ -210,6 +210,22 @@ class AuthTokenStatusEnum(CustomEnum):
         )
 
 
+class EmailStatusEnum(CustomEnum):
+    PENDING: int = 0
+    SENDING: int = 1
+    SENT: int = 2
+    FAILED: int = 3
+
+    @classmethod
+    def choices(cls):
+        return (
+            (cls.PENDING, "PENDING"),
+            (cls.SENDING, "SENDING"),
+            (cls.SENT, "SENT"),
+            (cls.FAILED, "FAILED"),
+        )
+
+
 class DisabilityType(CustomEnum):
     DISABLE: str = "disable"
     NOT_DISABLE: str = "not disabled"
@@ -296,6 +312,7 @@ class ProgressStatusEnum(CustomEnum):
     IN_PROGRESS = "in_progress"
     EXPIRED = "expired"
     COMPLETED = "completed"
+    FAILED = "failed"
 
     @classmethod
     def choices(c):
@@ -305,6 +322,7 @@ class ProgressStatusEnum(CustomEnum):
             (c.IN_PROGRESS, "In progress"),
             (c.EXPIRED, "Expired"),
             (c.COMPLETED, "Completed"),
+            (c.FAILED, "Failed"),
         )
 
 
@@ -1,28 +1,53 @@
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
 from rest_framework import status
+from rest_framework.exceptions import APIException
 from rest_framework.pagination import PageNumberPagination
 
+from apps.utils.search import ranked_ordering
+
 DEFAULT_PAGE = 1
 DEFAULT_PAGE_SIZE = 50
+PAGE_NUMBER_MODE = "page"
+CURSOR_MODE = "cursor"
+DEFAULT_CURSOR_ORDERING = ("-created_at", "-id")
+
+
+class InvalidCursor(APIException):
+    status_code = status.HTTP_400_BAD_REQUEST
+    default_detail = "Invalid cursor"
+    default_code = "invalid_cursor"
 
 
 class CustomPaginator(PageNumberPagination):
     page = DEFAULT_PAGE
     page_size = DEFAULT_PAGE_SIZE
     page_size_query_param = "limit"
+    pagination_mode_query_param = "pagination"
+    cursor_query_param = "cursor"
 
-    def generate_response(self, query_set, serializer_obj, request):
+    def generate_response(self, query_set, serializer_obj, request, view=None):
+        if self.get_pagination_mode(request, view) == CURSOR_MODE:
+            return self.generate_cursor_response(
+                query_set, serializer_obj, request, view
+            )
         if request.GET.get("is_paging") == "false":
             page_data = query_set
             serialized_page = serializer_obj(
                 page_data, many=True, context={"request": request}
             )
+            # The serializer already evaluated the queryset, so count it from memory
+            total = len(serialized_page.data)
             response = {
                 "status": status.HTTP_200_OK,
                 "message": "ok",
-                "total": query_set.count(),
+                "total": total,
                 "total_pages": 1,
                 "page": int(request.GET.get("page", DEFAULT_PAGE)),
-                "limit": query_set.count(),
+                "limit": total,
                 "results": serialized_page.data,
             }
         else:
@@ -47,3 +72,119 @@ class CustomPaginator(PageNumberPagination):
                 "results": serialized_page.data,
             }
         return response
+
+    def get_pagination_mode(self, request, view=None):
+        """
+        Cursor mode is opted into per request with ``?pagination=cursor`` (or by
+        passing a cursor), or per view with ``pagination_mode = "cursor"``.
+        """
+        mode = request.GET.get(self.pagination_mode_query_param)
+        if mode in (PAGE_NUMBER_MODE, CURSOR_MODE):
+            return mode
+        if request.GET.get(self.cursor_query_param):
+            return CURSOR_MODE
+        return getattr(view, "pagination_mode", PAGE_NUMBER_MODE)
+
+    @staticmethod
+    def get_cursor_ordering(view=None):
+        """The unique, indexed key pages are cut on; views override it with ``cursor_ordering``."""
+        return tuple(getattr(view, "cursor_ordering", None) or DEFAULT_CURSOR_ORDERING)
+
+    def generate_cursor_response(self, query_set, serializer_obj, request, view=None):
+        """
+        Keyset pagination: each page is read with a range filter on the ordering key
+        and ``LIMIT page_size + 1``, so neither a COUNT nor an OFFSET scan is run.
+        ``next``/``previous`` are opaque cursors to pass back as ``?cursor=``.
+        Searched querysets keep their best matches first, the rank leading the key.
+        A bad cursor raises ``InvalidCursor``, which the views answer with a 400.
+        """
+        ordering = ranked_ordering(query_set, self.get_cursor_ordering(view))
+        page_size = self.get_page_size(request)
+        position, reverse = self.decode_cursor(
+            request.GET.get(self.cursor_query_param), len(ordering)
+        )
+
+        page_ordering = self.reverse_ordering(ordering) if reverse else ordering
+        query_set = query_set.order_by(*page_ordering)
+        try:
+            if position is not None:
+                query_set = query_set.filter(self.keyset_filter(page_ordering, position))
+            rows = list(query_set[: page_size + 1])
+        except (ValidationError, ValueError):
+            raise InvalidCursor()
+        has_more = len(rows) > page_size
+        rows = rows[:page_size]
+        if reverse:
+            rows.reverse()
+
+        next_cursor = previous_cursor = None
+        if rows:
+            if has_more or reverse:
+                next_cursor = self.encode_cursor(self.get_position(rows[-1], ordering))
+            if position is not None and (has_more or not reverse):
+                previous_cursor = self.encode_cursor(
+                    self.get_position(rows[0], ordering), reverse=True
+                )
+
+        serialized_page = serializer_obj(
+            rows, many=True, context={"request": request}
+        )
+        return {
+            "status": status.HTTP_200_OK,
+            "message": "ok",
+            "total": None,
+            "total_pages": None,
+            "page": None,
+            "limit": page_size,
+            "next": next_cursor,
+            "previous": previous_cursor,
+            "results": serialized_page.data,
+        }
+
+    @staticmethod
+    def reverse_ordering(ordering):
+        return tuple(
+            field[1:] if field.startswith("-") else f"-{field}" for field in ordering
+        )
+
+    @staticmethod
+    def keyset_filter(ordering, position):
+        """Rows strictly after ``position`` in ``ordering``, as a lexicographic comparison."""
+        condition = Q()
+        for index, field in enumerate(ordering):
+            name = field.lstrip("-")
+            lookup = "lt" if field.startswith("-") else "gt"
+            clause = Q(**{f"{name}__{lookup}": position[index]})
+            for previous_field, value in zip(ordering[:index], position):
+                clause &= Q(**{previous_field.lstrip("-"): value})
+            condition |= clause
+        return condition
+
+    @staticmethod
+    def get_position(instance, ordering):
+        position = []
+        for field in ordering:
+            value = instance
+            for attr in field.lstrip("-").split("__"):
+                value = getattr(value, attr)
+            position.append(value.isoformat() if hasattr(value, "isoformat") else str(value))
+        return position
+
+    @staticmethod
+    def encode_cursor(position, reverse=False):
+        payload = json.dumps({"p": position, "r": int(reverse)}, separators=(",", ":"))
+        return base64.urlsafe_b64encode(payload.encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor, key_length):
+        """Return ``(position, reverse)``; a missing cursor starts at the first page."""
+        if not cursor:
+            return None, False
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            position, reverse = payload["p"], bool(payload["r"])
+        except (TypeError, ValueError, KeyError):
+            raise InvalidCursor()
+        if not isinstance(position, list) or len(position) != key_length:
+            raise InvalidCursor()
+        return position, reverse
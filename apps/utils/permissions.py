@@ -3,9 +3,21 @@ from functools import wraps
 from rest_framework import status
 from rest_framework.response import Response
 
+from apps.users.authentication import get_claim_groups
 from apps.utils.enums import UserGroup
 
 
+def in_group(request, group_name):
+    """
+    Check group membership from the JWT's signed groups claim, falling back to the
+    database for sessions and tokens minted without claims.
+    """
+    groups = get_claim_groups(request)
+    if groups is not None:
+        return group_name in groups
+    return request.user.groups.filter(name=group_name).exists()
+
+
 def practitioner_access_only():
     """
     Grant permission to practitioners alone
@@ -15,9 +27,7 @@ def practitioner_access_only():
         @wraps(func)
         def wrapper(request, *args, **kwargs):
 
-            if not request.user.groups.filter(
-                name=UserGroup.PRACTITIONER
-            ).exists():
+            if not in_group(request, UserGroup.PRACTITIONER):
                 return Response(
                     {
                         "status": status.HTTP_403_FORBIDDEN,
@@ -42,9 +52,7 @@ def patient_access_only():
         @wraps(func)
         def wrapper(request, *args, **kwargs):
 
-            if not request.user.groups.filter(
-                name=UserGroup.USER
-            ).exists():
+            if not in_group(request, UserGroup.USER):
                 return Response(
                     {
                         "status": status.HTTP_403_FORBIDDEN,
@@ -0,0 +1,125 @@
+"""
+WebP renditions of uploaded images.
+
+Each rendition is stored next to its source as ``<source>.<rendition>.webp``,
+e.g. ``profile/me.jpg`` gets ``profile/me.jpg.list.webp`` and
+``profile/me.jpg.detail.webp``. The whole source name is kept, so ``me.jpg`` and
+``me.png`` never share renditions.
+A model records the renditions of its file field ``<field>`` in a JSON field
+``<field>_renditions``, together with the source name they were made from, so
+renditions of a replaced file are never served; once the new ones are written,
+the old files are removed. Files Pillow cannot read (e.g. PDFs) get no
+renditions.
+"""
+import io
+import logging
+import os
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+logger = logging.getLogger("user")
+
+# Bounding boxes in pixels, sized for 3x screens
+RENDITION_SIZES = {"list": (144, 144), "detail": (720, 720)}
+RENDITION_QUALITY = 80
+RENDITION_EXTENSION = ".webp"
+
+
+def rendition_name(name, rendition):
+    return f"{name}.{rendition}{RENDITION_EXTENSION}"
+
+
+def rendition_source(name):
+    """The name of the file a rendition was made from."""
+    return os.path.splitext(os.path.splitext(name)[0])[0]
+
+
+def is_rendition(name):
+    root, extension = os.path.splitext(name)
+    source, rendition = os.path.splitext(root)
+    return (
+        extension == RENDITION_EXTENSION
+        and rendition[1:] in RENDITION_SIZES
+        and bool(os.path.basename(source))
+    )
+
+
+def save_rendition(storage, name, content):
+    """
+    Store a rendition. Storages with their own rendition path (content-addressed
+    documents) use it; elsewhere an existing file is never replaced, a taken name
+    gets a free one and the name actually used is returned.
+    """
+    if hasattr(storage, "save_rendition"):
+        return storage.save_rendition(name, content)
+    return storage.save(name, content)
+
+
+def create_renditions(file, crop=False):
+    """
+    Write every rendition of ``file`` to its storage and return the record to
+    keep in ``<field>_renditions``. ``crop`` fills the box exactly (avatars);
+    otherwise the image is scaled to fit inside it (document previews). Only the
+    first frame or page of the source is used.
+    """
+    renditions = {"source": file.name}
+    largest = max(RENDITION_SIZES.values())
+    try:
+        with file.open("rb"):
+            image = Image.open(file)
+            # Let JPEG decode at a reduced scale instead of at full resolution
+            image.draft("RGB", largest)
+            image.seek(0)
+            image.load()
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as e:
+        logger.info(f"Renditions: skipping {file.name}: {e}")
+        return renditions
+
+    image = ImageOps.exif_transpose(image)
+    if image.mode not in ("RGB", "RGBA"):
+        alpha = image.mode in ("LA", "PA") or "transparency" in image.info
+        image = image.convert("RGBA" if alpha else "RGB")
+
+    for rendition, size in RENDITION_SIZES.items():
+        if crop:
+            thumbnail = ImageOps.fit(image, size, Image.LANCZOS)
+        else:
+            thumbnail = image.copy()
+            thumbnail.thumbnail(size, Image.LANCZOS)
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, "WEBP", quality=RENDITION_QUALITY, method=4)
+        renditions[rendition] = save_rendition(
+            file.storage, rendition_name(file.name, rendition), ContentFile(buffer.getvalue())
+        )
+    return renditions
+
+
+def delete_renditions(storage, renditions, keep=None):
+    """
+    Remove the rendition files of a ``<field>_renditions`` record, except those
+    ``keep`` still lists. Renditions of content-addressed blobs are shared and
+    go with their blob in ``gc_document_blobs``, so they are left alone.
+    """
+    if not renditions or hasattr(storage, "save_rendition"):
+        return
+    kept = set((keep or {}).values())
+    for rendition in RENDITION_SIZES:
+        name = renditions.get(rendition)
+        if name and name not in kept:
+            storage.delete(name)
+
+
+def rendition_urls(instance, field):
+    """Absolute URLs of the renditions of ``instance.<field>``, or None before they exist."""
+    file = getattr(instance, field)
+    renditions = getattr(instance, f"{field}_renditions", None) or {}
+    if not file or renditions.get("source") != file.name:
+        return None
+    urls = {
+        rendition: f"{settings.BASE_BE_URL}{file.storage.url(renditions[rendition])}"
+        for rendition in RENDITION_SIZES
+        if renditions.get(rendition)
+    }
+    return urls or None
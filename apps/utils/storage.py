@@ -0,0 +1,126 @@
+"""
+Content-addressed file storage.
+
+Uploads are hashed with SHA-256 while they are streamed to a temporary file, then
+moved to ``<prefix>/ab/cd/<sha256><ext>``. Identical content always maps to the
+same name, so a re-upload stores nothing new, and the two levels of sharding keep
+every directory small. Blobs are shared between records, so they are never
+deleted through the model fields; ``DocumentBlob`` reference-counts them and the
+``gc_document_blobs`` command removes the unreferenced ones. Renditions of a
+blob are written with ``save_rendition`` under their own name next to it and go
+when the blob goes; ``save`` content-addresses every file, whatever its name.
+"""
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import FileSystemStorage
+
+from apps.utils.renditions import (
+    RENDITION_SIZES,
+    is_rendition,
+    rendition_name,
+    rendition_source,
+)
+
+DOCUMENT_BLOB_PREFIX = "documents/blobs"
+TEMP_DIRECTORY = "tmp"
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def __init__(self, prefix=DOCUMENT_BLOB_PREFIX, **kwargs):
+        self.prefix = prefix
+        super().__init__(**kwargs)
+
+    def blob_name(self, digest, extension=""):
+        return f"{self.prefix}/{digest[:2]}/{digest[2:4]}/{digest}{extension}"
+
+    def is_blob(self, name):
+        return (
+            bool(name)
+            and name.startswith(f"{self.prefix}/")
+            and not name.startswith(f"{self.prefix}/{TEMP_DIRECTORY}/")
+            and not is_rendition(name)
+        )
+
+    def delete_blob(self, name):
+        self.delete(name)
+        for rendition in RENDITION_SIZES:
+            self.delete(rendition_name(name, rendition))
+
+    def touch_blob(self, name):
+        """Restart the grace period of a blob that is about to be referenced again."""
+        apps.get_model("users", "DocumentBlob").touch(name)
+
+    def temp_directory(self):
+        return self.path(f"{self.prefix}/{TEMP_DIRECTORY}")
+
+    def get_available_name(self, name, max_length=None):
+        # The final name is derived from the content in _save, and equal content
+        # must land on the existing blob rather than on a suffixed copy
+        return name
+
+    def save_rendition(self, name, content):
+        """Write a rendition of a blob under its own name, replacing an older copy."""
+        if not is_rendition(name) or not self.is_blob(rendition_source(name)):
+            raise SuspiciousFileOperation(f"{name} is not a rendition of a blob.")
+        temp_path, _ = self._write_temp(content)
+        self._move(temp_path, name)
+        return name
+
+    def _save(self, name, content):
+        extension = os.path.splitext(name)[1].lower()
+        temp_path, digest = self._write_temp(content)
+        name = self.blob_name(digest, extension)
+        path = self.path(name)
+        try:
+            # Touch before looking: a blob being collected is then either
+            # gone already or kept, never deleted after it was reused
+            self.touch_blob(name)
+            if os.path.exists(path):
+                os.remove(temp_path)
+                os.utime(path)
+                return name
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        self._move(temp_path, name)
+        return name
+
+    def _write_temp(self, content):
+        """Stream ``content`` to a temporary file; returns its path and SHA-256."""
+        temp_directory = self.temp_directory()
+        os.makedirs(temp_directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=temp_directory)
+        try:
+            digest = hashlib.sha256()
+            with os.fdopen(descriptor, "wb") as temp_file:
+                for chunk in content.chunks():
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return temp_path, digest.hexdigest()
+
+    def _move(self, temp_path, name):
+        path = self.path(name)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+
+document_storage = ContentAddressedStorage()
+
+
+def get_document_storage():
+    return document_storage
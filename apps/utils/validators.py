@@ -1,21 +1,181 @@
+"""
+Upload validation by content rather than by client headers.
+
+A file's type is sniffed from its leading bytes and must be allowed by
+``UPLOAD_FILE_TYPES`` and agree with its extension; the client's content type
+is ignored. ``FileValidator`` checks a file chunk by chunk, so an upload can be
+rejected at its first chunk: ``validate_uploads`` installs it as an upload
+handler that stops reading the request body as soon as a file fails.
+"""
+import os
+
 from django.conf import settings
 from django.core.exceptions import ValidationError
+from django.core.files.uploadhandler import FileUploadHandler, StopUpload
+
+# A PDF header may sit anywhere in the first KB, the image signatures at the start
+SNIFF_SIZE = 2048
+PDF_HEADER_WINDOW = 1024
+IMAGE_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+)
+EXTENSION_CONTENT_TYPES = {
+    ".pdf": "application/pdf",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".gif": "image/gif",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+IMAGE_FILE_TYPES = ["image/*"]
+
+
+def sniff_content_type(header):
+    """The content type the leading bytes of a file identify, if any."""
+    if b"%PDF-" in header[:PDF_HEADER_WINDOW]:
+        return "application/pdf"
+    if header[:4] == b"RIFF" and header[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in IMAGE_SIGNATURES:
+        if header.startswith(signature):
+            return content_type
+    return None
+
+
+def content_type_allowed(content_type, allowed_types=None):
+    """Match against UPLOAD_FILE_TYPES, where ``image/*`` covers every image type."""
+    for allowed in allowed_types or settings.UPLOAD_FILE_TYPES:
+        if allowed.endswith("/*"):
+            if content_type.startswith(allowed[:-1]):
+                return True
+        elif content_type == allowed:
+            return True
+    return False
+
+
+class FileValidator:
+    """
+    Validates one file as its bytes arrive. The extension is checked up front,
+    the size after every chunk and the content once ``SNIFF_SIZE`` bytes are in;
+    ``finish`` sniffs files shorter than that.
+    """
+
+    def __init__(self, name, allowed_types=None):
+        self.allowed_types = allowed_types or settings.UPLOAD_FILE_TYPES
+        self.extension = os.path.splitext(name or "")[1].lower()
+        self.size = 0
+        self.header = b""
+        self.content_type = None
+        if self.extension not in settings.UPLOAD_FILE_EXTENSIONS:
+            raise ValidationError(
+                f"Invalid file extension: {self.extension or 'none'}. Allowed extensions are: "
+                f"{', '.join(settings.UPLOAD_FILE_EXTENSIONS)}."
+            )
+
+    @staticmethod
+    def check_size(size):
+        if size > settings.MAX_FILE_SIZE:
+            raise ValidationError(
+                f"File size exceeds the limit of {settings.MAX_FILE_SIZE // (1024 * 1024)}MB."
+            )
+
+    def feed(self, chunk):
+        self.size += len(chunk)
+        self.check_size(self.size)
+        if self.content_type is None:
+            self.header += chunk[: SNIFF_SIZE - len(self.header)]
+            if len(self.header) >= SNIFF_SIZE:
+                self.identify()
+
+    def identify(self):
+        content_type = sniff_content_type(self.header)
+        if content_type is None or not content_type_allowed(content_type, self.allowed_types):
+            raise ValidationError(
+                f"Unsupported file type: {content_type or 'unknown'}. Allowed types are: "
+                f"{', '.join(self.allowed_types)}."
+            )
+        if EXTENSION_CONTENT_TYPES.get(self.extension) != content_type:
+            raise ValidationError(
+                f"File content ({content_type}) does not match its {self.extension} extension."
+            )
+        self.content_type = content_type
+        return content_type
+
+    def finish(self):
+        return self.content_type or self.identify()
+
+
+def validate_file(file, allowed_types=None):
+    """
+    Validate a received file by its size and leading bytes; only the first
+    ``SNIFF_SIZE`` bytes are read. The sniffed type replaces ``content_type``.
+    """
+    validator = FileValidator(file.name, allowed_types)
+    validator.check_size(file.size)
+    file.seek(0)
+    validator.feed(file.read(SNIFF_SIZE))
+    file.seek(0)
+    file.content_type = validator.finish()
+
+
+def validate_image(file):
+    validate_file(file, IMAGE_FILE_TYPES)
+
+
+class ValidatingUploadHandler(FileUploadHandler):
+    """
+    Runs ``FileValidator`` over the files of ``fields`` while a multipart body is
+    parsed, ahead of the handlers that store them. The first failure stops the
+    upload without reading the rest of the body; its message is kept in
+    ``request.upload_errors`` and the file is left out of ``request.FILES``.
+    """
+
+    def __init__(self, request=None, fields=(), allowed_types=None):
+        super().__init__(request)
+        self.fields = set(fields)
+        self.allowed_types = allowed_types
+        self.validator = None
+
+    def reject(self, error):
+        self.request.upload_errors = {self.field_name: error.messages}
+        raise StopUpload(connection_reset=True)
+
+    def new_file(self, field_name, file_name, *args, **kwargs):
+        super().new_file(field_name, file_name, *args, **kwargs)
+        self.validator = None
+        if field_name in self.fields:
+            try:
+                self.validator = FileValidator(file_name, self.allowed_types)
+            except ValidationError as e:
+                self.reject(e)
+
+    def receive_data_chunk(self, raw_data, start):
+        if self.validator:
+            try:
+                self.validator.feed(raw_data)
+            except ValidationError as e:
+                self.reject(e)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.validator:
+            try:
+                self.validator.finish()
+            except ValidationError as e:
+                self.reject(e)
+        return None
 
 
-def validate_file(file):
-    # Validate file size
-    if file.size > settings.MAX_FILE_SIZE:
-        raise ValidationError("File size exceeds the limit of 5MB.")
+def validate_uploads(request, fields, allowed_types=None):
+    """Validate the files of ``fields`` while ``request`` streams in; call before reading ``request.data``."""
+    request.upload_handlers.insert(
+        0, ValidatingUploadHandler(request, fields, allowed_types)
+    )
 
-    # Validate content type
-    if file.content_type not in settings.UPLOAD_FILE_EXTENSIONS:
-        raise ValidationError(
-            f"Unsupported file type: {file.content_type}. Allowed types are JPEG, PNG, GIF, WebP."
-        )
 
-    # Validate file extension
-    ext = file.name.split(".")[-1].lower()
-    if f".{ext}" not in settings.UPLOAD_FILE_TYPES:
-        raise ValidationError(
-            f"Invalid file extension: .{ext}. Allowed extensions are: {', '.join(settings.UPLOAD_FILE_TYPES)}."
-        )
+def upload_errors(request):
+    """Errors of files ``ValidatingUploadHandler`` rejected, by field name."""
+    return getattr(request, "upload_errors", None) or {}
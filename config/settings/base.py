@@ -170,12 +170,35 @@ SIMPLE_JWT = {
     "USER_ID_CLAIM": "user_id",
     "AUTH_TOKEN_CLASSES": ("rest_framework_simplejwt.tokens.AccessToken",),
     "TOKEN_TYPE_CLAIM": "token_type",
+    "TOKEN_REFRESH_SERIALIZER": "apps.users.authentication.VersionedTokenRefreshSerializer",
     "JTI_CLAIM": "jti",
     "SLIDING_TOKEN_REFRESH_EXP_CLAIM": "refresh_exp",
     "SLIDING_TOKEN_LIFETIME": timedelta(minutes=5),
     "SLIDING_TOKEN_REFRESH_LIFETIME": timedelta(days=1),
 }
 
+# CELERY SETTINGS
+CELERY_BROKER_URL = config("CELERY_BROKER_URL", "redis://localhost:6379/0")
+CELERY_RESULT_BACKEND = config("CELERY_RESULT_BACKEND", CELERY_BROKER_URL)
+CELERY_ACCEPT_CONTENT = ["json"]
+CELERY_TASK_SERIALIZER = "json"
+CELERY_TIMEZONE = TIME_ZONE
+CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
+CELERY_BEAT_SCHEDULE = {
+    "drain-email-outbox": {
+        "task": "apps.users.tasks.send_queued_emails",
+        "schedule": 60.0,
+    },
+    "sweep-auth-tokens": {
+        "task": "apps.users.tasks.sweep_auth_tokens",
+        "schedule": 60.0 * 60,
+    },
+    "expire-document-uploads": {
+        "task": "apps.users.tasks.expire_document_uploads",
+        "schedule": 60.0 * 60,
+    },
+}
+
 UPLOAD_FILE_TYPES = ["application/pdf", "image/*"]
 UPLOAD_FILE_EXTENSIONS = [".pdf", ".jpg", ".jpeg", ".gif", ".png", ".webp"]
 MAX_FILE_SIZE = 5 * 1024 * 1024
@@ -184,7 +207,7 @@ MAX_FILE_SIZE = 5 * 1024 * 1024
 REST_FRAMEWORK = {
     "DEFAULT_SCHEMA_CLASS": "rest_framework.schemas.coreapi.AutoSchema",
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "apps.users.authentication.CachedProfileJWTAuthentication",
     ),
     "DEFAULT_PAGINATION_CLASS": "apps.utils.pagination.CustomPaginator",
     "DEFAULT_FILTER_BACKENDS": [
@@ -200,6 +223,8 @@ STATIC_ROOT = os.path.join(BASE_DIR, "static")
 STATICFILES_DIRS = (os.path.join(BASE_DIR, "staticfiles"),)
 MEDIA_URL = "/media/"
 MEDIA_ROOT = os.path.join(BASE_DIR, "media")
+# Prefixed to media URLs in API payloads
+BASE_BE_URL = config("BASE_BE_URL", "")
 
 # For CORS and CSRF
 CORS_ALLOW_HEADERS = list(default_headers) + ["X-Amz-Date"]
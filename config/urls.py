@@ -8,11 +8,11 @@ from drf_yasg import openapi
 from drf_yasg.views import get_schema_view
 from rest_framework import permissions
 from rest_framework.authentication import SessionAuthentication
-from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework_simplejwt.views import TokenRefreshView
 
 
 from apps.users import routes as account_route
+from apps.users.authentication import CachedProfileJWTAuthentication
 from apps.assessment import routes as assessment_route
 from config import settings
 
@@ -27,7 +27,7 @@ schema_view = get_schema_view(
         url=f"{env_loc('BASE_BE_URL')}",
     ),
     public=True,
-    authentication_classes=(SessionAuthentication, JWTAuthentication),
+    authentication_classes=(SessionAuthentication, CachedProfileJWTAuthentication),
     permission_classes=(permissions.AllowAny,),
 )
 
@@ -3,6 +3,7 @@
 echo "=========================Apply database migrations============================="
 
 python manage.py makemigrations
+python manage.py merge_duplicate_medications
 python manage.py migrate
 exec python manage.py runserver 0.0.0.0:8000
 